@@ -0,0 +1,123 @@
+# authorizer_function.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# An alternate entry point that runs as an API Gateway Lambda authorizer (TOKEN or REQUEST type) in
+# front of the backend functions, so they do not check tokens at all. It shares the configuration,
+# the key loaders, the decision cache and authz with lambda_function; deploy the same image with the
+# handler set to authorizer_function.handler.
+#
+# A token that cannot be verified raises Unauthorized (API Gateway answers 401), a verified token without
+# the required scopes gets a Deny policy (403), and otherwise an Allow policy for the whole stage with the
+# subject and scopes in the context.
+#
+
+from logging import error, info
+
+from lambdaone import config
+from lambdaone import deadline
+from lambdaone import events
+from lambdaone import policy
+from lambdaone import runtime
+from lambdaone import scopes
+from lambdaone import verifier
+from lambdaone import warmup
+
+UNAUTHORIZED = 'Unauthorized'     # The exact message API Gateway turns into a 401.
+ANONYMOUS = 'anonymous'
+
+configuration = config.load()
+runtime.apply(configuration)
+warmup.warm(configuration)
+
+def before_checkpoint():
+
+    warmup.warm(configuration)
+
+def after_restore():
+
+    warmup.restore(configuration)
+
+warmup.register(before_checkpoint, after_restore)
+
+def configure():
+
+    # Rebuild the configuration snapshot from the environment; the tests change the environment
+    # between calls.
+
+    global configuration
+
+    configuration = config.load()
+    runtime.apply(configuration)
+
+def handler(event, context):
+
+    global configuration
+
+    deadline.start(context)
+    snapshot = config.refresh(configuration)
+
+    if snapshot is not configuration:
+
+        configuration = snapshot
+        runtime.apply(configuration)
+
+    # A REST API sends methodArn, an HTTP API sends routeArn.
+
+    method_arn = event.get('methodArn') or event.get('routeArn') or ''
+
+    if configuration.error:
+
+        # Anything but Unauthorized is reported by API Gateway as a 500, which is right for a bad configuration.
+
+        error('Bad configuration: %s', configuration.error)
+        raise Exception('Bad configuration')
+
+    if configuration.mode == config.MODE_NONE:
+
+        info('Access granted: no authorization required')
+
+        return policy.build(ANONYMOUS, policy.ALLOW, method_arn)
+
+    token = _bearer_token(event)
+
+    if token is None:
+
+        error('Missing bearer token')
+        raise Exception(UNAUTHORIZED)
+
+    decision = verifier.decide(token, configuration)
+
+    if decision is None:
+
+        info('Access denied: %s', token)
+        raise Exception(UNAUTHORIZED)
+
+    ( claims, allowed ) = decision
+    principal_id = str(claims.get('sub') or ANONYMOUS)
+
+    if not allowed:
+
+        info('Access denied: %s', token)
+        result = policy.build(principal_id, policy.DENY, method_arn)
+
+    else:
+
+        info('Access granted: %s', token)
+        result = policy.build(principal_id, policy.ALLOW, method_arn, policy.context(claims, scopes.granted(claims)))
+
+    return result
+
+def _bearer_token(event):
+
+    # TOKEN authorizers get the header value in authorizationToken; REQUEST authorizers get the headers
+    # with the case the client used.
+
+    if 'authorizationToken' in event:
+
+        result = events.strip_bearer(event['authorizationToken'])
+
+    else:
+
+        result = events.bearer_token(event)
+
+    return result
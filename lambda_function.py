@@ -2,94 +2,161 @@
 # Copyright © 2024 Joel A Mussman. All rights reserved.
 #
 
-from dotenv import load_dotenv
 import json
-from logging import debug, error, info
-import os
-import re
+from logging import DEBUG, debug, error, getLogger, info
 import sys
 
-from lambdaone import authz
-from lambdaone import fixed_key
+from lambdaone import batch
+from lambdaone import config
+from lambdaone import deadline
+from lambdaone import events
 from lambdaone import hello_world
-from lambdaone import jwt_key
-from lambdaone import logger
+from lambdaone import metrics
+from lambdaone import profiler
+from lambdaone import runtime
+from lambdaone import upstream
+from lambdaone import verifier
+from lambdaone import warmup
+
+# The configuration is read and validated and the logging is set up once in the init phase, not
+# for every invocation. The keys are loaded and the crypto backend warmed up here too, so the first
+# request runs at warm speed.
+
+configuration = config.load()
+runtime.apply(configuration)
+warmup.warm(configuration)
+
+def before_checkpoint():
+
+    warmup.warm(configuration)
+
+def after_restore():
+
+    warmup.restore(configuration)
+
+warmup.register(before_checkpoint, after_restore)
+
+def configure():
+
+    # Rebuild the configuration snapshot from the environment; the tests change the environment
+    # between calls.
+
+    global configuration
+
+    configuration = config.load()
+    runtime.apply(configuration)
 
 def handler(event, context):
 
-    load_dotenv()
+    # The whole invocation is timed, the stages are timed in _handle and verifier, and the metrics are
+    # written when the invocation ends (or the batch of invocations is complete). A sample of the
+    # invocations is profiled if PROFILE is set.
+
+    deadline.start(context)
+
+    started = metrics.start()
+    result = profiler.run(_handle, event)
+    metrics.stop('Handler', started)
+    metrics.end()
+
+    return result
+
+def _handle(event):
+
+    global configuration
+
+    started = metrics.start()
+    snapshot = config.refresh(configuration)
 
-    log_level = os.environ.get('LAMBDA_LOG_LEVEL', 'ERROR')
-    logger.initialize(log_level)
+    if snapshot is not configuration:
 
-    require = os.environ.get('REQUIRE')
+        configuration = snapshot
+        runtime.apply(configuration)
+
+    metrics.stop('Config', started)
+
+    # A batch from SQS or a stream is authorized record by record and answers with the failed records.
+
+    if batch.source(event) is not None:
+
+        return batch.handle(event, configuration, _process_record)
+
+    # The event source decides the shape of the response.
+
+    kind = events.detect(event)
     result = None
     token = None
 
-    if require:
+    if configuration.error:
 
-        # Configuration.
+        error('Bad configuration: %s', configuration.error)
+        result = events.error_response(kind, events.BAD_CONFIGURATION)
 
-        audience = os.environ.get('AUDIENCE')
-        issuer = os.environ.get('ISSUER')
-        require = re.split(r'\s*,\s*', require)
+    elif configuration.mode != config.MODE_NONE:
 
-        if audience is None or issuer is None:
+        # The message arguments are only formatted if the level is enabled, but json.dumps would
+        # run regardless so it is guarded.
 
-            error('Bad configuration: audience or issuer is not set')
-            result = { 'statusCode': 400, 'body': json.dumps('Bad configuration') }
+        if getLogger().isEnabledFor(DEBUG):
 
-        else:
+            debug('event %s', json.dumps(event))
 
-            debug(f'event { json.dumps(event) }')
+        upstream_claims = upstream.claims(event) if configuration.trust_upstream else None
 
-            # The AWS headers are normalized to lowercase, look for the bearer token.
+        if upstream_claims is not None:
 
-            bearer_token = event.get('headers').get('authorization')
+            # The HTTP API JWT authorizer already verified the token, only the scopes are left to check.
 
-            if bearer_token is None:
+            token = upstream_claims.get('sub')
+            decision = upstream.decide(upstream_claims, configuration)
 
-                error('Missing bearer token')
-                result = { 'statusCode': 400, 'body': json.dumps('Bad request') }
+            if decision is None or not decision[1]:
 
-            else:
+                info('Access denied: %s', token)
+                result = events.error_response(kind, events.ACCESS_DENIED)
 
-                token = re.sub(r'^bearer\s*(.*)$', r'\1', bearer_token)
-                
-                # Look for the JWKS URI or the local path.
+        elif configuration.mode == config.MODE_UPSTREAM:
 
-                jwks_path = os.environ.get('JWKSPATH')
-                signature_key_path = os.environ.get('SIGNATUREKEYPATH')
+            error('Missing upstream claims')
+            result = events.error_response(kind, events.ACCESS_DENIED)
 
-                if (jwks_path is None and signature_key_path is None) or (len(jwks_path) > 0 and len(signature_key_path) > 0):
+        else:
 
-                    error('Bad configuration: neither or both JWKSPATH and SIGNATUREKEYPATH defined.')
-                    result = { 'statusCode': 400, 'body': json.dumps('Bad configuration') }
+            # The header names are not in the same case for every event source, look for the bearer token.
 
-                else:
+            started = metrics.start()
+            token = events.bearer_token(event)
+            metrics.stop('Token', started)
 
-                    if len(jwks_path) > 0 and len(signature_key_path) <= 0:
+            if token is None:
 
-                        ( key, algorithm ) = jwt_key.load(jwks_path, token)
-                        
-                        debug(f'jwt_key.load key: { key }, algorithm: { algorithm }')
+                error('Missing bearer token')
+                result = events.error_response(kind, events.BAD_REQUEST)
 
-                    if len(signature_key_path) > 0 and len(jwks_path) <= 0:
+            else:
 
-                        ( key, algorithm ) = fixed_key.load(signature_key_path, token)
-                        
-                        debug(f'fixed_key.load key: { key }, algorithm: { algorithm }')
+                decision = verifier.decide(token, configuration)
 
-                    verified = authz.verify(token, key, algorithm, audience, issuer, require)
+                if decision is None or not decision[1]:
 
-                    if verified == None:
+                    info('Access denied: %s', token)
+                    result = events.error_response(kind, events.ACCESS_DENIED)
 
-                        info(f'Access denied: { token }')
-                        result = { 'statusCode': 403, 'body': json.dumps('Access denied') }
-    
     if result == None:
 
-        info(f'Access granted: { token or 'no authorization required' }')
-        result = f'{ hello_world.hello() } sys.version: { sys.version }'
+        info('Access granted: %s', token or 'no authorization required')
+
+        started = metrics.start()
+        body = f'{ hello_world.hello() } sys.version: { sys.version }'
+        metrics.stop('Business', started)
+
+        started = metrics.start()
+        result = events.response(kind, 200, body)
+        metrics.stop('Response', started)
+
+    return result
+
+def _process_record(record, claims):
 
-    return result
\ No newline at end of file
+    info('Record processed: %s', (claims or {}).get('sub') or 'no authorization required')
+    hello_world.hello()
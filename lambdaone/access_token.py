@@ -0,0 +1,92 @@
+# access_token.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Parse the compact JWS form of an access token exactly once for each request. The header, claims,
+# payload bytes, signing input, and signature are kept together, so the key loaders and authz.verify
+# share the work instead of each one base64-decoding and JSON-parsing the token again.
+#
+# Nothing here is verified! The header and claims may only be trusted after authz.verify succeeds.
+#
+
+import base64
+import binascii
+from dataclasses import dataclass
+import json
+from jwt.exceptions import DecodeError
+from logging import error
+
+@dataclass(frozen = True)
+class AccessToken:
+
+    raw: str
+    header: dict
+    claims: dict
+    payload: bytes
+    signing_input: bytes
+    signature: bytes
+
+def parse(token):
+
+    # An AccessToken is returned, or None if the token is not a well-formed JWS.
+
+    result = None
+
+    try:
+
+        encoded = token.encode('utf-8') if isinstance(token, str) else token
+
+        try:
+
+            signing_input, signature_segment = encoded.rsplit(b'.', 1)
+            header_segment, payload_segment = signing_input.split(b'.', 1)
+
+        except ValueError as e:
+
+            raise DecodeError('Not enough segments') from e
+
+        header = _json_object(_decode_segment(header_segment, 'header'), 'header')
+        payload = _decode_segment(payload_segment, 'payload')
+        claims = _json_object(payload, 'payload')
+        signature = _decode_segment(signature_segment, 'crypto')
+
+        result = AccessToken(
+            raw = token,
+            header = header,
+            claims = claims,
+            payload = payload,
+            signing_input = signing_input,
+            signature = signature
+        )
+
+    except Exception as e:
+
+        error(f'Token not parsed: { e }')
+        result = None
+
+    return result
+
+def _decode_segment(segment, name):
+
+    try:
+
+        return base64.urlsafe_b64decode(segment + b'=' * (-len(segment) % 4))
+
+    except ( TypeError, binascii.Error ) as e:
+
+        raise DecodeError(f'Invalid { name } padding') from e
+
+def _json_object(data, name):
+
+    try:
+
+        result = json.loads(data)
+
+    except ( ValueError, RecursionError ) as e:
+
+        raise DecodeError(f'Invalid { name } string: { e }') from e
+
+    if not isinstance(result, dict):
+
+        raise DecodeError(f'Invalid { name } string: must be a json object')
+
+    return result
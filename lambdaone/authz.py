@@ -1,35 +1,307 @@
 # authz.py
 # Copyright © 2024 Joel A Mussman. All rights reserved.
 #
+# The token arrives already parsed by access_token.parse, so the signature is checked against the
+# signing input and signature bytes, and the claims are validated from the parsed payload; nothing is
+# base64-decoded or JSON-parsed a second time. The common algorithms are checked by the signature module
+# directly with cryptography, anything else with the PyJWT algorithm objects. The checks and the
+# exceptions raised follow jwt.decode.
+#
+# decode_all checks a batch of tokens on a thread pool. OpenSSL does the work of checking a signature
+# outside of the GIL, so the threads run on as many cores as the lambda has (the cores follow the memory
+# setting). A process pool is not used: the key objects cannot be pickled, and the lambda environment
+# does not provide the shared memory that multiprocessing needs.
+#
 
-from jwt import decode
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.hazmat.primitives.asymmetric.ec import EllipticCurvePublicKey
+from cryptography.hazmat.primitives.asymmetric.ed448 import Ed448PublicKey
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+from functools import lru_cache
+from jwt import PyJWK
+from jwt.algorithms import get_default_algorithms
+from jwt.exceptions import DecodeError, ExpiredSignatureError, ImmatureSignatureError, InvalidAlgorithmError, InvalidAudienceError
+from jwt.exceptions import InvalidIssuedAtError, InvalidIssuerError, InvalidSignatureError, MissingRequiredClaimError
 from logging import error
+import os
+import threading
+import time
+
+from lambdaone import scopes
+from lambdaone import signature
+from lambdaone.access_token import AccessToken
+
+# The only algorithms supported are listed at https://pyjwt.readthedocs.io/en/stable/algorithms.html.
 
-def verify(access_token, signing_key, algorithm, audience, issuer, scopes):
+_algorithms = get_default_algorithms()
+
+# The pool is started by the first batch that needs it and kept for the life of the execution environment;
+# it is only replaced if a batch asks for more workers.
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+def verify(access_token, signing_key, algorithm, audience, issuer, requirement):
 
     # A valid decoded token is returned, or None if something went wrong. None should
     # produce a 403 error from the endpoint.
 
     result = None
+    decoded_token = decode(access_token, signing_key, algorithm, audience, issuer)
 
-    try:
+    if decoded_token is not None and authorized(decoded_token, requirement):
 
-        # Decode the token using the indicated key. The only algorithms supported are listed
-        # at https://pyjwt.readthedocs.io/en/stable/algorithms.html.
+        result = decoded_token
 
-        decoded_token = decode(access_token, signing_key, algorithms = [ algorithm ], audience=audience, issuer=issuer, options = { 'verify_exp': True, 'verify_iss': True, 'verify_aud': True })
-        resolved = 0
+    return result
 
-        for scope in scopes:
-            if scope in decoded_token['scopes']:
-                resolved += 1
+def decode(access_token, signing_key, algorithm, audience, issuer):
 
-        if resolved == len(scopes):
-            result = decoded_token
+    # The claims are returned if the signature and the claims are valid, or None. The scopes are
+    # not considered, so the outcome of authorized may be cached separately.
+
+    result = None
+
+    try:
+
+        # Check the signature using the indicated key, and then the expiration, audience and issuer.
+
+        _verify_signature(access_token, signing_key, algorithm)
+        _validate_claims(access_token.claims, audience, issuer)
+
+        result = access_token.claims
 
     except Exception as e:
-        
+
         error(f'Token not decoded: { e }')
         result = None
 
-    return result
\ No newline at end of file
+    return result
+
+def decode_all(items, audience, issuer, workers = None):
+
+    # items is a list of ( access_token, signing_key, algorithm ). The claims (or None) are returned for each
+    # item in the same order. A token that appears more than once is checked once, and the tokens are ordered
+    # by key so each worker checks a run of tokens with the same key. One token, or one worker, is checked on
+    # the calling thread.
+
+    unique = {}
+
+    for item in items:
+
+        unique.setdefault(item[0].raw, item)
+
+    pending = sorted(unique.values(), key = lambda item: id(item[1]))
+    workers = _workers() if workers is None else workers
+
+    if len(pending) < 2 or workers < 2:
+
+        decoded = [ decode(access_token, signing_key, algorithm, audience, issuer) for ( access_token, signing_key, algorithm ) in pending ]
+
+    else:
+
+        chunk = -(-len(pending) // workers)
+        chunks = [ pending[i:i + chunk] for i in range(0, len(pending), chunk) ]
+        decoded = [ claims for part in _pool(workers).map(lambda part: [ decode(*item, audience, issuer) for item in part ], chunks) for claims in part ]
+
+    results = { item[0].raw: claims for ( item, claims ) in zip(pending, decoded) }
+
+    return [ results[item[0].raw] for item in items ]
+
+def authorized(decoded_token, requirement):
+
+    # The requirement is compiled once from REQUIRE by scopes.compile; the scopes granted by the
+    # token are collected once into a frozenset and checked against it.
+
+    return requirement.matches(scopes.granted(decoded_token))
+
+def prime(signing_key, algorithm):
+
+    # Check a made up signature with the key, so the key is prepared and the crypto backend has done a
+    # verification before the first real token arrives. True is returned if the check reached the
+    # backend (and failed, as it must), False if the key cannot be used with the algorithm.
+
+    key = signing_key.key if isinstance(signing_key, PyJWK) else signing_key
+    dummy = AccessToken(raw = '', header = { 'alg': algorithm }, claims = {}, payload = b'', signing_input = b'prime', signature = b'\x01' * _signature_length(key))
+
+    try:
+
+        _verify_signature(dummy, signing_key, algorithm)
+        result = False
+
+    except InvalidSignatureError:
+
+        result = True
+
+    except Exception:
+
+        result = False
+
+    return result
+
+def _workers():
+
+    return os.cpu_count() or 1
+
+def _pool(workers):
+
+    global _executor, _executor_workers
+
+    with _executor_lock:
+
+        if _executor_workers < workers:
+
+            if _executor is not None:
+
+                _executor.shutdown(wait = False)
+
+            _executor = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = 'authz')
+            _executor_workers = workers
+
+        result = _executor
+
+    return result
+
+@lru_cache(maxsize = 8)
+def _audiences(audience):
+
+    # The configured audience is the same for every token, the set is built once.
+
+    return frozenset([ audience ] if isinstance(audience, str) else audience)
+
+def _signature_length(key):
+
+    # A signature of the wrong length is rejected before it gets to the backend.
+
+    if isinstance(key, RSAPublicKey):
+
+        result = (key.key_size + 7) // 8
+
+    elif isinstance(key, EllipticCurvePublicKey):
+
+        result = 2 * ((key.curve.key_size + 7) // 8)
+
+    elif isinstance(key, Ed448PublicKey):
+
+        result = 114
+
+    else:
+
+        result = 64
+
+    return result
+
+def _verify_signature(access_token, signing_key, algorithm):
+
+    alg = access_token.header.get('alg')
+
+    if not alg or alg != algorithm:
+
+        raise InvalidAlgorithmError('The specified alg value is not allowed')
+
+    if isinstance(signing_key, PyJWK):
+
+        # A key from a JWKS has the algorithm bound to it, the header cannot pick another one.
+
+        if alg != signing_key.algorithm_name:
+
+            raise InvalidAlgorithmError(f'Token algorithm { alg } does not match the key algorithm { signing_key.algorithm_name }')
+
+        algorithm_object = signing_key.Algorithm
+        signing_key = signing_key.key
+
+    elif alg in _algorithms:
+
+        algorithm_object = _algorithms[alg]
+
+    else:
+
+        raise InvalidAlgorithmError('Algorithm not supported')
+
+    check = signature.verifier(alg, signing_key)
+
+    if check is not None:
+
+        verified = check(access_token.signing_input, access_token.signature)
+
+    else:
+
+        verified = algorithm_object.verify(access_token.signing_input, algorithm_object.prepare_key(signing_key), access_token.signature)
+
+    if not verified:
+
+        raise InvalidSignatureError('Signature verification failed')
+
+def _validate_claims(claims, audience, issuer):
+
+    now = time.time()
+
+    if 'iat' in claims:
+
+        try:
+
+            iat = int(claims['iat'])
+
+        except ( OverflowError, TypeError, ValueError ):
+
+            raise InvalidIssuedAtError('Issued At claim (iat) must be an integer.')
+
+        if iat > now:
+
+            raise ImmatureSignatureError('The token is not yet valid (iat)')
+
+    if 'nbf' in claims:
+
+        try:
+
+            nbf = int(claims['nbf'])
+
+        except ( OverflowError, TypeError, ValueError ):
+
+            raise DecodeError('Not Before claim (nbf) must be an integer.')
+
+        if nbf > now:
+
+            raise ImmatureSignatureError('The token is not yet valid (nbf)')
+
+    if 'exp' in claims:
+
+        try:
+
+            exp = int(claims['exp'])
+
+        except ( OverflowError, TypeError, ValueError ):
+
+            raise DecodeError('Expiration Time claim (exp) must be an integer.')
+
+        if exp <= now:
+
+            raise ExpiredSignatureError('Signature has expired')
+
+    if 'iss' not in claims:
+
+        raise MissingRequiredClaimError('iss')
+
+    if not isinstance(claims['iss'], str):
+
+        raise InvalidIssuerError('Payload Issuer (iss) must be a string')
+
+    if claims['iss'] != issuer:
+
+        raise InvalidIssuerError('Invalid issuer')
+
+    if not claims.get('aud'):
+
+        raise MissingRequiredClaimError('aud')
+
+    audience_claims = [ claims['aud'] ] if isinstance(claims['aud'], str) else claims['aud']
+    audiences = _audiences(audience if isinstance(audience, str) else tuple(audience))
+
+    if not isinstance(audience_claims, list) or not all(isinstance(claim, str) for claim in audience_claims):
+
+        raise InvalidAudienceError('Invalid claim format in token')
+
+    if not any(claim in audiences for claim in audience_claims):
+
+        raise InvalidAudienceError("Audience doesn't match")
@@ -0,0 +1,139 @@
+# batch.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Handle the batches from the event source mappings: SQS queues, Kinesis streams, and DynamoDB streams.
+# Each record carries its own bearer token, so every record is authorized on its own, but the tokens for
+# the batch are decided in one pass by verifier.decide_all (each distinct token once, one key lookup for
+# each kid). The records that are authorized are processed, and the records that are not, or fail in
+# processing, are reported in batchItemFailures so only they are retried. The mapping must have
+# ReportBatchItemFailures turned on; for a stream, processing restarts at the first failure.
+#
+# Where the token is found:
+#   SQS         the "authorization" message attribute (any case).
+#   Kinesis     the "authorization" field of the JSON object in the data.
+#   DynamoDB    the "authorization" string attribute of the new image.
+#
+
+import base64
+import binascii
+import json
+from logging import error, info
+
+from lambdaone import config
+from lambdaone import events
+from lambdaone import verifier
+
+SQS = 'aws:sqs'
+KINESIS = 'aws:kinesis'
+DYNAMODB = 'aws:dynamodb'
+
+SOURCES = ( SQS, KINESIS, DYNAMODB )
+
+def source(event):
+
+    # The event source of the batch is returned, or None if the event is not a batch from a mapping.
+
+    records = event.get('Records') if isinstance(event, dict) else None
+    result = None
+
+    if isinstance(records, list) and records and isinstance(records[0], dict):
+
+        result = records[0].get('eventSource')
+
+    return result if result in SOURCES else None
+
+def handle(event, configuration, process):
+
+    # process(record, claims) is called for each authorized record, claims is None when no authorization
+    # is required. An exception fails that record only.
+
+    event_source = source(event)
+    records = event['Records']
+    failures = []
+
+    if configuration.error:
+
+        # Nothing can be authorized, every record is failed so the batch is not consumed.
+
+        error('Bad configuration: %s', configuration.error)
+        decisions = [ None ] * len(records)
+
+    elif configuration.mode == config.MODE_NONE:
+
+        decisions = [ ( None, True ) ] * len(records)
+
+    elif configuration.mode == config.MODE_UPSTREAM:
+
+        # There is no upstream authorizer in front of a mapping.
+
+        error('Missing upstream claims')
+        decisions = [ None ] * len(records)
+
+    else:
+
+        tokens = [ token(event_source, record) for record in records ]
+        found = verifier.decide_all([ token for token in tokens if token is not None ], configuration)
+        decisions = [ None if token is None else found.pop(0) for token in tokens ]
+
+    for ( record, decision ) in zip(records, decisions):
+
+        identifier = item_identifier(event_source, record)
+
+        if decision is None or not decision[1]:
+
+            info('Access denied: %s', identifier)
+            failures.append({ 'itemIdentifier': identifier })
+
+        else:
+
+            try:
+
+                process(record, decision[0])
+
+            except Exception as e:
+
+                error(f'Record { identifier } failed: { e }')
+                failures.append({ 'itemIdentifier': identifier })
+
+    return { 'batchItemFailures': failures }
+
+def token(event_source, record):
+
+    # The bearer token for the record is returned, or None if the record does not carry one.
+
+    try:
+
+        if event_source == SQS:
+
+            attributes = record.get('messageAttributes') or {}
+            value = next((attribute.get('stringValue') for ( name, attribute ) in attributes.items() if name.lower() == 'authorization'), None)
+
+        elif event_source == KINESIS:
+
+            value = json.loads(base64.b64decode(record['kinesis']['data'])).get('authorization')
+
+        else:
+
+            value = record['dynamodb']['NewImage']['authorization']['S']
+
+    except ( AttributeError, KeyError, TypeError, ValueError, binascii.Error ):
+
+        value = None
+
+    return events.strip_bearer(value) if isinstance(value, str) else None
+
+def item_identifier(event_source, record):
+
+    if event_source == SQS:
+
+        result = record.get('messageId')
+
+    elif event_source == KINESIS:
+
+        result = record.get('kinesis', {}).get('sequenceNumber')
+
+    else:
+
+        result = record.get('dynamodb', {}).get('SequenceNumber')
+
+    return result
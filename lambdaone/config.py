@@ -0,0 +1,276 @@
+# config.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Build an immutable snapshot of the lambda configuration from the environment (and .env) once, during
+# the lambda init phase. The snapshot is validated when it is built, so a misconfiguration is found at
+# cold start instead of on every request; the handler only has to check the error property.
+#
+# python-dotenv is only imported if there is a .env file to read, the deployed lambda normally gets
+# the configuration from the function environment and does not pay for the import.
+#
+# Setting CONFIGRELOAD=true opts in to rebuilding the snapshot when the .env file is modified, which is
+# handy during local development. Nothing is checked on the request path unless it is set.
+#
+
+from dataclasses import dataclass
+import os
+import re
+import types
+
+from lambdaone import registry
+from lambdaone import scopes
+
+MODE_NONE = 'none'
+MODE_JWKS = 'jwks'
+MODE_FIXED = 'fixed'
+MODE_UPSTREAM = 'upstream'
+MODE_REGISTRY = 'registry'
+
+# The asymmetric algorithms the IdPs sign access tokens with; HMAC and "none" are never accepted.
+
+DEFAULT_ALGORITHMS = 'RS256, RS384, RS512, PS256, PS384, PS512, ES256, ES384, ES512, EdDSA'
+DEFAULT_MAX_TOKEN_LENGTH = 8192
+DEFAULT_DECISION_CACHE_SIZE = 1024
+DEFAULT_DECISION_CACHE_BYTES = 1048576
+DEFAULT_METRICS_NAMESPACE = 'LambdaOne'
+DEFAULT_METRICS_BATCH = 1
+DEFAULT_PROFILE_SAMPLE = 100
+DEFAULT_PROFILE_DIRECTORY = '/tmp/lambdaone-profiles'
+DEFAULT_PROFILE_MAX_BYTES = 52428800
+DEFAULT_JWKS_TTL = 300
+DEFAULT_JWKS_STALE = 300
+DEFAULT_JWKS_REFETCH = 30
+DEFAULT_JWKS_REFRESH_AHEAD = 60
+DEFAULT_JWKS_MAX_ISSUERS = 32
+DEFAULT_JWKS_CACHE_DIR = '/tmp/lambdaone-jwks'
+
+PROFILERS = ( 'cpu', 'memory' )
+
+@dataclass(frozen = True)
+class Configuration:
+
+    audience: str
+    issuer: str
+    require: scopes.Requirement
+    algorithms: frozenset
+    max_token_length: int
+    decision_cache_size: int
+    decision_cache_bytes: int
+    jwks_path: str
+    signature_key_path: str
+    log_level: str
+    mode: str
+    trust_upstream: bool
+    issuers: types.MappingProxyType
+    metrics: bool
+    metrics_namespace: str
+    metrics_batch: int
+    profile: frozenset
+    profile_sample: int
+    profile_directory: str
+    profile_max_bytes: int
+    jwks_ttl: int
+    jwks_stale: int
+    jwks_refetch: int
+    jwks_refresh_ahead: int
+    jwks_max_issuers: int
+    jwks_background: bool
+    jwks_persist: bool
+    jwks_cache_dir: str
+    error: str
+    reload: bool
+    dotenv_path: str
+    dotenv_mtime: int
+
+def load(override = False):
+
+    # The .env file is searched for once; the path and mtime are kept for reload.
+
+    dotenv_path = _find_dotenv()
+
+    if dotenv_path:
+
+        from dotenv import load_dotenv
+
+        load_dotenv(dotenv_path, override = override)
+
+    return _build(dotenv_path)
+
+def refresh(configuration):
+
+    # Return the same snapshot unless reloading is enabled and the .env file changed.
+
+    result = configuration
+
+    if configuration.reload and _mtime(configuration.dotenv_path) != configuration.dotenv_mtime:
+
+        result = load(override = True)
+
+    return result
+
+def _build(dotenv_path):
+
+    audience = os.environ.get('AUDIENCE') or None
+    issuer = os.environ.get('ISSUER') or None
+    jwks_path = os.environ.get('JWKSPATH') or None
+    signature_key_path = os.environ.get('SIGNATUREKEYPATH') or None
+    require = scopes.compile(os.environ.get('REQUIRE', ''))
+    algorithms = _split(os.environ.get('ALGORITHMS') or DEFAULT_ALGORITHMS)
+    trust_upstream = os.environ.get('TRUSTUPSTREAM', '').lower() == 'true'
+    errors = []
+    max_token_length = _integer('MAXTOKENLENGTH', DEFAULT_MAX_TOKEN_LENGTH, errors)
+    decision_cache_size = _integer('DECISIONCACHESIZE', DEFAULT_DECISION_CACHE_SIZE, errors)
+    decision_cache_bytes = _integer('DECISIONCACHEBYTES', DEFAULT_DECISION_CACHE_BYTES, errors)
+    metrics_batch = _integer('METRICSBATCH', DEFAULT_METRICS_BATCH, errors)
+    profile = _split(os.environ.get('PROFILE', '').lower())
+    profile_sample = _integer('PROFILESAMPLE', DEFAULT_PROFILE_SAMPLE, errors)
+    profile_max_bytes = _integer('PROFILEMAXBYTES', DEFAULT_PROFILE_MAX_BYTES, errors)
+    jwks_ttl = _integer('JWKSTTL', DEFAULT_JWKS_TTL, errors)
+    jwks_stale = _integer('JWKSSTALE', DEFAULT_JWKS_STALE, errors)
+    jwks_refetch = _integer('JWKSREFETCH', DEFAULT_JWKS_REFETCH, errors)
+    jwks_refresh_ahead = _integer('JWKSREFRESHAHEAD', DEFAULT_JWKS_REFRESH_AHEAD, errors)
+    jwks_max_issuers = _integer('JWKSMAXISSUERS', DEFAULT_JWKS_MAX_ISSUERS, errors)
+
+    if not profile <= frozenset(PROFILERS):
+
+        errors.append('PROFILE is not cpu, memory, or both')
+
+    issuers = types.MappingProxyType({})
+    mode = MODE_NONE
+    error = errors[0] if errors else None
+
+    if error is None and os.environ.get('ISSUERS'):
+
+        # Every token is checked against the issuer it names; the single issuer properties are not used.
+
+        try:
+
+            issuers = registry.load(os.environ['ISSUERS'], require)
+            mode = MODE_REGISTRY
+
+        except ( OSError, ValueError ) as e:
+
+            error = str(e)
+
+        if error is None and ( jwks_path or signature_key_path ):
+
+            error = 'ISSUERS cannot be used with JWKSPATH or SIGNATUREKEYPATH'
+
+    elif error is None and require:
+
+        if audience is None or issuer is None:
+
+            error = 'audience or issuer is not set'
+
+        elif trust_upstream and jwks_path is None and signature_key_path is None:
+
+            # Only claims verified by the HTTP API JWT authorizer are accepted, there is no key to check a token with.
+
+            mode = MODE_UPSTREAM
+
+        elif jwks_path is not None and signature_key_path is not None:
+
+            error = 'both JWKSPATH and SIGNATUREKEYPATH defined.'
+
+        elif signature_key_path is not None:
+
+            mode = MODE_FIXED
+
+        else:
+
+            # Without either the keys are found through the discovery document of the issuer.
+
+            jwks_path = jwks_path or registry.discovery_path(issuer)
+            mode = MODE_JWKS
+
+    return Configuration(
+        audience = audience,
+        issuer = issuer,
+        require = require,
+        algorithms = algorithms,
+        max_token_length = max_token_length,
+        decision_cache_size = decision_cache_size,
+        decision_cache_bytes = decision_cache_bytes,
+        jwks_path = jwks_path,
+        signature_key_path = signature_key_path,
+        log_level = os.environ.get('LAMBDA_LOG_LEVEL', 'ERROR'),
+        mode = mode,
+        trust_upstream = trust_upstream,
+        issuers = issuers,
+        metrics = os.environ.get('METRICS', '').lower() == 'true',
+        metrics_namespace = os.environ.get('METRICSNAMESPACE') or DEFAULT_METRICS_NAMESPACE,
+        metrics_batch = metrics_batch,
+        profile = profile,
+        profile_sample = profile_sample,
+        profile_directory = os.environ.get('PROFILEDIR') or DEFAULT_PROFILE_DIRECTORY,
+        profile_max_bytes = profile_max_bytes,
+        jwks_ttl = jwks_ttl,
+        jwks_stale = jwks_stale,
+        jwks_refetch = jwks_refetch,
+        jwks_refresh_ahead = jwks_refresh_ahead,
+        jwks_max_issuers = jwks_max_issuers,
+        jwks_background = os.environ.get('JWKSBACKGROUND', '').lower() == 'true',
+        jwks_persist = os.environ.get('JWKSPERSIST', '').lower() != 'false',
+        jwks_cache_dir = os.environ.get('JWKSCACHEDIR') or DEFAULT_JWKS_CACHE_DIR,
+        error = error,
+        reload = os.environ.get('CONFIGRELOAD', '').lower() == 'true',
+        dotenv_path = dotenv_path,
+        dotenv_mtime = _mtime(dotenv_path)
+    )
+
+def _find_dotenv():
+
+    # The same search as dotenv.find_dotenv from this module: up from this folder to the root.
+
+    result = ''
+    folder = os.path.dirname(os.path.abspath(__file__))
+
+    while True:
+
+        candidate = os.path.join(folder, '.env')
+
+        if os.path.isfile(candidate):
+
+            result = candidate
+            break
+
+        parent = os.path.dirname(folder)
+
+        if parent == folder:
+
+            break
+
+        folder = parent
+
+    return result
+
+def _integer(name, default, errors):
+
+    # A missing value is the default; anything that is not a whole number is a configuration error.
+
+    value = os.environ.get(name) or str(default)
+
+    if not value.isdigit():
+
+        errors.append(f'{ name } is not a number')
+        value = default
+
+    return int(value)
+
+def _split(value):
+
+    return frozenset(item for item in re.split(r'\s*,\s*', value.strip()) if item)
+
+def _mtime(path):
+
+    result = None
+
+    try:
+
+        result = os.stat(path).st_mtime_ns
+
+    except OSError:
+
+        result = None
+
+    return result
@@ -0,0 +1,46 @@
+# deadline.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Remember when the current invocation has to be finished, from context.get_remaining_time_in_millis(),
+# so the code that goes out to the network (the JWKS fetch) can size its timeouts to the time that is left
+# instead of letting a slow IdP use up the whole invocation. RESERVE seconds are held back to log and
+# answer. The init phase has no context, so warmup gives itself a budget with allow; outside of both (a
+# test calling the handler without a context) there is no deadline.
+#
+# The deadline belongs to the thread running the handler; a background thread (the JWKS refresher) is
+# not held to it.
+#
+
+import threading
+import time
+
+RESERVE = 0.5
+
+_state = threading.local()
+
+def start(context):
+
+    # Called at the top of the handler.
+
+    remaining = getattr(context, 'get_remaining_time_in_millis', None)
+
+    _state.deadline = time.monotonic() + remaining() / 1000 - RESERVE if callable(remaining) else None
+
+def allow(seconds):
+
+    # A deadline that is not from an invocation, e.g. the init phase, which Lambda limits to 10 seconds.
+
+    _state.deadline = time.monotonic() + seconds
+
+def clear():
+
+    _state.deadline = None
+
+def remaining(limit):
+
+    # The seconds left before the deadline, but no more than limit; may be zero or less when the time
+    # is up.
+
+    deadline = getattr(_state, 'deadline', None)
+
+    return limit if deadline is None else min(limit, deadline - time.monotonic())
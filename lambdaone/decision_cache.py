@@ -0,0 +1,108 @@
+# decision_cache.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Remember the outcome of verifying an access token, so a caller presenting the same token again
+# costs a dictionary lookup instead of a signature verification. The key is a SHA-256 digest of the
+# token (the token itself is never kept), and the entry holds the decoded claims and the scope
+# decision. Only tokens that passed verification are cached, and each entry is dropped no later than
+# the token exp claim; a token without exp is never cached.
+#
+# The cache is a LRU bounded by the number of entries and by an estimate of the memory used. A change to
+# the configuration clears it. A change to the keys is found by the caller: each entry keeps the source of
+# the key that verified the token, and get is passed a check that answers whether that key is still the
+# current one, so a rotated or revoked key stops authorizing the tokens it verified.
+#
+
+from collections import OrderedDict
+import hashlib
+import time
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 1048576
+
+# Rough per-entry overhead in bytes on top of the payload: the digest, the tuple and the dict.
+
+ENTRY_OVERHEAD = 400
+
+_entries = OrderedDict()    # digest -> ( expires, decision, size, source )
+_limits = { 'entries': DEFAULT_MAX_ENTRIES, 'bytes': DEFAULT_MAX_BYTES }
+_counters = { 'hits': 0, 'misses': 0, 'bytes': 0 }
+
+def configure(max_entries = DEFAULT_MAX_ENTRIES, max_bytes = DEFAULT_MAX_BYTES):
+
+    # Set the limits and start over; zero entries disables the cache.
+
+    _limits['entries'] = max_entries
+    _limits['bytes'] = max_bytes
+
+    clear()
+
+def clear():
+
+    _entries.clear()
+    _counters['bytes'] = 0
+
+def get(token, current = None):
+
+    # The ( claims, allowed ) decision is returned, or None on a miss. If current is given it is called with
+    # the source saved by put, and an entry whose key is no longer current is dropped.
+
+    result = None
+    digest = _digest(token)
+    entry = _entries.get(digest)
+
+    if entry is not None:
+
+        if entry[0] > time.time() and ( current is None or current(entry[3]) ):
+
+            _entries.move_to_end(digest)
+            result = entry[1]
+
+        else:
+
+            _remove(digest)
+
+    _counters['hits' if result is not None else 'misses'] += 1
+
+    return result
+
+def put(token, decision, payload_size, source = None):
+
+    claims = decision[0]
+
+    try:
+
+        expires = float(claims['exp'])
+
+    except ( KeyError, OverflowError, TypeError, ValueError ):
+
+        expires = None
+
+    size = payload_size + ENTRY_OVERHEAD
+
+    if expires is not None and expires > time.time() and _limits['entries'] > 0 and size <= _limits['bytes']:
+
+        digest = _digest(token)
+
+        if digest in _entries:
+
+            _remove(digest)
+
+        _entries[digest] = ( expires, decision, size, source )
+        _counters['bytes'] += size
+
+        while len(_entries) > _limits['entries'] or _counters['bytes'] > _limits['bytes']:
+
+            _remove(next(iter(_entries)))
+
+def stats():
+
+    return { 'hits': _counters['hits'], 'misses': _counters['misses'], 'entries': len(_entries), 'bytes': _counters['bytes'] }
+
+def _digest(token):
+
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+def _remove(digest):
+
+    _counters['bytes'] -= _entries.pop(digest)[2]
@@ -0,0 +1,121 @@
+# events.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Adapt the lambda to the event sources that can call it: API Gateway REST APIs (payload version 1.0),
+# HTTP APIs (2.0), Function URLs (the 2.0 format), and Application Load Balancers with or without
+# multi-value headers. The shape of the event is detected once per invocation, the headers are looked up
+# without regard to case (REST APIs and ALBs keep the case the client sent) without copying the header
+# map, and the response is shaped for the source.
+#
+# The error responses never change, so they are built and their bodies serialized once when the module
+# is loaded. They are shared, so the caller must not modify them.
+#
+# An event that does not match any of the sources (e.g. a test event) gets the original responses: the
+# errors as { statusCode, body } and a success as the bare body.
+#
+
+import json
+import re
+
+REST = 'rest'
+HTTP = 'http'
+FUNCTION_URL = 'url'
+ALB = 'alb'
+ALB_MULTI = 'alb-multi'
+OTHER = 'other'
+
+KINDS = ( REST, HTTP, FUNCTION_URL, ALB, ALB_MULTI, OTHER )
+
+BAD_CONFIGURATION = ( 400, 'Bad configuration' )
+BAD_REQUEST = ( 400, 'Bad request' )
+ACCESS_DENIED = ( 403, 'Access denied' )
+
+JSON = 'application/json'
+TEXT = 'text/plain'
+
+_reasons = { 200: 'OK', 400: 'Bad Request', 403: 'Forbidden' }
+_bearer = re.compile(r'^bearer\s*', re.IGNORECASE)
+
+def detect(event):
+
+    request_context = event.get('requestContext') or {}
+
+    if 'elb' in request_context:
+
+        result = ALB_MULTI if 'multiValueHeaders' in event else ALB
+
+    elif event.get('version') == '2.0':
+
+        result = FUNCTION_URL if '.lambda-url.' in (request_context.get('domainName') or '') else HTTP
+
+    elif 'httpMethod' in event:
+
+        result = REST
+
+    else:
+
+        result = OTHER
+
+    return result
+
+def header(event, name):
+
+    # The name must be lowercase. The exact match is tried first, HTTP APIs and Function URLs already
+    # send the names in lowercase; the first value of a multi-value header is used.
+
+    result = None
+    headers = event.get('headers')
+
+    if headers:
+
+        result = headers.get(name)
+
+        if result is None:
+
+            result = next((value for ( key, value ) in headers.items() if key.lower() == name), None)
+
+    elif event.get('multiValueHeaders'):
+
+        headers = event['multiValueHeaders']
+        values = headers.get(name) or next((value for ( key, value ) in headers.items() if key.lower() == name), None)
+        result = values[0] if values else None
+
+    return result
+
+def bearer_token(event):
+
+    return strip_bearer(header(event, 'authorization'))
+
+def strip_bearer(value):
+
+    return _bearer.sub('', value, count = 1) if value else None
+
+def response(kind, status, body, content_type = TEXT):
+
+    if kind == OTHER:
+
+        result = body if status == 200 else { 'statusCode': status, 'body': body }
+
+    else:
+
+        result = { 'statusCode': status, 'body': body, 'isBase64Encoded': False }
+
+        if kind == ALB_MULTI:
+
+            result['multiValueHeaders'] = { 'Content-Type': [ content_type ] }
+
+        else:
+
+            result['headers'] = { 'Content-Type': content_type }
+
+        if kind in ( ALB, ALB_MULTI ):
+
+            result['statusDescription'] = f'{ status } { _reasons.get(status, "") }'.strip()
+
+    return result
+
+def error_response(kind, error):
+
+    return _errors[( kind, error )]
+
+_errors = { ( kind, error ): response(kind, error[0], json.dumps(error[1]), JSON) for kind in KINDS for error in ( BAD_CONFIGURATION, BAD_REQUEST, ACCESS_DENIED ) }
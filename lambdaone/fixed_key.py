@@ -3,28 +3,79 @@
 #
 # Use PyJWT to load the signing key from a public key store.
 #
+# The PEM file is parsed into a cryptography public key object once and cached by path, so a warm
+# lambda does not read or parse the file again. The cache entry is checked against os.stat and
+# replaced if the file has been modified (the mtime, inode, or size changed).
+#
 
-from jwt import get_unverified_header
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
 from logging import error
+import os
+
+# The cache maps the path to a tuple: ( ( st_mtime_ns, st_ino, st_size ), public key ).
 
-def load(path, token):
+_cache = {}
+
+def load(path, access_token):
 
     signing_key = None
     algorithm = None
 
     try:
 
-        with open(path) as keydata:
-
-            signing_key = keydata.read()
-
-        algorithm = get_unverified_header(token)['alg']
+        signing_key = _load_key(path)
+        algorithm = access_token.header['alg']
 
     except Exception as e:
-        
+
         error(f'Cannot read key file: { e }')
 
         signing_key = None
         algorithm = None
-    
-    return ( signing_key, algorithm )
\ No newline at end of file
+
+    return ( signing_key, algorithm )
+
+def preload(path):
+
+    # Parse and cache the key ahead of the first token, e.g. in the init phase. The key is returned;
+    # errors are raised to the caller.
+
+    return _load_key(path)
+
+def current(path, signing_key):
+
+    # True if the key is still the one in the file. The file is only read again if it changed, and a file
+    # that cannot be read is not current.
+
+    try:
+
+        result = _load_key(path) is signing_key
+
+    except Exception as e:
+
+        error(f'Cannot read key file: { e }')
+        result = False
+
+    return result
+
+def clear():
+
+    # Drop all of the parsed keys; the next load for any path reads the file again.
+
+    _cache.clear()
+
+def _load_key(path):
+
+    stat = os.stat(path)
+    signature = ( stat.st_mtime_ns, stat.st_ino, stat.st_size )
+    entry = _cache.get(path)
+
+    if entry is None or entry[0] != signature:
+
+        with open(path, 'rb') as keydata:
+
+            entry = ( signature, load_pem_public_key(keydata.read()) )
+
+        _cache[path] = entry
+
+    return entry[1]
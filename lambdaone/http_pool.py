@@ -0,0 +1,212 @@
+# http_pool.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# A small pool of keep-alive HTTP/1.1 connections for the GET requests the lambda makes (the JWKS), kept at
+# the module level so a warm lambda reuses the TCP connection and the TLS session instead of opening a new
+# one for every fetch. Each request is given a connect timeout and an absolute deadline (time.monotonic)
+# for the whole request, so the caller can fit it to the time left in the invocation. The time left is
+# worked out again before connecting and before every read, and the body is read in chunks, so a server
+# that sends the response a byte at a time cannot hold the request past the deadline.
+#
+# A connection that sat idle while the execution environment was frozen may have been closed by the
+# server; if a reused connection fails before any response arrives, the request is sent once more on a
+# new connection.
+#
+# Redirects are followed like urlopen does, but no more than MAX_REDIRECTS of them, and all of the requests
+# are held to the one deadline.
+#
+
+from dataclasses import dataclass
+from http.client import HTTPConnection, HTTPException, HTTPSConnection, RemoteDisconnected
+from logging import debug
+import ssl
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+MAX_IDLE = 2        # Idle connections kept for each host.
+MAX_REDIRECTS = 5
+REDIRECTS = ( 301, 302, 303, 307, 308 )
+CHUNK = 16384
+
+@dataclass(frozen = True)
+class Response:
+
+    status: int
+    headers: object     # http.client.HTTPMessage, get() is case-insensitive.
+    body: bytes
+
+_idle = {}          # ( scheme, host, port ) -> [ connection ]
+_lock = threading.Lock()
+_ssl_context = None
+
+def get(url, headers, connect_timeout, deadline):
+
+    result = _get(url, headers, connect_timeout, deadline)
+    redirects = 0
+
+    while result.status in REDIRECTS and result.headers.get('Location'):
+
+        if redirects == MAX_REDIRECTS:
+
+            raise OSError(f'More than { MAX_REDIRECTS } redirects from { url }')
+
+        redirects += 1
+        url = urljoin(url, result.headers['Location'])
+
+        debug('http_pool redirected to %s', url)
+
+        result = _get(url, headers, connect_timeout, deadline)
+
+    return result
+
+def clear():
+
+    with _lock:
+
+        for connections in _idle.values():
+
+            for connection in connections:
+
+                connection.close()
+
+        _idle.clear()
+
+def _get(url, headers, connect_timeout, deadline):
+
+    parts = urlsplit(url)
+    origin = ( parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80) )
+    target = parts.path or '/'
+
+    if parts.query:
+
+        target = f'{ target }?{ parts.query }'
+
+    result = None
+    connection = _checkout(origin)
+
+    if connection is not None:
+
+        try:
+
+            result = _request(origin, connection, target, headers, deadline)
+
+        except ( RemoteDisconnected, BrokenPipeError, ConnectionResetError ) as e:
+
+            debug('http_pool reconnecting to %s: %s', origin[1], e)
+
+    if result is None:
+
+        connection = _connect(origin, min(connect_timeout, _left(deadline)))
+        result = _request(origin, connection, target, headers, deadline)
+
+    return result
+
+def _checkout(origin):
+
+    with _lock:
+
+        connections = _idle.get(origin)
+        result = connections.pop() if connections else None
+
+    return result
+
+def _checkin(origin, connection):
+
+    with _lock:
+
+        connections = _idle.setdefault(origin, [])
+
+        if len(connections) < MAX_IDLE:
+
+            connections.append(connection)
+            connection = None
+
+    if connection is not None:
+
+        connection.close()
+
+def _connect(origin, timeout):
+
+    global _ssl_context
+
+    ( scheme, host, port ) = origin
+
+    if scheme == 'https':
+
+        if _ssl_context is None:
+
+            _ssl_context = ssl.create_default_context()
+
+        connection = HTTPSConnection(host, port, timeout = timeout, context = _ssl_context)
+
+    elif scheme == 'http':
+
+        connection = HTTPConnection(host, port, timeout = timeout)
+
+    else:
+
+        raise ValueError(f'Unsupported URL scheme: { scheme }')
+
+    connection.connect()
+
+    return connection
+
+def _left(deadline):
+
+    # The seconds left before the deadline; TimeoutError if there are none.
+
+    result = deadline - time.monotonic()
+
+    if result <= 0:
+
+        raise TimeoutError('The deadline for the request has passed')
+
+    return result
+
+def _request(origin, connection, target, headers, deadline):
+
+    # The connection is only returned to the pool after the whole body is read, and only if the server
+    # did not ask to close it. The socket is kept because the connection lets go of it if the response
+    # closes the connection.
+
+    sock = connection.sock
+
+    try:
+
+        sock.settimeout(_left(deadline))
+        connection.request('GET', target, headers = { 'Connection': 'keep-alive', **headers })
+        response = connection.getresponse()
+        chunks = []
+
+        while True:
+
+            sock.settimeout(_left(deadline))
+            chunk = response.read1(CHUNK)
+
+            if not chunk:
+
+                break
+
+            chunks.append(chunk)
+
+        # read1 does not finish the response when the body ends at its Content-Length; read does, so the
+        # connection can send the next request.
+
+        response.read()
+        result = Response(status = response.status, headers = response.headers, body = b''.join(chunks))
+
+    except ( OSError, HTTPException ):
+
+        connection.close()
+        raise
+
+    if response.will_close:
+
+        connection.close()
+
+    else:
+
+        _checkin(origin, connection)
+
+    return result
@@ -3,31 +3,627 @@
 #
 # Use PyJWT to load the signing key from a public key store.
 #
+# The JWKS document is cached at the module level so it survives across warm invocations of the
+# lambda; only a cold start, an expired key set, or a kid that is not in the set goes back to the IdP.
+# The keys are indexed by kid so the lookup for a token is a dictionary hit.
+#
+# Only one fetch per path is in flight at a time. When the key set expires it is still served for a
+# grace period (JWKSSTALE) while one caller refreshes it; the other callers do not wait. A caller that
+# has no usable key set waits for the fetch in flight instead of starting its own. An unknown kid only
+# forces a refetch if the key set is older than JWKSREFETCH seconds, so a burst of tokens with a bad
+# kid (or a rotation the IdP has not published yet) does not turn into a burst of requests to the IdP.
+#
+# The fetched document is also saved in JWKSCACHEDIR (default /tmp/lambdaone-jwks) with its ETag,
+# Last-Modified and fetch time, so a new runtime in the same sandbox starts with the key set instead of
+# downloading it, and an expired key set is revalidated with If-None-Match and If-Modified-Since: when the
+# IdP answers 304 the keys already converted are kept. The file is replaced atomically and has a version
+# number; a file that cannot be read or is from another version is ignored. JWKSPERSIST=false turns the
+# file off.
+#
+# The fetch goes through http_pool, so a warm lambda reuses the connection to the IdP, and a few redirects
+# are followed. The whole fetch, connecting and reading the body, must finish in FETCH_TIMEOUT seconds or
+# the time left in the invocation (see deadline), whichever is sooner, and if there is no time left the
+# fetch is not started; a slow IdP costs the request a 403 or the stale key set, not a timeout of the
+# whole lambda.
+#
+# With JWKSBACKGROUND=true a refresher thread for each path fetches the key set JWKSREFRESHAHEAD seconds
+# before it expires, so no request waits for the IdP, and swaps the new entry in with one assignment. A
+# failed fetch is tried again with an exponential backoff. A thread does not run while the execution
+# environment is frozen, and the monotonic clock may not advance either, so the request path compares the
+# wall clock with the monotonic clock: a gap means the environment was thawed, the cached entries are aged
+# by the gap, and the refresher is woken to catch up. Nothing depends on a timer firing while frozen.
+#
+# Each path (one for each issuer, see registry) has its own entry, lock and refresher, so a key rotation or
+# an outage at one IdP does not stall the others. The cache holds at most JWKSMAXISSUERS (default 32) key
+# sets, and as many discovery documents, so an issuer found through discovery takes one place of each; past
+# that the path of the same kind used least recently is dropped along with its refresher, and fetched again
+# if it is needed.
+#
+# The JWKS* settings are read and checked with the rest of the configuration (see config) and passed in
+# through configure.
+#
+# The path may also be the OpenID Connect discovery document of the issuer (see registry.discovery_path),
+# e.g. when only the issuer is configured. The document is fetched, cached, saved, revalidated and refreshed
+# exactly like a key set, under its own path, and its jwks_uri is the path the keys are loaded from; a warm
+# request resolves it from memory without a round trip. The document must name the issuer it was fetched for.
+#
+
+from collections import OrderedDict
+import hashlib
+import json
+from jwt import PyJWKSet
+from logging import debug, error
+import os
+import re
+import threading
+import time
+
+from lambdaone import deadline
+from lambdaone import http_pool
+from lambdaone import registry
+
+DEFAULT_TTL = 300
+DEFAULT_STALE = 300
+DEFAULT_REFETCH = 30
+DEFAULT_REFRESH_AHEAD = 60
+DEFAULT_MAX_ISSUERS = 32
+BACKOFF_MAX = 60
+THAW_GAP = 1
+CONNECT_TIMEOUT = 5
+FETCH_TIMEOUT = 30
+DEFAULT_CACHE_DIR = '/tmp/lambdaone-jwks'
+SNAPSHOT_VERSION = 1
+
+# The cache maps the JWKS path to an entry: { 'keys': { kid: PyJWK }, 'fetched', 'attempted', 'expires', 'stale',
+# 'jwks', 'etag', 'last_modified' }, in the order the paths were used. The times are monotonic, and 'attempted'
+# is the last fetch, even a failed one. The entry for a discovery document has the document in 'jwks' and no
+# keys. The locks map the JWKS path to the lock held by the fetch in flight; the cache lock guards the order
+# of the cache.
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_locks = {}
+
+# The refreshers map the JWKS path to ( thread, wake, stop ); the clock is the last wall and monotonic times
+# seen on the request path.
+
+_refreshers = {}
+_refreshers_lock = threading.Lock()
+_clock = { 'wall': None, 'monotonic': None }
+
+# The settings are the JWKS* values of the configuration, see configure.
 
-import jwt
-from jwt import PyJWKClient
-from logging import error
+_settings = { 'ttl': DEFAULT_TTL, 'stale': DEFAULT_STALE, 'refetch': DEFAULT_REFETCH, 'refresh_ahead': DEFAULT_REFRESH_AHEAD,
+    'max_issuers': DEFAULT_MAX_ISSUERS, 'background': False, 'persist': True, 'cache_dir': DEFAULT_CACHE_DIR }
+
+def configure(ttl = DEFAULT_TTL, stale = DEFAULT_STALE, refetch = DEFAULT_REFETCH, refresh_ahead = DEFAULT_REFRESH_AHEAD, max_issuers = DEFAULT_MAX_ISSUERS,
+    background = False, persist = True, cache_dir = DEFAULT_CACHE_DIR):
+
+    # The settings are validated by config when the snapshot is built, they are not read on the request path.
+    # The key sets already cached keep their times, the new settings apply from the next fetch.
+
+    _settings.update(ttl = ttl, stale = stale, refetch = refetch, refresh_ahead = refresh_ahead, max_issuers = max_issuers,
+        background = background, persist = persist, cache_dir = cache_dir)
+
+def load(path, access_token):
 
-def load(path, token):
-    
     signing_key = None
     algorithm = None
 
     try:
 
         # Get the signing key (the URI is injected via the environment). This example follows the path where
-        # a public endpoint provides a JSON array of public keys. The PyJWKC client will check the token
-        # header to find the kid of the required key and isolate it.
+        # a public endpoint provides a JSON array of public keys. The kid in the token header (parsed once by
+        # access_token.parse) identifies the key required to check the signature.
+
+        kid = access_token.header.get('kid')
+
+        _check_thaw()
+
+        path = _resolve(path)
+
+        if _settings['background']:
 
-        jwks_client = PyJWKClient(path)
-        signing_key = jwks_client.get_signing_key_from_jwt(token)
-        algorithm = jwt.get_unverified_header(token)['alg']
+            _start_refresher(path)
+
+        signing_key = _find_key(path, kid)
+        algorithm = access_token.header['alg']
 
     except Exception as e:
-        
+
         error(f'Bad signing key path, key, or algorithm not found: { e }')
 
         signing_key = None
         algorithm = None
 
-    return ( signing_key, algorithm )
\ No newline at end of file
+    return ( signing_key, algorithm )
+
+def prefetch(path):
+
+    # Fetch the key set ahead of the first token, e.g. in the init phase, unless a current one is
+    # cached. The keys are returned indexed by kid; errors are raised to the caller.
+
+    path = _resolve(path)
+    entry = _cached(path)
+
+    if entry is None or entry['expires'] <= time.monotonic():
+
+        entry = _refresh(path, entry, True)
+
+    if _settings['background']:
+
+        _start_refresher(path)
+
+    return entry['keys']
+
+def current(path, kid, signing_key):
+
+    # True if the key set cached for the path (through its discovery document) still has this key for the
+    # kid and is not past its stale time. Nothing is fetched: a key set that was refetched, dropped or is too
+    # old is not current, and the token is verified again. A 304 keeps the keys, so they stay current.
+
+    entry = _cache.get(path)
+
+    if entry is not None and path.endswith(registry.DISCOVERY):
+
+        entry = _cache.get(entry['jwks']['jwks_uri'])
+
+    return entry is not None and entry['keys'].get(kid) is signing_key and entry['stale'] > time.monotonic()
+
+def clear():
+
+    # Drop all of the cached key sets; the next load for any path goes back to the saved file, or the IdP.
+    # The refreshers are stopped, the next load starts them again.
+
+    with _refreshers_lock:
+
+        for ( thread, wake, stop ) in _refreshers.values():
+
+            stop.set()
+            wake.set()
+
+        _refreshers.clear()
+
+    _cache.clear()
+    _clock.update(wall = None, monotonic = None)
+
+def _resolve(path):
+
+    # The jwks_uri from the discovery document, or the path itself if it is not a discovery document.
+
+    result = path
+
+    if path.endswith(registry.DISCOVERY):
+
+        if _settings['background']:
+
+            _start_refresher(path)
+
+        now = time.monotonic()
+        entry = _cached(path)
+
+        if entry is None or entry['stale'] <= now:
+
+            entry = _refresh(path, entry, True)
+
+        elif entry['expires'] <= now:
+
+            entry = _refresh(path, entry, False)
+
+        result = entry['jwks']['jwks_uri']
+
+    return result
+
+def _find_key(path, kid):
+
+    now = time.monotonic()
+    entry = _cached(path)
+
+    # An unknown kid may mean the IdP rotated the keys, so an unknown kid forces one refetch even
+    # if the cached key set has not expired yet, but not more often than JWKSREFETCH allows. A failed
+    # fetch counts too, or every unknown kid would wait for an IdP that is down.
+
+    if entry is None or entry['stale'] <= now or ( kid not in entry['keys'] and entry['attempted'] + _settings['refetch'] <= now ):
+
+        entry = _refresh(path, entry, True)
+
+    elif entry['expires'] <= now:
+
+        entry = _refresh(path, entry, False)
+
+    signing_key = entry['keys'].get(kid)
+
+    if signing_key is None:
+
+        raise KeyError(f'Unable to find a signing key that matches: { kid }')
+
+    return signing_key
+
+def _refresh(path, entry, blocking):
+
+    # Without blocking the stale entry is returned if another caller is already fetching, or if the
+    # fetch fails; the failed refresh is not tried again for JWKSREFETCH seconds. A blocking caller waits
+    # for the fetch in flight no longer than the time left in the invocation (the refresher may be holding
+    # the lock for a whole FETCH_TIMEOUT), and then gets the entry if it is not past its stale time.
+
+    lock = _locks.setdefault(path, threading.Lock())
+    acquired = lock.acquire(timeout = max(deadline.remaining(FETCH_TIMEOUT), 0)) if blocking else lock.acquire(blocking = False)
+
+    if not acquired:
+
+        if blocking and ( entry is None or entry['stale'] <= time.monotonic() ):
+
+            raise TimeoutError('No time left in the invocation to wait for the JWKS fetch in flight')
+
+        return entry
+
+    try:
+
+        result = _cache.get(path)
+
+        # If another caller replaced the entry while this one waited for the lock, use theirs. An entry dropped
+        # from the cache meanwhile is fetched again.
+
+        if result is entry or result is None:
+
+            try:
+
+                result = _fetch(path, entry)
+                _store(path, result)
+
+            except Exception as e:
+
+                if entry is not None:
+
+                    now = time.monotonic()
+                    result = { **entry, 'attempted': now } if blocking else { **entry, 'attempted': now, 'expires': now + _settings['refetch'] }
+                    _store(path, result)
+
+                if blocking:
+
+                    raise
+
+                error(f'JWKS refresh failed, using the stale key set: { e }')
+
+    finally:
+
+        lock.release()
+
+    return result
+
+def _start_refresher(path):
+
+    entry = _refreshers.get(path)
+
+    if entry is None or not entry[0].is_alive():
+
+        with _refreshers_lock:
+
+            entry = _refreshers.get(path)
+
+            if entry is None or not entry[0].is_alive():
+
+                wake = threading.Event()
+                stop = threading.Event()
+                thread = threading.Thread(target = _run_refresher, args = ( path, wake, stop ), name = 'jwks-refresher', daemon = True)
+                _refreshers[path] = ( thread, wake, stop )
+
+                thread.start()
+
+def _stop_refresher(path):
+
+    with _refreshers_lock:
+
+        entry = _refreshers.pop(path, None)
+
+    if entry is not None:
+
+        ( thread, wake, stop ) = entry
+
+        stop.set()
+        wake.set()
+
+def _run_refresher(path, wake, stop):
+
+    failures = 0
+
+    while not stop.is_set():
+
+        wake.wait(_refresh_delay(_cache.get(path), failures))
+        wake.clear()
+
+        if stop.is_set():
+
+            break
+
+        entry = _cache.get(path)
+
+        if entry is None or entry['expires'] - _settings['refresh_ahead'] <= time.monotonic():
+
+            try:
+
+                _refresh(path, entry, True)
+                failures = 0
+
+            except Exception as e:
+
+                failures += 1
+                error(f'JWKS background refresh failed ({ failures }): { e }')
+
+def _refresh_delay(entry, failures):
+
+    # Seconds until the next refresh: ahead of expiry, but no sooner than JWKSREFETCH (at least a second)
+    # after the last fetch, or the backoff after a failure.
+
+    if failures:
+
+        result = min(2 ** (failures - 1), BACKOFF_MAX)
+
+    elif entry is None:
+
+        result = 0
+
+    else:
+
+        now = time.monotonic()
+        interval = max(_settings['refetch'], 1)
+        result = max(entry['expires'] - _settings['refresh_ahead'] - now, entry['fetched'] + interval - now, 0)
+
+    return result
+
+def _check_thaw():
+
+    # If the wall clock moved further than the monotonic clock since the last request, the environment was
+    # frozen and the monotonic times in the cache did not count the time. The entries are aged by the gap
+    # (a new dictionary is swapped in for each), and the refreshers are woken.
+
+    wall = time.time()
+    monotonic = time.monotonic()
+    gap = 0
+
+    if _clock['wall'] is not None:
+
+        gap = (wall - _clock['wall']) - (monotonic - _clock['monotonic'])
+
+    _clock.update(wall = wall, monotonic = monotonic)
+
+    if gap > THAW_GAP:
+
+        debug('jwt_key thawed after %.1f seconds', gap)
+
+        with _cache_lock:
+
+            for ( path, entry ) in _cache.items():
+
+                _cache[path] = { **entry, 'fetched': entry['fetched'] - gap, 'attempted': entry['attempted'] - gap, 'expires': entry['expires'] - gap,
+                    'stale': entry['stale'] - gap }
+
+        for ( thread, wake, stop ) in list(_refreshers.values()):
+
+            wake.set()
+
+def _cached(path):
+
+    # The entry in memory, or the one saved by an earlier runtime in this sandbox. The path becomes the one
+    # used most recently.
+
+    with _cache_lock:
+
+        entry = _cache.get(path)
+
+        if entry is not None:
+
+            _cache.move_to_end(path)
+
+    if entry is None:
+
+        entry = _restore(path)
+
+        if entry is not None:
+
+            entry = _store(path, entry, False)
+
+    return entry
+
+def _store(path, entry, replace = True):
+
+    # Put the entry in the cache as the path used most recently, and drop the paths of the same kind (key set or
+    # discovery document) used least recently past JWKSMAXISSUERS. Without replace an entry already cached for
+    # the path is kept. The entry cached is returned.
+
+    discovery = path.endswith(registry.DISCOVERY)
+
+    with _cache_lock:
+
+        if replace or path not in _cache:
+
+            _cache[path] = entry
+
+        _cache.move_to_end(path)
+        entry = _cache[path]
+
+        paths = [ name for name in _cache if name.endswith(registry.DISCOVERY) == discovery ]
+        evicted = paths[:max(len(paths) - max(_settings['max_issuers'], 1), 0)]
+
+        for name in evicted:
+
+            del _cache[name]
+
+    for name in evicted:
+
+        debug('jwt_key dropped the key set for %s', name)
+        _stop_refresher(name)
+
+    return entry
+
+def _fetch(path, entry):
+
+    debug('jwt_key fetching JWKS from %s', path)
+
+    headers = {}
+
+    if entry is not None and entry.get('etag'):
+
+        headers['If-None-Match'] = entry['etag']
+
+    if entry is not None and entry.get('last_modified'):
+
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    timeout = deadline.remaining(FETCH_TIMEOUT)
+
+    if timeout <= 0:
+
+        raise TimeoutError('No time left in the invocation to fetch the JWKS')
+
+    response = http_pool.get(path, headers, CONNECT_TIMEOUT, time.monotonic() + timeout)
+
+    if response.status == 304 and entry is not None:
+
+        # Not modified: the keys are kept, only the lifetime starts over.
+
+        debug('jwt_key JWKS not modified at %s', path)
+
+        result = _entry(path, entry['jwks'], _lifetime(response.headers), time.monotonic(), entry['etag'], entry['last_modified'], entry['keys'])
+
+    elif response.status == 200:
+
+        jwks = json.loads(response.body)
+        result = _entry(path, jwks, _lifetime(response.headers), time.monotonic(), response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    else:
+
+        raise OSError(f'JWKS fetch failed with HTTP { response.status }')
+
+    _persist(path, result)
+
+    return result
+
+def _entry(path, jwks, lifetime, fetched, etag, last_modified, keys = None):
+
+    if keys is None:
+
+        keys = _keys(path, jwks)
+
+    return { 'keys': keys, 'fetched': fetched, 'attempted': fetched, 'expires': fetched + lifetime, 'stale': fetched + lifetime + _settings['stale'],
+        'jwks': jwks, 'etag': etag, 'last_modified': last_modified }
+
+def _keys(path, document):
+
+    if path.endswith(registry.DISCOVERY):
+
+        # A document for another issuer could point at keys the issuer does not control.
+
+        issuer = path[:-len(registry.DISCOVERY)]
+
+        if not isinstance(document.get('issuer'), str) or document['issuer'].rstrip('/') != issuer.rstrip('/') or not isinstance(document.get('jwks_uri'), str):
+
+            raise ValueError(f'Discovery document is not for { issuer } or has no jwks_uri')
+
+        result = {}
+
+    else:
+
+        result = { key.key_id: key for key in PyJWKSet.from_dict(document).keys if key.key_id and key.public_key_use in ( 'sig', None ) }
+
+    return result
+
+def _lifetime(headers):
+
+    # The TTL is the upper bound, the IdP may ask for a shorter lifetime with Cache-Control.
+
+    result = _settings['ttl']
+    max_age = _max_age(headers.get('Cache-Control')) if headers is not None else None
+
+    if max_age is not None:
+
+        result = min(result, max_age)
+
+    return result
+
+def _snapshot_path(path):
+
+    result = None
+
+    if _settings['persist']:
+
+        result = os.path.join(_settings['cache_dir'], f'{ hashlib.sha256(path.encode()).hexdigest() }.json')
+
+    return result
+
+def _persist(path, entry):
+
+    # The fetch time is saved as wall clock time, the monotonic clock does not carry over to a new runtime.
+    # The file is written beside the snapshot and renamed over it, a reader never sees half of it.
+
+    target = _snapshot_path(path)
+
+    if target is not None:
+
+        now = time.monotonic()
+        snapshot = { 'version': SNAPSHOT_VERSION, 'path': path, 'fetched_at': time.time() - (now - entry['fetched']), 'lifetime': entry['expires'] - entry['fetched'],
+            'etag': entry['etag'], 'last_modified': entry['last_modified'], 'jwks': entry['jwks'] }
+        temporary = f'{ target }.{ os.getpid() }.{ threading.get_ident() }.tmp'
+
+        try:
+
+            os.makedirs(os.path.dirname(target), exist_ok = True)
+
+            with open(temporary, 'w') as fp:
+
+                json.dump(snapshot, fp)
+
+            os.replace(temporary, target)
+
+        except OSError as e:
+
+            error(f'JWKS snapshot not saved: { e }')
+
+def _restore(path):
+
+    result = None
+    target = _snapshot_path(path)
+
+    if target is not None:
+
+        try:
+
+            with open(target, 'r') as fp:
+
+                snapshot = json.load(fp)
+
+            if snapshot.get('version') == SNAPSHOT_VERSION and snapshot.get('path') == path:
+
+                age = max(time.time() - snapshot['fetched_at'], 0)
+                result = _entry(path, snapshot['jwks'], snapshot['lifetime'], time.monotonic() - age, snapshot.get('etag'), snapshot.get('last_modified'))
+
+                debug('jwt_key restored JWKS for %s, %d seconds old', path, age)
+
+        except FileNotFoundError:
+
+            result = None
+
+        except Exception as e:
+
+            error(f'JWKS snapshot ignored: { e }')
+            result = None
+
+    return result
+
+def _max_age(cache_control):
+
+    result = None
+
+    if cache_control:
+
+        match = re.search(r'max-age\s*=\s*(\d+)', cache_control)
+
+        if match:
+
+            result = int(match.group(1))
+
+        elif re.search(r'no-cache|no-store', cache_control):
+
+            result = 0
+
+    return result
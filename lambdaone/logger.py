@@ -4,11 +4,17 @@
 # Initialize the logging environment. In this case that means sending the
 # logging to stdout, where it will be picked up by the container logging.
 #
+# The root logger lives as long as the execution environment, so the handler is added only
+# once and identified by name; calling initialize again only changes the level. Otherwise
+# every warm invocation would add another handler and each line would be written N times.
+#
 
 import logging
 from logging import Formatter, getLogger, StreamHandler
 import sys
 
+HANDLER_NAME = 'lambdaone'
+
 def initialize(log_level):
 
     logger = getLogger()
@@ -24,10 +30,19 @@ def initialize(log_level):
 
         log_level = logging.NOTSET
 
-    handler = StreamHandler(sys.stdout)
-    handler.setLevel(log_level)
+    handler = next((handler for handler in logger.handlers if handler.get_name() == HANDLER_NAME), None)
+
+    if handler is None:
+
+        handler = StreamHandler(sys.stdout)
+        handler.set_name(HANDLER_NAME)
+        handler.setLevel(log_level)
+
+        formatter = Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+
+        logger.addHandler(handler)
 
-    formatter = Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
+    else:
 
-    logger.addHandler(handler)
\ No newline at end of file
+        handler.setLevel(log_level)
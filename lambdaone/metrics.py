@@ -0,0 +1,102 @@
+# metrics.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Time the stages of the handler and count the decision cache hits and misses, and write them to stdout
+# in the CloudWatch Embedded Metric Format (EMF). CloudWatch Logs turns the lines into metrics, so there
+# is no call to the CloudWatch API on the request path.
+#
+# The samples from METRICSBATCH invocations are aggregated into one line, an EMF metric may carry up to
+# 100 values. A larger batch writes fewer lines, but the samples not yet written are lost when the
+# execution environment is shut down.
+#
+# When the metrics are off start returns None and stop and count return at once, so the instrumented
+# code pays for a function call and nothing else.
+#
+
+import json
+import os
+import sys
+import time
+
+DEFAULT_NAMESPACE = 'LambdaOne'
+MAX_VALUES = 100
+
+_settings = { 'enabled': False, 'namespace': DEFAULT_NAMESPACE, 'batch': 1 }
+_timings = {}       # stage -> [ milliseconds ]
+_counts = {}        # name -> count
+_state = { 'invocations': 0, 'cold': True }
+
+def configure(enabled, namespace = DEFAULT_NAMESPACE, batch = 1):
+
+    # Anything collected under the old settings is written first.
+
+    flush()
+
+    _settings['enabled'] = enabled
+    _settings['namespace'] = namespace
+    _settings['batch'] = min(max(batch, 1), MAX_VALUES)
+
+def enabled():
+
+    return _settings['enabled']
+
+def start():
+
+    return time.perf_counter() if _settings['enabled'] else None
+
+def stop(stage, started):
+
+    if started is not None:
+
+        _timings.setdefault(stage, []).append((time.perf_counter() - started) * 1000)
+
+def count(name, value = 1):
+
+    if _settings['enabled']:
+
+        _counts[name] = _counts.get(name, 0) + value
+
+def end():
+
+    # Called once at the end of each invocation; the first invocation in the execution environment is
+    # the cold start.
+
+    if _settings['enabled']:
+
+        count('ColdStart', 1 if _state['cold'] else 0)
+        count('Invocations')
+        _state['invocations'] += 1
+
+        if _state['invocations'] >= _settings['batch']:
+
+            flush()
+
+    _state['cold'] = False
+
+def flush():
+
+    if _timings or _counts:
+
+        sys.stdout.write(json.dumps(record()) + '\n')
+        sys.stdout.flush()
+
+    _timings.clear()
+    _counts.clear()
+    _state['invocations'] = 0
+
+def record():
+
+    # The EMF object for what has been collected; the function name is the only dimension.
+
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+    definitions = [ { 'Name': stage, 'Unit': 'Milliseconds' } for stage in _timings ] + [ { 'Name': name, 'Unit': 'Count' } for name in _counts ]
+    result = { '_aws': { 'Timestamp': int(time.time() * 1000), 'CloudWatchMetrics': [ { 'Namespace': _settings['namespace'], 'Dimensions': [ [ 'FunctionName' ] ],
+        'Metrics': definitions } ] }, 'FunctionName': function_name }
+
+    for ( stage, values ) in _timings.items():
+
+        result[stage] = [ round(value, 3) for value in values[:MAX_VALUES] ]
+
+    result.update(_counts)
+
+    return result
@@ -0,0 +1,50 @@
+# policy.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Build the response of an API Gateway Lambda authorizer: the principal, an IAM policy document, and
+# the context passed on to the backend.
+#
+# The scopes required are the same for every route, so the policy allows (or denies) the whole stage
+# with a wildcarded resource instead of the one method ARN in the event. API Gateway caches the policy
+# by the token, and a cached policy for the whole stage is reused for every route the caller visits.
+#
+
+VERSION = '2012-10-17'
+ACTION = 'execute-api:Invoke'
+ALLOW = 'Allow'
+DENY = 'Deny'
+
+def build(principal_id, effect, method_arn, context = None):
+
+    return {
+        'principalId': principal_id,
+        'policyDocument': {
+            'Version': VERSION,
+            'Statement': [ { 'Action': ACTION, 'Effect': effect, 'Resource': wildcard_arn(method_arn) } ]
+        },
+        'context': context or {}
+    }
+
+def wildcard_arn(method_arn):
+
+    # arn:aws:execute-api:region:account:api-id/stage/METHOD/resource/path becomes
+    # arn:aws:execute-api:region:account:api-id/stage/*; anything else is used as is.
+
+    parts = method_arn.split('/')
+
+    return f'{ parts[0] }/{ parts[1] }/*' if len(parts) > 2 else method_arn
+
+def context(claims, granted_scopes):
+
+    # The authorizer context only takes strings, numbers and booleans, so the scopes are flattened
+    # into the standard space-delimited form.
+
+    result = { 'scope': ' '.join(sorted(granted_scopes)) }
+
+    for name in ( 'sub', 'iss', 'client_id' ):
+
+        if isinstance(claims.get(name), ( str, int, float, bool )):
+
+            result[name] = claims[name]
+
+    return result
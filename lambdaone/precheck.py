@@ -0,0 +1,103 @@
+# precheck.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Cheap structural screening of a bearer token before any key is resolved or any signature is checked.
+# Junk tokens (too long, not three base64url segments, an algorithm that is not allowed, or unverified
+# claims that could never pass: expired, not yet valid, an issuer that is not configured, or the wrong
+# audience for the issuer) are rejected here in microseconds, without a JWKS fetch or RSA work. Passing
+# the screen proves nothing; authz.verify still has to check the signature and the claims.
+#
+
+from logging import debug
+import re
+import time
+
+from lambdaone import access_token
+from lambdaone import registry
+
+# Three base64url segments; the signature segment cannot be empty because "none" is never allowed.
+
+_format = re.compile(r'[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+')
+
+def screen(token, configuration):
+
+    # The parsed AccessToken is returned if the token passes, or None if it should be rejected.
+
+    result = None
+    reason = None
+
+    if len(token) > configuration.max_token_length:
+
+        reason = 'too long'
+
+    elif not _format.fullmatch(token):
+
+        reason = 'not three base64url segments'
+
+    else:
+
+        result = access_token.parse(token)
+
+        if result is None:
+
+            reason = 'not parsed'
+
+        else:
+
+            reason = _screen_claims(result, configuration)
+
+            if reason is not None:
+
+                result = None
+
+    if reason is not None:
+
+        debug('Token rejected by precheck: %s', reason)
+
+    return result
+
+def _screen_claims(parsed_token, configuration):
+
+    reason = None
+    header = parsed_token.header
+    claims = parsed_token.claims
+    now = time.time()
+    tenant = registry.select(configuration, claims.get('iss')) if isinstance(claims.get('iss'), str) else None
+
+    try:
+
+        if header.get('alg') not in configuration.algorithms:
+
+            reason = 'algorithm not allowed'
+
+        elif 'exp' in claims and float(claims['exp']) <= now:
+
+            reason = 'expired'
+
+        elif 'nbf' in claims and float(claims['nbf']) > now:
+
+            reason = 'not yet valid'
+
+        elif tenant is None:
+
+            reason = 'issuer'
+
+        elif not _audience_matches(claims.get('aud'), tenant.audience):
+
+            reason = 'audience'
+
+    except ( OverflowError, TypeError, ValueError ):
+
+        # A JSON integer too large for a float raises OverflowError.
+
+        reason = 'malformed time claim'
+
+    return reason
+
+def _audience_matches(aud, audience):
+
+    # The audience of the issuer may be one value or a tuple of them; any one of them in the claim matches.
+
+    audiences = [ aud ] if isinstance(aud, str) else aud
+
+    return isinstance(audiences, list) and any(value in audiences for value in registry.audiences(audience))
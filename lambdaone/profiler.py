@@ -0,0 +1,138 @@
+# profiler.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Profile a sample of the invocations of a warm lambda, so a slow function can be looked at with real
+# traffic by changing the environment instead of the code. PROFILE names the profilers to run: "cpu"
+# (cProfile, written as a pstats file) and/or "memory" (tracemalloc, written as a snapshot). One
+# invocation in PROFILESAMPLE is profiled, starting with the first (the cold start).
+#
+# The files are written to PROFILEDIR (default /tmp/lambdaone-profiles), and the oldest are removed when
+# the files add up to more than PROFILEMAXBYTES, so /tmp never fills up. A summary line with the top
+# functions (or the top allocations) is logged as a warning, so it appears at the default log level;
+# the files can be pulled from a container, or loaded with pstats.Stats and tracemalloc.Snapshot.load.
+#
+# When PROFILE is not set the handler is called directly, and cProfile, pstats and tracemalloc are only
+# imported when an invocation is profiled, so they add nothing to the cold start of a lambda that does not.
+#
+
+from logging import error, warning
+import os
+import time
+
+CPU = 'cpu'
+MEMORY = 'memory'
+
+KINDS = ( CPU, MEMORY )
+PREFIX = 'lambdaone-'
+TOP = 5
+
+_settings = { 'kinds': frozenset(), 'sample': 100, 'directory': '/tmp/lambdaone-profiles', 'max_bytes': 52428800 }
+_state = { 'invocations': 0 }
+
+def configure(kinds, sample, directory, max_bytes):
+
+    _settings['kinds'] = frozenset(kinds)
+    _settings['sample'] = max(sample, 1)
+    _settings['directory'] = directory
+    _settings['max_bytes'] = max_bytes
+    _state['invocations'] = 0
+
+def run(function, *args):
+
+    # The result of function(*args) is returned; an exception is raised after the profile is written.
+
+    kinds = _settings['kinds']
+    sampled = False
+
+    if kinds:
+
+        sampled = _state['invocations'] % _settings['sample'] == 0
+        _state['invocations'] += 1
+
+    return _profile(kinds, function, args) if sampled else function(*args)
+
+def _profile(kinds, function, args):
+
+    import cProfile
+    import tracemalloc
+
+    name = os.path.join(_settings['directory'], f'{ PREFIX }{ int(time.time() * 1000) }-{ os.getpid() }-{ _state["invocations"] }')
+    profile = cProfile.Profile() if CPU in kinds else None
+    tracing = MEMORY in kinds and not tracemalloc.is_tracing()
+
+    if tracing:
+
+        tracemalloc.start()
+
+    try:
+
+        result = profile.runcall(function, *args) if profile is not None else function(*args)
+
+    finally:
+
+        snapshot = tracemalloc.take_snapshot() if MEMORY in kinds else None
+
+        if tracing:
+
+            tracemalloc.stop()
+
+        _write(name, profile, snapshot)
+
+    return result
+
+def _write(name, profile, snapshot):
+
+    # A profile that cannot be written is logged, the invocation goes on.
+
+    try:
+
+        os.makedirs(_settings['directory'], exist_ok = True)
+
+        if profile is not None:
+
+            import pstats
+
+            stats = pstats.Stats(profile)
+            stats.dump_stats(f'{ name }.pstats')
+            warning('Profile %s.pstats: %s', name, '; '.join(_top_functions(stats)))
+
+        if snapshot is not None:
+
+            snapshot.dump(f'{ name }.tracemalloc')
+            warning('Profile %s.tracemalloc: %s', name, '; '.join(_top_allocations(snapshot)))
+
+        _rotate()
+
+    except Exception as e:
+
+        error(f'Profile not written: { e }')
+
+def _top_functions(stats):
+
+    # The functions with the most cumulative time, the handler itself and the profiler are left out.
+
+    rows = sorted(stats.stats.items(), key = lambda item: item[1][3], reverse = True)
+    functions = [ ( filename, line, function, cumulative ) for ( ( filename, line, function ), ( _, _, _, cumulative, _ ) ) in rows if filename != '~' ]
+
+    return [ f'{ function } ({ os.path.basename(filename) }:{ line }) {cumulative * 1000:.2f}ms' for ( filename, line, function, cumulative ) in functions[1:TOP + 1] ]
+
+def _top_allocations(snapshot):
+
+    return [ f'{ statistic.traceback[0].filename }:{ statistic.traceback[0].lineno } {statistic.size / 1024:.1f}KiB' for statistic in snapshot.statistics('lineno')[:TOP] ]
+
+def _rotate():
+
+    # The oldest files are removed until the rest fit in PROFILEMAXBYTES; the newest is always kept.
+
+    directory = _settings['directory']
+    paths = [ os.path.join(directory, file) for file in os.listdir(directory) if file.startswith(PREFIX) ]
+    files = sorted(( ( os.stat(path).st_mtime_ns, path, os.stat(path).st_size ) for path in paths ), reverse = True)
+    total = 0
+
+    for ( index, ( _, path, size ) ) in enumerate(files):
+
+        total += size
+
+        if total > _settings['max_bytes'] and index > 0:
+
+            os.remove(path)
@@ -0,0 +1,116 @@
+# registry.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Serve several issuers (IdPs or tenants) from one lambda. ISSUERS is a JSON object mapping each issuer
+# to its JWKS URI, its audience (a string or a list of strings) and, optionally, its required scopes;
+# the REQUIRE property is used for an issuer that does not have its own:
+#
+#   ISSUERS={ "https://pyrates.okta.com/oauth2/default": { "jwks": "https://pyrates.okta.com/oauth2/default/v1/keys",
+#       "audience": "api://treasure", "require": "treasure:read" },
+#       "https://corsairs.us.auth0.com/": { "jwks": "https://corsairs.us.auth0.com/.well-known/jwks.json", "audience": [ "https://treasure" ] } }
+#
+# ISSUERS may also be the path of a file with the JSON. An issuer without jwks uses its OpenID Connect
+# discovery document, and jwt_key finds the jwks_uri there.
+#
+# The issuer for a token is selected by its unverified iss claim; the signature is then checked with the
+# keys of that issuer only, and the claims against its audience, so picking the issuer from the token
+# grants nothing. Each issuer has its own key set in jwt_key, fetched and refreshed independently.
+#
+
+from dataclasses import dataclass
+import json
+import types
+
+from lambdaone import scopes
+
+DISCOVERY = '/.well-known/openid-configuration'
+
+@dataclass(frozen = True)
+class Tenant:
+
+    # The same property names as the configuration, so either one can be used to check a token.
+
+    issuer: str
+    audience: object        # str or tuple
+    require: scopes.Requirement
+    jwks_path: str
+
+def load(value, default_require):
+
+    # The issuers are returned as a read-only mapping of issuer to Tenant. ValueError is raised with a
+    # message for the configuration error.
+
+    text = value
+
+    if not value.lstrip().startswith('{'):
+
+        with open(value, 'r') as fp:
+
+            text = fp.read()
+
+    try:
+
+        document = json.loads(text)
+
+    except ValueError as e:
+
+        raise ValueError(f'ISSUERS is not JSON: { e }')
+
+    if not isinstance(document, dict) or not document:
+
+        raise ValueError('ISSUERS is not an object of issuers')
+
+    tenants = {}
+
+    for ( issuer, settings ) in document.items():
+
+        if not isinstance(settings, dict):
+
+            raise ValueError(f'ISSUERS entry for { issuer } is not an object')
+
+        audience = settings.get('audience')
+
+        if not audience or not ( isinstance(audience, str) or ( isinstance(audience, list) and all(isinstance(item, str) for item in audience) ) ):
+
+            raise ValueError(f'ISSUERS entry for { issuer } needs an audience that is a string or a list of strings')
+
+        if not isinstance(settings.get('jwks', ''), str):
+
+            raise ValueError(f'ISSUERS entry for { issuer } has a jwks that is not a string')
+
+        if not isinstance(settings.get('require', ''), str):
+
+            raise ValueError(f'ISSUERS entry for { issuer } has a require that is not a string')
+
+        audience = audience if isinstance(audience, str) else tuple(audience)
+        require = scopes.compile(settings['require']) if 'require' in settings else default_require
+
+        jwks_path = settings.get('jwks') or discovery_path(issuer)
+
+        tenants[issuer] = Tenant(issuer = issuer, audience = audience, require = require, jwks_path = jwks_path)
+
+    return types.MappingProxyType(tenants)
+
+def select(configuration, issuer):
+
+    # The tenant (or the configuration itself, for a single issuer) that the iss claim names, or None.
+
+    if configuration.issuers:
+
+        result = configuration.issuers.get(issuer)
+
+    else:
+
+        result = configuration if issuer == configuration.issuer else None
+
+    return result
+
+def discovery_path(issuer):
+
+    # The OpenID Connect discovery document is at a fixed place under the issuer.
+
+    return f'{ issuer.rstrip("/") }{ DISCOVERY }'
+
+def audiences(audience):
+
+    return ( audience, ) if isinstance(audience, str) else tuple(audience)
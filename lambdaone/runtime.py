@@ -0,0 +1,31 @@
+# runtime.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Apply a configuration snapshot to the modules that keep state for the life of the execution environment:
+# the logging level, the decision cache, the metrics, the profiler and the JWKS cache. Both entry points
+# call apply in the init phase, when the tests rebuild the configuration, and when config.refresh returns a
+# new snapshot.
+# Cached decisions were made under the old configuration, so they are dropped.
+#
+# jwt_key brings in PyJWT, so it is only imported (and configured) when the keys come from a JWKS.
+#
+
+from lambdaone import config
+from lambdaone import decision_cache
+from lambdaone import logger
+from lambdaone import metrics
+from lambdaone import profiler
+
+def apply(configuration):
+
+    logger.initialize(configuration.log_level)
+    decision_cache.configure(configuration.decision_cache_size, configuration.decision_cache_bytes)
+    metrics.configure(configuration.metrics, configuration.metrics_namespace, configuration.metrics_batch)
+    profiler.configure(configuration.profile, configuration.profile_sample, configuration.profile_directory, configuration.profile_max_bytes)
+
+    if configuration.mode in ( config.MODE_JWKS, config.MODE_REGISTRY ):
+
+        from lambdaone import jwt_key
+
+        jwt_key.configure(configuration.jwks_ttl, configuration.jwks_stale, configuration.jwks_refetch, configuration.jwks_refresh_ahead,
+            configuration.jwks_max_issuers, configuration.jwks_background, configuration.jwks_persist, configuration.jwks_cache_dir)
@@ -0,0 +1,115 @@
+# scopes.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Compile the REQUIRE expression once, at init, into a requirement that is checked against the scopes
+# granted in a token with set lookups. The expression is a comma-separated list of groups that must
+# all be satisfied (AND), and each group is a list of alternatives separated by | (OR):
+#
+#   REQUIRE=treasure:read, treasure:write | treasure:admin
+#
+# Scopes are hierarchical with : as the separator. A granted wildcard covers everything below it, so
+# a token with treasure:* satisfies treasure:read, and a required wildcard is satisfied by any scope
+# below it, so REQUIRE=treasure:* is satisfied by a token with treasure:read.
+#
+# The granted scopes are collected from the scopes (list), scp (list or string) and scope (space
+# delimited string) claims, and materialized once as a frozenset.
+#
+
+from dataclasses import dataclass, field
+import re
+
+SEPARATOR = ':'
+WILDCARD = '*'
+
+@dataclass(frozen = True)
+class Requirement:
+
+    groups: tuple
+    checks: tuple = field(compare = False, repr = False)
+    wildcards: bool = field(compare = False, repr = False)
+
+    def __bool__(self):
+
+        return len(self.groups) > 0
+
+    def matches(self, granted_scopes):
+
+        # Each group is satisfied if any of the alternatives is satisfied. Without a required wildcard the
+        # cost is the number of required scopes times their depth, independent of how many scopes the token
+        # carries; with one the prefixes of every granted scope are built first, once for all of the groups.
+
+        prefixes = _prefixes(granted_scopes) if self.wildcards else frozenset()
+
+        for alternatives in self.checks:
+
+            if not any(not keys.isdisjoint(granted_scopes) or prefix in prefixes for ( keys, prefix ) in alternatives):
+
+                return False
+
+        return True
+
+def compile(expression):
+
+    groups = []
+
+    for group in re.split(r'\s*,\s*', (expression or '').strip()):
+
+        alternatives = tuple(scope for scope in re.split(r'\s*\|\s*', group) if scope)
+
+        if alternatives:
+
+            groups.append(alternatives)
+
+    checks = tuple(tuple(_compile_scope(scope) for scope in alternatives) for alternatives in groups)
+    wildcards = any(prefix is not None for alternatives in checks for ( keys, prefix ) in alternatives)
+
+    return Requirement(groups = tuple(groups), checks = checks, wildcards = wildcards)
+
+def granted(claims):
+
+    result = set()
+
+    for name in ( 'scopes', 'scp', 'scope' ):
+
+        value = claims.get(name)
+
+        if isinstance(value, str):
+
+            result.update(value.split())
+
+        elif isinstance(value, ( list, tuple )):
+
+            result.update(scope for scope in value if isinstance(scope, str))
+
+    return frozenset(result)
+
+def _compile_scope(scope):
+
+    # A scope compiles to the set of granted scopes that satisfy it directly (itself and the wildcards
+    # above it), and for a required wildcard the prefix that any scope below it produces.
+
+    parts = scope.split(SEPARATOR)
+    prefix = None
+
+    if len(parts) > 1 and parts[-1] == WILDCARD:
+
+        prefix = scope
+        parts = parts[:-1]
+
+    keys = frozenset([ scope ]) | _ancestors(parts)
+
+    return ( keys, prefix )
+
+def _ancestors(parts):
+
+    return frozenset(SEPARATOR.join(parts[:i]) + SEPARATOR + WILDCARD for i in range(1, len(parts)))
+
+def _prefixes(granted_scopes):
+
+    result = set()
+
+    for scope in granted_scopes:
+
+        result.update(_ancestors(scope.split(SEPARATOR)))
+
+    return result
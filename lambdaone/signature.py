@@ -0,0 +1,116 @@
+# signature.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Check the signatures for the algorithms the lambda actually sees (RS256, RS384, RS512, PS256, ES256 and
+# EdDSA) by calling cryptography directly. The PyJWT algorithm objects look up the hash, prepare the key,
+# and check the key type on every call; here that is done once for each key and algorithm, and the
+# result is a function that only calls OpenSSL. authz falls back to PyJWT for any other algorithm or for
+# a key that is not of the type the algorithm needs, so the errors are the same as before.
+#
+# The functions hold a reference to the key they were made for. The cache is cleared when it fills up,
+# which only happens if the keys rotate many times in one execution environment.
+#
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.ec import ECDSA, SECP256R1, EllipticCurvePublicKey
+from cryptography.hazmat.primitives.asymmetric.ed448 import Ed448PublicKey
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+
+ALGORITHMS = ( 'RS256', 'RS384', 'RS512', 'PS256', 'ES256', 'EdDSA' )
+MAX_ENTRIES = 64
+
+_hashes = { 'RS256': hashes.SHA256, 'RS384': hashes.SHA384, 'RS512': hashes.SHA512, 'PS256': hashes.SHA256, 'ES256': hashes.SHA256 }
+_verifiers = {}     # ( algorithm, id(key) ) -> ( key, function )
+
+def verifier(algorithm, key):
+
+    # A function( signing_input, signature ) returning True or False is returned, or None if the algorithm
+    # or the key is not handled here and PyJWT should be used.
+
+    entry = _verifiers.get(( algorithm, id(key) ))
+
+    if entry is None:
+
+        function = _build(algorithm, key)
+
+        if function is not None:
+
+            if len(_verifiers) >= MAX_ENTRIES:
+
+                _verifiers.clear()
+
+            entry = _verifiers.setdefault(( algorithm, id(key) ), ( key, function ))
+
+    return entry[1] if entry is not None else None
+
+def clear():
+
+    _verifiers.clear()
+
+def _build(algorithm, key):
+
+    result = None
+
+    if algorithm in ( 'RS256', 'RS384', 'RS512' ) and isinstance(key, RSAPublicKey):
+
+        result = _checked(key.verify, padding.PKCS1v15(), _hashes[algorithm]())
+
+    elif algorithm == 'PS256' and isinstance(key, RSAPublicKey):
+
+        result = _checked(key.verify, padding.PSS(mgf = padding.MGF1(hashes.SHA256()), salt_length = hashes.SHA256.digest_size), hashes.SHA256())
+
+    elif algorithm == 'ES256' and isinstance(key, EllipticCurvePublicKey) and isinstance(key.curve, SECP256R1):
+
+        result = _ecdsa(key.verify, ECDSA(hashes.SHA256()), 32)
+
+    elif algorithm == 'EdDSA' and isinstance(key, ( Ed25519PublicKey, Ed448PublicKey )):
+
+        result = _checked(lambda signature, signing_input: key.verify(signature, signing_input))
+
+    return result
+
+def _checked(verify, *args):
+
+    def check(signing_input, signature):
+
+        try:
+
+            verify(signature, signing_input, *args)
+            result = True
+
+        except InvalidSignature:
+
+            result = False
+
+        return result
+
+    return check
+
+def _ecdsa(verify, ecdsa, size):
+
+    # The JWS signature is r and s side by side, OpenSSL wants them DER encoded.
+
+    def check(signing_input, signature):
+
+        result = False
+
+        if len(signature) == 2 * size:
+
+            der = encode_dss_signature(int.from_bytes(signature[:size], 'big'), int.from_bytes(signature[size:], 'big'))
+
+            try:
+
+                verify(der, signing_input, ecdsa)
+                result = True
+
+            except InvalidSignature:
+
+                result = False
+
+        return result
+
+    return check
@@ -0,0 +1,63 @@
+# upstream.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Use the claims of a token already verified by an API Gateway HTTP API JWT authorizer, which are passed
+# in event['requestContext']['authorizer']['jwt']['claims']. The signature is not checked again; the
+# issuer and audience are compared with the configuration (or the issuer in the registry) as a sanity
+# check, and only the scopes are decided.
+#
+# The HTTP API passes every claim as a string, and an array claim as "[a b c]", so the array claims are
+# turned back into lists before they are used.
+#
+
+from logging import debug
+import re
+
+from lambdaone import registry
+from lambdaone import scopes
+
+ARRAY_CLAIMS = ( 'aud', 'scopes', 'scp' )
+
+def claims(event):
+
+    # The verified claims are returned, or None if the request did not come through a JWT authorizer.
+
+    try:
+
+        result = event['requestContext']['authorizer']['jwt']['claims']
+
+    except ( KeyError, TypeError ):
+
+        result = None
+
+    return result if isinstance(result, dict) else None
+
+def decide(upstream_claims, configuration):
+
+    # The ( claims, allowed ) decision is returned, or None if the claims are not for this lambda.
+
+    result = None
+    decoded_token = { name: _array(value) if name in ARRAY_CLAIMS else value for ( name, value ) in upstream_claims.items() }
+    audience = decoded_token.get('aud')
+    audience = audience if isinstance(audience, list) else [ audience ]
+    tenant = registry.select(configuration, decoded_token.get('iss'))
+
+    if tenant is None:
+
+        debug('Upstream claims rejected: %s', 'unexpected issuer')
+
+    elif not any(value in audience for value in registry.audiences(tenant.audience)):
+
+        debug('Upstream claims rejected: %s', 'unexpected audience')
+
+    else:
+
+        result = ( decoded_token, tenant.require.matches(scopes.granted(decoded_token)) )
+
+    return result
+
+def _array(value):
+
+    match = re.fullmatch(r'\[(.*)\]', value) if isinstance(value, str) else None
+
+    return match.group(1).split() if match else value
@@ -0,0 +1,180 @@
+# verifier.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Decide if a bearer token is allowed, for any of the entry points (lambda_function, authorizer_function),
+# or a batch of tokens. The decision is ( claims, allowed ), or None if the token cannot be verified.
+#
+# With more than one issuer (see registry) the token is checked against the issuer named by its iss claim:
+# the keys come from that issuer's JWKS URI, and the audience and the required scopes are its own.
+#
+# The modules that check tokens bring in PyJWT and cryptography (most of the import time), so they are
+# imported when they are used, and only by a lambda that is configured to require a token.
+#
+
+from logging import debug
+
+from lambdaone import config
+from lambdaone import decision_cache
+from lambdaone import metrics
+from lambdaone import registry
+
+def decide(token, configuration):
+
+    # The ( claims, allowed ) decision for the token is returned, or None if the token cannot be verified.
+    # A token seen before is answered from the decision cache without checking the signature, as long as the
+    # key that verified it is still current.
+
+    decision = decision_cache.get(token, lambda source: _current(source, configuration))
+
+    metrics.count('DecisionCacheMiss' if decision is None else 'DecisionCacheHit')
+
+    if decision is None:
+
+        from lambdaone import precheck
+
+        # The token is screened and parsed once here, junk is rejected before any key is loaded, and the
+        # parsed form is shared by the key loaders and authz.
+
+        parsed_token = precheck.screen(token, configuration)
+
+        if parsed_token is not None:
+
+            # Precheck only passes a token from an issuer that is configured.
+
+            tenant = registry.select(configuration, parsed_token.claims.get('iss'))
+
+            started = metrics.start()
+            ( key, algorithm ) = _load_key(parsed_token, configuration, tenant)
+            metrics.stop('Key', started)
+
+            started = metrics.start()
+            decision = _verify(token, parsed_token, key, algorithm, tenant, _source(parsed_token, configuration, tenant, key))
+            metrics.stop('Verify', started)
+
+    return decision
+
+def decide_all(tokens, configuration):
+
+    # The decisions for a batch of tokens are returned in the same order. Each distinct token is decided
+    # once, and the tokens are grouped by issuer and kid so the key is looked up once for each group.
+
+    from lambdaone import precheck
+
+    decisions = {}
+    groups = {}
+
+    for token in tokens:
+
+        if token not in decisions:
+
+            decisions[token] = decision_cache.get(token, lambda source: _current(source, configuration))
+
+            if decisions[token] is None:
+
+                parsed_token = precheck.screen(token, configuration)
+
+                if parsed_token is not None:
+
+                    groups.setdefault(( parsed_token.claims.get('iss'), parsed_token.header.get('kid') ), []).append(( token, parsed_token ))
+
+    # The key is shared by the group, but each token names its own algorithm and authz checks it against the key.
+    # The signatures for all of the groups of an issuer are checked together by authz on its thread pool.
+
+    tenants = {}
+
+    for ( ( issuer, kid ), group ) in groups.items():
+
+        tenant = registry.select(configuration, issuer)
+        ( key, algorithm ) = _load_key(group[0][1], configuration, tenant)
+        source = _source(group[0][1], configuration, tenant, key)
+        tenants.setdefault(issuer, ( tenant, [] ))[1].extend(( token, parsed_token, key, parsed_token.header.get('alg'), source ) for ( token, parsed_token ) in group)
+
+    if tenants:
+
+        from lambdaone import authz
+
+        for ( tenant, items ) in tenants.values():
+
+            decoded = authz.decode_all([ item[1:4] for item in items ], tenant.audience, tenant.issuer)
+
+            for ( ( token, parsed_token, key, algorithm, source ), claims ) in zip(items, decoded):
+
+                decisions[token] = _decision(token, parsed_token, claims, tenant, source)
+
+    return [ decisions[token] for token in tokens ]
+
+def _load_key(parsed_token, configuration, tenant):
+
+    # The key comes from the JWKS URI of the issuer or the local path, the configuration decided which.
+
+    if configuration.mode in ( config.MODE_JWKS, config.MODE_REGISTRY ):
+
+        from lambdaone import jwt_key
+
+        ( key, algorithm ) = jwt_key.load(tenant.jwks_path, parsed_token)
+
+        debug('jwt_key.load key: %s, algorithm: %s', key, algorithm)
+
+    else:
+
+        from lambdaone import fixed_key
+
+        ( key, algorithm ) = fixed_key.load(configuration.signature_key_path, parsed_token)
+
+        debug('fixed_key.load key: %s, algorithm: %s', key, algorithm)
+
+    return ( key, algorithm )
+
+def _source(parsed_token, configuration, tenant, key):
+
+    # Where the key came from, saved with the decision so a hit can check the key is still current.
+
+    if configuration.mode in ( config.MODE_JWKS, config.MODE_REGISTRY ):
+
+        result = ( tenant.jwks_path, parsed_token.header.get('kid'), key )
+
+    else:
+
+        result = ( configuration.signature_key_path, None, key )
+
+    return result
+
+def _current(source, configuration):
+
+    # A key that was rotated out of the JWKS, or a PEM file that was replaced, no longer authorizes the
+    # tokens it verified. The configuration decides which loader is asked, nothing is fetched.
+
+    ( path, kid, key ) = source
+
+    if configuration.mode in ( config.MODE_JWKS, config.MODE_REGISTRY ):
+
+        from lambdaone import jwt_key
+
+        result = jwt_key.current(path, kid, key)
+
+    else:
+
+        from lambdaone import fixed_key
+
+        result = fixed_key.current(path, key)
+
+    return result
+
+def _verify(token, parsed_token, key, algorithm, tenant, source):
+
+    from lambdaone import authz
+
+    return _decision(token, parsed_token, authz.decode(parsed_token, key, algorithm, tenant.audience, tenant.issuer), tenant, source)
+
+def _decision(token, parsed_token, claims, tenant, source):
+
+    from lambdaone import authz
+
+    decision = None
+
+    if claims is not None:
+
+        decision = ( claims, authz.authorized(claims, tenant.require) )
+        decision_cache.put(token, decision, len(parsed_token.payload), source)
+
+    return decision
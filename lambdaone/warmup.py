@@ -0,0 +1,116 @@
+# warmup.py
+# Copyright © 2024 Joel A Mussman. All rights reserved.
+#
+# Do the expensive one-time work during the lambda init phase (which runs with boosted CPU) instead of
+# in the first request: fetch and convert the JWKS, or load the fixed PEM key, and check a dummy
+# signature with every key so the crypto backend and the PyJWT algorithm objects are ready. The fetches
+# are held to BUDGET seconds (see deadline), so an IdP that does not answer cannot run the init phase out.
+#
+# The same steps are exposed as hooks for SnapStart: warm before the checkpoint, and after a restore
+# drop anything that may have gone stale while the snapshot was stored (the key set and the cached
+# decisions) and warm again. The hooks are registered only if the snapshot_restore_py runtime library
+# is available. The key modules are imported only for the mode that is configured.
+#
+
+from logging import debug, error
+import sys
+
+from lambdaone import config
+from lambdaone import deadline
+from lambdaone import decision_cache
+
+# Seconds the JWKS fetches may take in all during warm up, well inside the 10 seconds Lambda allows for the
+# init phase (and for a SnapStart restore hook); the first request fetches anything that did not make it.
+
+BUDGET = 4
+
+def warm(configuration):
+
+    # Nothing here may fail the init phase; the first request will report the same problem.
+
+    primed = 0
+
+    deadline.allow(BUDGET)
+
+    try:
+
+        if configuration.error is None and configuration.mode in ( config.MODE_JWKS, config.MODE_REGISTRY ):
+
+            from lambdaone import authz, jwt_key
+
+            # Every issuer in the registry is fetched; one IdP that cannot be reached does not stop the others.
+
+            paths = { tenant.jwks_path for tenant in configuration.issuers.values() } if configuration.issuers else [ configuration.jwks_path ]
+
+            for path in sorted(paths):
+
+                try:
+
+                    for signing_key in jwt_key.prefetch(path).values():
+
+                        primed += authz.prime(signing_key, signing_key.algorithm_name)
+
+                except Exception as e:
+
+                    error(f'Warm up failed for { path }: { e }')
+
+        elif configuration.error is None and configuration.mode == config.MODE_FIXED:
+
+            from lambdaone import authz, fixed_key
+
+            signing_key = fixed_key.preload(configuration.signature_key_path)
+
+            # The fixed key is not bound to an algorithm; one allowed algorithm that fits the key is enough.
+
+            for algorithm in sorted(configuration.algorithms):
+
+                if authz.prime(signing_key, algorithm):
+
+                    primed += 1
+                    break
+
+        debug('warmup primed %d keys', primed)
+
+    except Exception as e:
+
+        error(f'Warm up failed: { e }')
+
+    finally:
+
+        deadline.clear()
+
+    return primed
+
+def restore(configuration):
+
+    # The monotonic clock and the IdP keys cannot be trusted across a snapshot, so the key set is fetched again.
+    # The pooled connections in the snapshot were made by another sandbox and are closed.
+
+    decision_cache.clear()
+
+    for name in ( 'lambdaone.jwt_key', 'lambdaone.http_pool' ):
+
+        if name in sys.modules:
+
+            sys.modules[name].clear()
+
+    return warm(configuration)
+
+def register(before_checkpoint, after_restore):
+
+    result = False
+
+    try:
+
+        from snapshot_restore_py import register_after_restore, register_before_snapshot
+
+        register_before_snapshot(before_checkpoint)
+        register_after_restore(after_restore)
+
+        result = True
+
+    except ImportError:
+
+        result = False
+
+    return result
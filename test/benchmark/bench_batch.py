@@ -0,0 +1,89 @@
+# bench_batch.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+# Report the throughput of authz.decode_all for a batch of distinct tokens signed with the test keys, with
+# one worker up to the number of cores, to show how the signature checks scale on the thread pool. Half
+# of the tokens are checked with the PEM key and half with the key from the JWKS, so the batch has two key
+# groups like a batch from two clients would. Run from the project folder:
+#
+#   $ python -m test.benchmark.bench_batch
+#   $ python -m test.benchmark.bench_batch --tokens 2000 --workers 1,2,4,8
+#
+
+import argparse
+import json
+import jwt
+import os
+import time
+
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+
+from lambdaone import access_token, authz
+
+AUDIENCE = 'https://treasure'
+ISSUER = 'https://pyrates'
+
+def main():
+
+    cores = os.cpu_count() or 1
+    default_workers = sorted({ 1, *(2 ** i for i in range(1, cores.bit_length()) if 2 ** i <= cores), cores })
+
+    parser = argparse.ArgumentParser(description = 'Benchmark authz.decode_all throughput by the number of workers.')
+    parser.add_argument('--tokens', type = int, default = 1000, help = 'distinct tokens in the batch')
+    parser.add_argument('--workers', default = ','.join(str(workers) for workers in default_workers), help = 'comma-separated worker counts')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'runs per worker count, the fastest is used')
+    args = parser.parse_args()
+
+    items = batch(args.tokens)
+    baseline = None
+
+    print(f'{args.tokens} tokens, {cores} cores')
+    print(f'{"workers":>8} {"tokens/s":>10} {"speedup":>8}')
+
+    for workers in (int(workers) for workers in args.workers.split(',')):
+
+        seconds = min(run(items, workers) for _ in range(args.repeat))
+        throughput = len(items) / seconds
+        baseline = baseline or throughput
+
+        print(f'{workers:>8} {throughput:10.0f} {throughput / baseline:7.2f}x')
+
+def batch(count):
+
+    with open('test/resources/private.pem', 'r') as fp:
+
+        private_key = fp.read()
+
+    with open('test/resources/public.pem', 'rb') as fp:
+
+        public_key = load_pem_public_key(fp.read())
+
+    with open('test/resources/jwks.json', 'r') as fp:
+
+        jwk = jwt.PyJWK(json.load(fp)['keys'][0])
+
+    now = int(time.time())
+    result = []
+
+    for i in range(count):
+
+        token = jwt.encode({ 'aud': AUDIENCE, 'iss': ISSUER, 'iat': now, 'exp': now + 3600, 'jti': str(i), 'scopes': [ 'treasure:read' ] }, private_key, algorithm = 'RS256')
+        result.append(( access_token.parse(token), public_key if i % 2 else jwk, 'RS256' ))
+
+    return result
+
+def run(items, workers):
+
+    start = time.perf_counter()
+    decoded = authz.decode_all(items, AUDIENCE, ISSUER, workers = workers)
+    seconds = time.perf_counter() - start
+
+    if not all(decoded):
+
+        raise SystemExit('A token in the batch was not verified')
+
+    return seconds
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,55 @@
+# bench_fixed_key.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+# Compare the per-call cost of verifying a token with the fixed key before and after caching the
+# parsed public key. "Before" reads the PEM file and hands the text to jwt.decode, which parses it
+# again for every call; "after" is fixed_key.load with the cached key object. Run from the project
+# folder:
+#
+#   $ python -m test.benchmark.bench_fixed_key
+#
+
+import jwt
+import time
+import timeit
+
+from lambdaone import access_token, fixed_key
+
+PATH = 'test/resources/public.pem'
+ITERATIONS = 2000
+
+def main():
+
+    with open('test/resources/private.pem', 'r') as fp:
+
+        private_key = fp.read()
+
+    now = time.time()
+    token = jwt.encode({ 'aud': 'https://treasure', 'iss': 'https://pyrates', 'iat': now, 'scopes': [ 'treasure:read' ] }, private_key, algorithm = 'RS256')
+    parsed_token = access_token.parse(token)
+
+    def before():
+
+        with open(PATH) as keydata:
+
+            key = keydata.read()
+
+        jwt.decode(token, key, algorithms = [ jwt.get_unverified_header(token)['alg'] ], audience = 'https://treasure', issuer = 'https://pyrates')
+
+    def after():
+
+        ( key, algorithm ) = fixed_key.load(PATH, parsed_token)
+
+        jwt.decode(token, key, algorithms = [ algorithm ], audience = 'https://treasure', issuer = 'https://pyrates')
+
+    after()     # Prime the cache, this is the cold start.
+
+    for name, function in ( ( 'before', before ), ( 'after', after ) ):
+
+        seconds = min(timeit.repeat(function, number = ITERATIONS, repeat = 5))
+
+        print(f'{name:>6}: {seconds / ITERATIONS * 1000000:8.1f} us per call')
+
+if __name__ == '__main__':
+
+    main()
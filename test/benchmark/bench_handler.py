@@ -0,0 +1,248 @@
+# bench_handler.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+# Measure lambda_function.handler end to end for each authorization mode: none (REQUIRE is empty),
+# fixed (SIGNATUREKEYPATH) and jwks (JWKSPATH, served by a local stub JWKS server). Each mode is measured
+# three ways:
+#
+#   cold        a fresh interpreter for every sample, timed from the import of lambda_function through
+#               the first response (the interpreter start up is reported separately as cold-process)
+#   warm        repeated invocations in this process with the same token, so the decision cache answers
+#   warm-verify repeated invocations with the decision cache disabled, so every call checks the signature
+#
+# The p50, p95 and p99 latencies are printed in milliseconds. The results can be written to a JSON file
+# and compared with the file from another commit to look for regressions. Run from the project folder:
+#
+#   $ python -m test.benchmark.bench_handler
+#   $ python -m test.benchmark.bench_handler --output before.json
+#   $ python -m test.benchmark.bench_handler --compare before.json
+#
+
+import argparse
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from threading import Thread
+import time
+
+import jwt
+
+MODES = ( 'none', 'fixed', 'jwks' )
+KID = '5b889a22-6e44-45f7-8f5e-537db1d9b16e'
+RESOURCES = 'test/resources'
+
+# The cold child imports nothing before the clock starts; json is needed for the event and is imported
+# by lambda_function anyway.
+
+COLD_CHILD = '''
+import time
+start = time.perf_counter()
+import json, lambda_function
+response = lambda_function.handler(json.loads(BENCH_EVENT), None)
+elapsed = time.perf_counter() - start
+print(json.dumps({ 'seconds': elapsed, 'status': response.get('statusCode', 200) if isinstance(response, dict) else 200 }))
+'''
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Benchmark lambda_function.handler cold and warm in each authorization mode.')
+    parser.add_argument('--modes', default = ','.join(MODES), help = 'comma-separated modes to run (default: all)')
+    parser.add_argument('--cold', type = int, default = 20, help = 'cold start samples per mode')
+    parser.add_argument('--warm', type = int, default = 2000, help = 'warm invocations per mode')
+    parser.add_argument('--output', help = 'write the results to this JSON file')
+    parser.add_argument('--compare', help = 'compare with the results in this JSON file')
+    args = parser.parse_args()
+
+    with open(f'{ RESOURCES }/private.pem', 'r') as fp:
+
+        private_key = fp.read()
+
+    now = int(time.time())
+    payload = { 'aud': 'https://treasure', 'iss': 'https://pyrates', 'sub': '1234567890', 'iat': now, 'exp': now + 3600, 'scopes': [ 'treasure:read' ] }
+    token = jwt.encode(payload, private_key, algorithm = 'RS256', headers = { 'kid': KID })
+    event = { 'headers': { 'authorization': f'bearer { token }' } }
+
+    server = start_jwks_server()
+    jwks_path = f'http://127.0.0.1:{ server.server_port }/jwks.json'
+    results = []
+
+    try:
+
+        for mode in args.modes.split(','):
+
+            environment = mode_environment(mode.strip(), jwks_path)
+
+            if args.cold > 0:
+
+                results.extend(_cold(mode, environment, event, args.cold))
+
+            if args.warm > 0:
+
+                results.append(_warm(mode, 'warm', environment, event, args.warm))
+                results.append(_warm(mode, 'warm-verify', { **environment, 'DECISIONCACHESIZE': '0' }, event, args.warm))
+
+    finally:
+
+        server.shutdown()
+
+    _report(results, _load(args.compare))
+
+    if args.output:
+
+        with open(args.output, 'w') as fp:
+
+            json.dump({ 'commit': _commit(), 'python': platform.python_version(), 'timestamp': int(time.time()), 'results': results }, fp, indent = 2)
+
+def mode_environment(mode, jwks_path):
+
+    # Everything the configuration reads is set explicitly, so a .env file in the project folder
+    # does not change what is measured. The saved JWKS is turned off so each cold start in a new
+    # process downloads the key set, like a new sandbox would.
+
+    result = { 'AUDIENCE': 'https://treasure', 'ISSUER': 'https://pyrates', 'REQUIRE': '', 'JWKSPATH': '', 'SIGNATUREKEYPATH': '',
+        'LAMBDA_LOG_LEVEL': 'ERROR', 'DECISIONCACHESIZE': '', 'CONFIGRELOAD': '', 'JWKSPERSIST': 'false' }
+
+    if mode == 'fixed':
+
+        result.update(REQUIRE = 'treasure:read', SIGNATUREKEYPATH = f'{ RESOURCES }/public.pem')
+
+    elif mode == 'jwks':
+
+        result.update(REQUIRE = 'treasure:read', JWKSPATH = jwks_path)
+
+    elif mode != 'none':
+
+        raise SystemExit(f'Unknown mode: { mode }')
+
+    return result
+
+def _cold(mode, environment, event, samples):
+
+    handler_seconds = []
+    process_seconds = []
+    child_environment = { **os.environ, **environment, 'BENCH_EVENT': json.dumps(event) }
+    code = 'import os\nBENCH_EVENT = os.environ["BENCH_EVENT"]\n' + COLD_CHILD
+
+    for i in range(samples):
+
+        start = time.perf_counter()
+        completed = subprocess.run([ sys.executable, '-c', code ], env = child_environment, capture_output = True, text = True, check = True)
+        process_seconds.append(time.perf_counter() - start)
+
+        outcome = json.loads(completed.stdout.strip().splitlines()[-1])
+        _check(mode, outcome['status'])
+        handler_seconds.append(outcome['seconds'])
+
+    return [ _summary(mode, 'cold', handler_seconds), _summary(mode, 'cold-process', process_seconds) ]
+
+def _warm(mode, phase, environment, event, samples):
+
+    os.environ.update(environment)
+
+    import lambda_function
+    from lambdaone import fixed_key, jwt_key
+
+    fixed_key.clear()
+    jwt_key.clear()
+    lambda_function.configure()
+
+    _check(mode, _status(lambda_function.handler(event, None)))       # The first call loads the key.
+
+    seconds = []
+    clock = time.perf_counter
+    handler = lambda_function.handler
+
+    for i in range(samples):
+
+        start = clock()
+        handler(event, None)
+        seconds.append(clock() - start)
+
+    return _summary(mode, phase, seconds)
+
+def _summary(mode, phase, seconds):
+
+    milliseconds = sorted(s * 1000 for s in seconds)
+    percentiles = statistics.quantiles(milliseconds, n = 100, method = 'inclusive') if len(milliseconds) > 1 else milliseconds * 99
+
+    return { 'mode': mode, 'phase': phase, 'samples': len(milliseconds), 'mean_ms': statistics.fmean(milliseconds),
+        'p50_ms': percentiles[49], 'p95_ms': percentiles[94], 'p99_ms': percentiles[98] }
+
+def _report(results, baseline):
+
+    previous = { ( result['mode'], result['phase'] ): result for result in (baseline or {}).get('results', []) }
+
+    print(f'{"mode":<6} {"phase":<12} {"samples":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}' + ('  p50 / p95 / p99 change' if baseline else ''))
+
+    for result in results:
+
+        line = f'{result["mode"]:<6} {result["phase"]:<12} {result["samples"]:>7} {result["p50_ms"]:>9.3f} {result["p95_ms"]:>9.3f} {result["p99_ms"]:>9.3f}'
+        before = previous.get(( result['mode'], result['phase'] ))
+
+        if before is not None:
+
+            line += '  ' + ' / '.join(f'{_change(before[key], result[key]):+6.1f}%' for key in ( 'p50_ms', 'p95_ms', 'p99_ms' ))
+
+        print(line)
+
+def _change(before, after):
+
+    return (after - before) / before * 100 if before else 0.0
+
+def _check(mode, status):
+
+    if status != 200:
+
+        raise SystemExit(f'The { mode } mode returned { status }, check the benchmark configuration')
+
+def _status(response):
+
+    return response.get('statusCode', 200) if isinstance(response, dict) else 200
+
+def _load(path):
+
+    result = None
+
+    if path:
+
+        with open(path, 'r') as fp:
+
+            result = json.load(fp)
+
+    return result
+
+def _commit():
+
+    try:
+
+        result = subprocess.run([ 'git', 'rev-parse', '--short', 'HEAD' ], capture_output = True, text = True, check = True).stdout.strip()
+
+    except Exception:
+
+        result = None
+
+    return result
+
+def start_jwks_server():
+
+    # The stub serves test/resources on an ephemeral port, jwks.json is the key set.
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+
+            pass
+
+    server = HTTPServer(( '127.0.0.1', 0 ), partial(QuietHandler, directory = RESOURCES))
+    Thread(target = server.serve_forever, daemon = True).start()
+
+    return server
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,99 @@
+# bench_imports.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+# Report the cold start import time of lambda_function with python -X importtime, for each authorization
+# mode, and fail (exit status 1) if it is over the budget. The import includes the init phase work at the
+# module level (the configuration and the warm up), which is what a cold start pays before the first
+# request. The time is the fastest of several runs, to keep the noise down, and the heaviest modules
+# imported directly by lambda_function are listed to show where the time goes. Run from
+# the project folder:
+#
+#   $ python -m test.benchmark.bench_imports
+#   $ python -m test.benchmark.bench_imports --budget none=80 --budget fixed=250
+#
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from test.benchmark.bench_handler import MODES, mode_environment, start_jwks_server
+
+# Milliseconds; roughly twice what the import takes on a developer laptop, the point is to catch a
+# regression like an eager import of PyJWT in the no-authorization mode, not to measure precisely.
+
+BUDGETS = { 'none': 100, 'fixed': 250, 'jwks': 300 }
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Check the lambda_function import time against a budget.')
+    parser.add_argument('--modes', default = ','.join(MODES), help = 'comma-separated modes to run (default: all)')
+    parser.add_argument('--runs', type = int, default = 5, help = 'runs per mode, the fastest is used')
+    parser.add_argument('--top', type = int, default = 8, help = 'number of the heaviest imports to list')
+    parser.add_argument('--budget', action = 'append', default = [], metavar = 'MODE=MS', help = 'override the budget for a mode')
+    args = parser.parse_args()
+
+    budgets = { **BUDGETS, **{ mode: float(ms) for ( mode, ms ) in (budget.split('=', 1) for budget in args.budget) } }
+    server = start_jwks_server()
+    jwks_path = f'http://127.0.0.1:{ server.server_port }/jwks.json'
+    failed = []
+
+    try:
+
+        for mode in (mode.strip() for mode in args.modes.split(',')):
+
+            ( total, modules ) = min((_import_time(mode_environment(mode, jwks_path)) for i in range(args.runs)), key = lambda run: run[0])
+            verdict = 'ok' if total <= budgets[mode] else 'OVER BUDGET'
+
+            print(f'{mode:<6} {total:8.1f} ms  budget {budgets[mode]:6.0f} ms  {verdict}')
+
+            for ( name, milliseconds ) in sorted(modules.items(), key = lambda module: -module[1])[:args.top]:
+
+                print(f'         {milliseconds:8.1f} ms  {name}')
+
+            if total > budgets[mode]:
+
+                failed.append(mode)
+
+    finally:
+
+        server.shutdown()
+
+    sys.exit(1 if failed else 0)
+
+def _import_time(environment):
+
+    # The total is the cumulative time of lambda_function, and the modules are the ones it imported directly,
+    # including those imported by the functions it called during the import (e.g. the warm up). A module is
+    # listed after the modules it imported, so the children of lambda_function are the lines one level down
+    # since the top-level line before it; the ones before that belong to the interpreter start-up.
+
+    completed = subprocess.run([ sys.executable, '-X', 'importtime', '-c', 'import lambda_function' ], env = { **os.environ, **environment },
+        capture_output = True, text = True, check = True)
+
+    total = 0.0
+    modules = {}
+    children = {}
+
+    for match in (LINE.match(line) for line in completed.stderr.splitlines()):
+
+        if match and len(match.group(3)) == 1:
+
+            if match.group(4) == 'lambda_function':
+
+                total = int(match.group(2)) / 1000
+                modules = children
+
+            children = {}
+
+        elif match and len(match.group(3)) == 3:
+
+            children[match.group(4)] = int(match.group(2)) / 1000
+
+    return ( total, modules )
+
+if __name__ == '__main__':
+
+    main()
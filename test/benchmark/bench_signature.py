@@ -0,0 +1,73 @@
+# bench_signature.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+# Compare the per-token cost of checking a signature and the claims three ways, for each algorithm the
+# signature module handles directly: jwt.decode on the token string, authz.decode with the PyJWT algorithm
+# objects (the path before the signature module), and authz.decode as it is. RS256 uses the test key in
+# test/resources, the other keys are generated. Run from the project folder:
+#
+#   $ python -m test.benchmark.bench_signature
+#
+
+import argparse
+import jwt
+import time
+import timeit
+from unittest.mock import patch
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+from lambdaone import access_token, authz, signature
+
+AUDIENCE = 'https://treasure'
+ISSUER = 'https://pyrates'
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Benchmark the signature check per token.')
+    parser.add_argument('--iterations', type = int, default = 2000, help = 'calls per measurement')
+    args = parser.parse_args()
+
+    with open('test/resources/private.pem', 'rb') as fp:
+
+        rsa_key = load_pem_private_key(fp.read(), password = None)
+
+    private_keys = { 'RS256': rsa_key, 'RS512': rsa_key, 'PS256': rsa_key, 'ES256': ec.generate_private_key(ec.SECP256R1()), 'EdDSA': ed25519.Ed25519PrivateKey.generate() }
+    now = int(time.time())
+
+    print(f'{"":>6} {"jwt.decode":>12} {"pyjwt":>12} {"direct":>12}   us per token')
+
+    for ( algorithm, private_key ) in private_keys.items():
+
+        public_key = private_key.public_key()
+        token = jwt.encode({ 'aud': AUDIENCE, 'iss': ISSUER, 'iat': now, 'exp': now + 3600 }, private_key, algorithm = algorithm)
+        parsed_token = access_token.parse(token)
+
+        def pyjwt_decode():
+
+            jwt.decode(token, public_key, algorithms = [ algorithm ], audience = AUDIENCE, issuer = ISSUER)
+
+        def direct():
+
+            authz.decode(parsed_token, public_key, algorithm, AUDIENCE, ISSUER)
+
+        timings = [ measure(pyjwt_decode, args.iterations) ]
+
+        with patch.object(signature, 'verifier', return_value = None):
+
+            timings.append(measure(direct, args.iterations))
+
+        timings.append(measure(direct, args.iterations))
+
+        print(f'{algorithm:>6} ' + ' '.join(f'{seconds / args.iterations * 1000000:12.1f}' for seconds in timings))
+
+def measure(function, iterations):
+
+    function()
+
+    return min(timeit.repeat(function, number = iterations, repeat = 5))
+
+if __name__ == '__main__':
+
+    main()
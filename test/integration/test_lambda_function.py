@@ -12,6 +12,7 @@ import jwt
 import os
 import re
 import sys
+import tempfile
 from threading import Thread
 import time
 from unittest import TestCase
@@ -46,6 +47,11 @@ class TestLambdaFunction(TestCase):
 
         load_dotenv()
 
+        # The JWKS is saved between runs, keep it out of /tmp so an old copy does not stand in for the server.
+
+        cls.jwks_cache_dir = tempfile.TemporaryDirectory()
+        os.environ['JWKSCACHEDIR'] = cls.jwks_cache_dir.name
+
         cls.mock_audience = 'https://treasure'
         cls.mock_issuer = 'https://pyrates'
         cls.mock_jwks_path = ''
@@ -93,16 +99,22 @@ class TestLambdaFunction(TestCase):
 
         cls.httpd.shutdown()
         cls.thread.join()
+        cls.jwks_cache_dir.cleanup()
+        os.environ.pop('JWKSCACHEDIR', None)
         return super().tearDownClass()
 
     def test_hello_world_without_authorization(self):
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertIn('Hello, World!', result)
 
     def test_current_sys_version_without_authorization(self):
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertIn(sys.version, result)
@@ -112,6 +124,8 @@ class TestLambdaFunction(TestCase):
         os.environ['REQUIRE'] = self.mock_scopeList
         os.environ['SIGNATUREKEYPATH'] = 'test/resources/public.pem'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertIn('Hello, World!', result)
@@ -121,6 +135,8 @@ class TestLambdaFunction(TestCase):
         os.environ['REQUIRE'] = self.mock_scopeList
         os.environ['SIGNATUREKEYPATH'] = 'test/resources/private.pem'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertEqual(403, result['statusCode'])
@@ -130,6 +146,8 @@ class TestLambdaFunction(TestCase):
         os.environ['REQUIRE'] = self.mock_scopeList
         os.environ['JWKSPATH'] = 'http://localhost:8000/jwks.json'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertIn('Hello, World!', result)
@@ -146,6 +164,8 @@ class TestLambdaFunction(TestCase):
         mock_token = jwt.encode(mock_token_payload, TestLambdaFunction.mock_private_key_b, algorithm = "RS256", headers = { 'kid': '5b889a22-6e44-45f7-8f5e-537db1d9b16e' })
         mock_event = { 'headers': { 'authorization': f'bearer { mock_token }' }}
 
+        lambda_function.configure()
+
         result = lambda_function.handler(mock_event, self.mock_context)
 
         self.assertEqual(403, result['statusCode'])
@@ -162,6 +182,8 @@ class TestLambdaFunction(TestCase):
         mock_token = jwt.encode(mock_token_payload, TestLambdaFunction.mock_private_key, algorithm = "RS256", headers = { 'kid': 'no-kid' })
         mock_event = { 'headers': { 'authorization': f'bearer { mock_token }' }}
 
+        lambda_function.configure()
+
         result = lambda_function.handler(mock_event, self.mock_context)
 
         self.assertEqual(403, result['statusCode'])
@@ -172,6 +194,8 @@ class TestLambdaFunction(TestCase):
         os.environ['REQUIRE'] = self.mock_scopeList
         os.environ['SIGNATUREKEYPATH'] = 'test/resources/public.pem'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertEqual(403, result['statusCode'])
@@ -182,6 +206,8 @@ class TestLambdaFunction(TestCase):
         os.environ['REQUIRE'] = self.mock_scopeList
         os.environ['SIGNATUREKEYPATH'] = 'test/resources/public.pem'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertEqual(403, result['statusCode'])
@@ -191,6 +217,8 @@ class TestLambdaFunction(TestCase):
         os.environ['REQUIRE'] = 'treasure:read, treasure:write'
         os.environ['SIGNATUREKEYPATH'] = 'test/resources/public.pem'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertEqual(403, result['statusCode'])
\ No newline at end of file
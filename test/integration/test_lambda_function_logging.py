@@ -0,0 +1,64 @@
+# test_lambda_function_logging.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+# Regression test for the logging set up by the lambda. The root logger lives as long as the execution
+# environment, so a warm container must not gain a handler (and duplicate every line) on each invocation.
+# The lambda is invoked 10,000 times without authorization, and the handler count and the bytes written to
+# the log are compared against a single invocation.
+#
+
+from io import StringIO
+from logging import getLogger
+import os
+from unittest import TestCase
+
+from lambdaone import logger
+import lambda_function
+
+class TestLambdaFunctionLogging(TestCase):
+
+    invocations = 10000
+
+    def setUp(self):
+
+        os.environ['LAMBDA_LOG_LEVEL'] = 'INFO'
+        os.environ['REQUIRE'] = ''
+
+        lambda_function.configure()
+
+        # Capture what the lambda handler writes; the original stream is put back afterwards.
+
+        self.handler = next(handler for handler in getLogger().handlers if handler.get_name() == logger.HANDLER_NAME)
+        self.stream = StringIO()
+        self.addCleanup(self.handler.setStream, self.handler.setStream(self.stream))
+
+    def tearDown(self):
+
+        os.environ['LAMBDA_LOG_LEVEL'] = 'ERROR'
+
+        lambda_function.configure()
+
+    def test_handler_count_is_stable(self):
+
+        handlers = len(getLogger().handlers)
+
+        for i in range(TestLambdaFunctionLogging.invocations):
+
+            lambda_function.handler({ 'headers': {} }, {})
+
+        self.assertEqual(handlers, len(getLogger().handlers))
+
+    def test_log_bytes_per_invocation_are_stable(self):
+
+        lambda_function.handler({ 'headers': {} }, {})
+
+        single = len(self.stream.getvalue())
+        self.stream.seek(0)
+        self.stream.truncate()
+
+        for i in range(TestLambdaFunctionLogging.invocations):
+
+            lambda_function.handler({ 'headers': {} }, {})
+
+        self.assertGreater(single, 0)
+        self.assertLessEqual(len(self.stream.getvalue()), single * TestLambdaFunctionLogging.invocations)
@@ -0,0 +1,131 @@
+# test_authorizer_function.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+import authorizer_function
+
+class TestAuthorizerFunction(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.mock_token = 'eyJhbGci...'
+        cls.mock_claims = { 'sub': '1234567890', 'iss': 'https://pyrates', 'scopes': [ 'treasure:read' ] }
+        cls.mock_method_arn = 'arn:aws:execute-api:us-east-1:123456789012:abcdef123/prod/GET/treasure/chest'
+        cls.mock_token_event = { 'type': 'TOKEN', 'authorizationToken': f'Bearer { cls.mock_token }', 'methodArn': cls.mock_method_arn }
+        cls.mock_request_event = { 'type': 'REQUEST', 'headers': { 'Authorization': f'bearer { cls.mock_token }' }, 'methodArn': cls.mock_method_arn }
+
+    def setUp(self):
+
+        os.environ['AUDIENCE'] = 'https://treasure'
+        os.environ['ISSUER'] = 'https://pyrates'
+        os.environ['JWKSPATH'] = 'https://pyrates/jwks'
+        os.environ['SIGNATUREKEYPATH'] = ''
+        os.environ['LAMBDA_LOG_LEVEL'] = 'ERROR'
+        os.environ['REQUIRE'] = 'treasure:read'
+
+        self.mock_verifier_decide_context = patch('lambdaone.verifier.decide', return_value = ( TestAuthorizerFunction.mock_claims, True ))
+        self.mock_verifier_decide_context.start()
+        self.addCleanup(self.mock_verifier_decide_context.stop)
+
+        self.mock_warmup_warm_context = patch('lambdaone.warmup.warm', return_value = 0)
+        self.mock_warmup_warm_context.start()
+        self.addCleanup(self.mock_warmup_warm_context.stop)
+
+        # The logging functions are imported by name into authorizer_function, so they are patched there.
+
+        for name in ( 'error', 'info' ):
+
+            context = patch(f'authorizer_function.{ name }')
+            context.start()
+            self.addCleanup(context.stop)
+
+        authorizer_function.configure()
+
+    def tearDown(self):
+
+        os.environ['REQUIRE'] = ''
+
+        authorizer_function.configure()
+
+    def test_allows_token_event(self):
+
+        result = authorizer_function.handler(TestAuthorizerFunction.mock_token_event, None)
+
+        self.assertEqual('Allow', result['policyDocument']['Statement'][0]['Effect'])
+
+    def test_decides_bearer_token(self):
+
+        authorizer_function.handler(TestAuthorizerFunction.mock_token_event, None)
+
+        self.mock_verifier_decide_context.target.decide.assert_called_once_with(TestAuthorizerFunction.mock_token, authorizer_function.configuration)
+
+    def test_reads_request_event_header_in_any_case(self):
+
+        authorizer_function.handler(TestAuthorizerFunction.mock_request_event, None)
+
+        self.mock_verifier_decide_context.target.decide.assert_called_once_with(TestAuthorizerFunction.mock_token, authorizer_function.configuration)
+
+    def test_principal_is_subject(self):
+
+        result = authorizer_function.handler(TestAuthorizerFunction.mock_token_event, None)
+
+        self.assertEqual('1234567890', result['principalId'])
+
+    def test_resource_is_wildcarded(self):
+
+        result = authorizer_function.handler(TestAuthorizerFunction.mock_token_event, None)
+
+        self.assertEqual('arn:aws:execute-api:us-east-1:123456789012:abcdef123/prod/*', result['policyDocument']['Statement'][0]['Resource'])
+
+    def test_context_has_scopes(self):
+
+        result = authorizer_function.handler(TestAuthorizerFunction.mock_token_event, None)
+
+        self.assertEqual({ 'scope': 'treasure:read', 'sub': '1234567890', 'iss': 'https://pyrates' }, result['context'])
+
+    def test_denies_missing_scopes(self):
+
+        self.mock_verifier_decide_context.target.decide.return_value = ( TestAuthorizerFunction.mock_claims, False )
+
+        result = authorizer_function.handler(TestAuthorizerFunction.mock_token_event, None)
+
+        self.assertEqual('Deny', result['policyDocument']['Statement'][0]['Effect'])
+
+    def test_unauthorized_for_bad_token(self):
+
+        self.mock_verifier_decide_context.target.decide.return_value = None
+
+        with self.assertRaisesRegex(Exception, '^Unauthorized$'):
+
+            authorizer_function.handler(TestAuthorizerFunction.mock_token_event, None)
+
+    def test_unauthorized_for_missing_token(self):
+
+        with self.assertRaisesRegex(Exception, '^Unauthorized$'):
+
+            authorizer_function.handler({ 'type': 'REQUEST', 'headers': {}, 'methodArn': TestAuthorizerFunction.mock_method_arn }, None)
+
+    def test_allows_without_require(self):
+
+        os.environ['REQUIRE'] = ''
+
+        authorizer_function.configure()
+
+        result = authorizer_function.handler({ 'methodArn': TestAuthorizerFunction.mock_method_arn }, None)
+
+        self.assertEqual(( 'anonymous', 'Allow' ), ( result['principalId'], result['policyDocument']['Statement'][0]['Effect'] ))
+
+    def test_bad_configuration_is_not_unauthorized(self):
+
+        os.environ['ISSUER'] = ''
+
+        authorizer_function.configure()
+
+        with self.assertRaisesRegex(Exception, 'Bad configuration'):
+
+            authorizer_function.handler(TestAuthorizerFunction.mock_token_event, None)
@@ -4,13 +4,19 @@
 
 import dotenv
 import importlib
+import io
+import json
 import logging
 import os
 import time
+from types import SimpleNamespace
 from unittest import TestCase
 from unittest.mock import ANY, patch
 
+import lambdaone.config
 import lambdaone.logger
+import lambdaone.metrics
+import lambdaone.scopes
 import lambda_function
 
 class TestLambdaFunction(TestCase):
@@ -22,6 +28,7 @@ class TestLambdaFunction(TestCase):
         expires = now - (60 * 20)
 
         cls.mock_token = 'eyJhbGci...'
+        cls.mock_parsed_token = SimpleNamespace(raw = 'eyJhbGci...', header = { 'alg': 'RS256' }, claims = { 'iss': 'https://pyrates' }, payload = b'{}')
         cls.mock_token_payload = { 'aud': 'myaudience', 'issuer': 'someissuer', 'sub': '1234567890', 'issuedat': now, 'expiresat': expires, 'scopes': [ 'treasure:read' ]}        
         cls.mock_event = { 'headers': { 'authorization': f'bearer {cls.mock_token}' }}
         cls.mock_context = {}
@@ -34,6 +41,8 @@ class TestLambdaFunction(TestCase):
 
         cls.mock_dotenv_load_dotenv_context = patch('dotenv.load_dotenv', return_value = None)
         cls.mock_dotenv_load_dotenv_context.start()
+
+        importlib.reload(lambdaone.config)
        
         # "Hoist" the mock of logging debug and error. The full description of this pattern is in the test_lambdaone/test_jwt_key.py file.
 
@@ -76,6 +85,7 @@ class TestLambdaFunction(TestCase):
         logging.error = cls.mod_logging_error
         logging.info = cls.mod_logging_info
 
+        importlib.reload(lambdaone.config)
         importlib.reload(lambda_function)
 
         return super().tearDownClass()
@@ -88,6 +98,7 @@ class TestLambdaFunction(TestCase):
         self.mock_lambda_log_level = os.environ['LAMBDA_LOG_LEVEL'] = 'DEBUG'
         self.mock_require = os.environ['REQUIRE'] = ''
         self.mock_signature_key_path = os.environ['SIGNATUREKEYPATH'] = ''
+        os.environ['TRUSTUPSTREAM'] = ''
 
         self.mock_hello_world_hello = patch('lambdaone.hello_world.hello', return_value='Hello, Mock!')
         self.mock_hello_world_hello.start()
@@ -97,13 +108,21 @@ class TestLambdaFunction(TestCase):
         self.mock_sys_version.start()
         self.addCleanup(self.mock_sys_version.stop)
 
+        self.mock_lambdaone_precheck_screen_context = patch('lambdaone.precheck.screen', return_value = TestLambdaFunction.mock_parsed_token)
+        self.mock_lambdaone_precheck_screen_context.start()
+        self.addCleanup(self.mock_lambdaone_precheck_screen_context.stop)
+
         self.mock_lambdaone_jwt_key_load_context = patch('lambdaone.jwt_key.load', return_value = ( TestLambdaFunction.mock_key, TestLambdaFunction.mock_algorithm ))
         self.mock_lambdaone_jwt_key_load_context.start()
         self.addCleanup(self.mock_lambdaone_jwt_key_load_context.stop)
 
-        self.mock_lambdaone_authz_verify_context = patch('lambdaone.authz.verify', return_value = TestLambdaFunction.mock_token_payload)
-        self.mock_lambdaone_authz_verify_context.start()
-        self.addCleanup(self.mock_lambdaone_authz_verify_context.stop)
+        self.mock_lambdaone_authz_decode_context = patch('lambdaone.authz.decode', return_value = TestLambdaFunction.mock_token_payload)
+        self.mock_lambdaone_authz_decode_context.start()
+        self.addCleanup(self.mock_lambdaone_authz_decode_context.stop)
+
+        self.mock_lambdaone_authz_authorized_context = patch('lambdaone.authz.authorized', return_value = True)
+        self.mock_lambdaone_authz_authorized_context.start()
+        self.addCleanup(self.mock_lambdaone_authz_authorized_context.stop)
 
         TestLambdaFunction.mock_logging_debug_context.target.error.reset_mock()
         TestLambdaFunction.mock_logging_debug_context.target.error.return_value = None
@@ -115,17 +134,42 @@ class TestLambdaFunction(TestCase):
 
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         lambda_function.handler(self.mock_event, self.mock_context)
 
         self.mock_lambdaone_jwt_key_load_context.target.load.assert_called_once_with(self.mock_jwks_path, ANY)
 
-    def test_accepts_bearer_token_for_key(self):
+    def test_screens_bearer_token(self):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+
+        lambda_function.configure()
+
+        lambda_function.handler(self.mock_event, self.mock_context)
+
+        self.mock_lambdaone_precheck_screen_context.target.screen.assert_called_once_with('eyJhbGci...', lambda_function.configuration)
+
+    def test_accepts_parsed_token_for_key(self):
 
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         lambda_function.handler(self.mock_event, self.mock_context)
 
-        self.mock_lambdaone_jwt_key_load_context.target.load.assert_called_once_with(ANY, 'eyJhbGci...')
+        self.mock_lambdaone_jwt_key_load_context.target.load.assert_called_once_with(ANY, TestLambdaFunction.mock_parsed_token)
+
+    def test_rejects_screened_token(self):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+        self.mock_lambdaone_precheck_screen_context.target.screen.return_value = None
+
+        lambda_function.configure()
+
+        result = lambda_function.handler(self.mock_event, self.mock_context)
+
+        self.assertEqual(403, result['statusCode'])
 
     @patch('lambdaone.fixed_key.load')
     def test_accepts_signature_path_for_key(self, mock_lambdaone_fixed_key_load):
@@ -135,9 +179,11 @@ class TestLambdaFunction(TestCase):
         os.environ['SIGNATUREKEYPATH'] = 'public.pem'
         mock_lambdaone_fixed_key_load.return_value = ( TestLambdaFunction.mock_key, TestLambdaFunction.mock_algorithm )
 
+        lambda_function.configure()
+
         lambda_function.handler(self.mock_event, self.mock_context)
 
-        mock_lambdaone_fixed_key_load.assert_called_once_with('public.pem', TestLambdaFunction.mock_token)
+        mock_lambdaone_fixed_key_load.assert_called_once_with('public.pem', TestLambdaFunction.mock_parsed_token)
 
     def test_rejects_both_jwks_and_signature(self):
 
@@ -145,6 +191,8 @@ class TestLambdaFunction(TestCase):
         os.environ['REQUIRE'] = 'treasure:read'
         os.environ['SIGNATUREKEYPATH'] = 'public.pem'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertEqual(400, result['statusCode'])
@@ -155,35 +203,31 @@ class TestLambdaFunction(TestCase):
         os.environ['REQUIRE'] = 'treasure:read'
         os.environ['SIGNATUREKEYPATH'] = 'public.pem'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         TestLambdaFunction.mock_logging_error_context.target.error.assert_called_once()
 
-    def test_rejects_niether_jwks_and_signature(self):
+    def test_discovers_jwks_without_jwks_and_signature(self):
 
         os.environ.pop('JWKSPATH', None)
         os.environ['REQUIRE'] = 'treasure:read'
         os.environ.pop('SIGNATUREKEYPATH', None)
 
-        result = lambda_function.handler(self.mock_event, self.mock_context)
-
-        self.assertEqual(400, result['statusCode'])
-
-    def test_logs_error_on_niether_jwks_and_signature(self):
-
-        os.environ.pop('JWKSPATH', None)
-        os.environ['REQUIRE'] = 'treasure:read'
-        os.environ.pop('SIGNATUREKEYPATH', None)
+        lambda_function.configure()
 
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
-        TestLambdaFunction.mock_logging_error_context.target.error.assert_called_once()
+        self.mock_lambdaone_jwt_key_load_context.target.load.assert_called_once_with('https://pyrates/.well-known/openid-configuration', TestLambdaFunction.mock_parsed_token)
 
     def test_rejects_audience_is_None(self):
 
         os.environ.pop('AUDIENCE', None)
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertEqual(400, result['statusCode'])
@@ -193,6 +237,8 @@ class TestLambdaFunction(TestCase):
         os.environ.pop('AUDIENCE', None)
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         TestLambdaFunction.mock_logging_error_context.target.error.assert_called_once()
@@ -202,6 +248,8 @@ class TestLambdaFunction(TestCase):
         os.environ.pop('ISSUER', None)
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertEqual(400, result['statusCode'])
@@ -211,6 +259,8 @@ class TestLambdaFunction(TestCase):
         os.environ.pop('ISSUER', None)
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         TestLambdaFunction.mock_logging_error_context.target.error.assert_called_once()
@@ -221,6 +271,8 @@ class TestLambdaFunction(TestCase):
         os.environ.pop('ISSUER', None)
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertEqual(400, result['statusCode'])
@@ -231,6 +283,8 @@ class TestLambdaFunction(TestCase):
         os.environ.pop('ISSUER', None)
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         TestLambdaFunction.mock_logging_error_context.target.error.assert_called_once()
@@ -240,6 +294,8 @@ class TestLambdaFunction(TestCase):
         mock_event = { 'headers': { } }
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(mock_event, self.mock_context)
 
         self.assertEqual(400, result['statusCode'])
@@ -249,6 +305,8 @@ class TestLambdaFunction(TestCase):
         mock_event = { 'headers': { } }
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         result = lambda_function.handler(mock_event, self.mock_context)
 
         TestLambdaFunction.mock_logging_error_context.target.error.assert_called_once()
@@ -257,64 +315,82 @@ class TestLambdaFunction(TestCase):
 
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         lambda_function.handler(self.mock_event, self.mock_context)
 
-        self.mock_lambdaone_authz_verify_context.target.verify.assert_called_once_with(TestLambdaFunction.mock_token, ANY, ANY, ANY, ANY, ANY)
+        self.mock_lambdaone_authz_decode_context.target.decode.assert_called_once_with(TestLambdaFunction.mock_parsed_token, ANY, ANY, ANY, ANY)
 
     def test_accepts_key_for_authz(self):
 
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         lambda_function.handler(self.mock_event, self.mock_context)
 
-        self.mock_lambdaone_authz_verify_context.target.verify.assert_called_once_with(ANY, TestLambdaFunction.mock_key, ANY, ANY, ANY, ANY)
+        self.mock_lambdaone_authz_decode_context.target.decode.assert_called_once_with(ANY, TestLambdaFunction.mock_key, ANY, ANY, ANY)
 
     def test_accepts_agorithm_for_authz(self):
 
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         lambda_function.handler(self.mock_event, self.mock_context)
 
-        self.mock_lambdaone_authz_verify_context.target.verify.assert_called_once_with(ANY, ANY, TestLambdaFunction.mock_algorithm, ANY, ANY, ANY)
+        self.mock_lambdaone_authz_decode_context.target.decode.assert_called_once_with(ANY, ANY, TestLambdaFunction.mock_algorithm, ANY, ANY)
 
     def test_accepts_audience_for_authz(self):
 
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         lambda_function.handler(self.mock_event, self.mock_context)
 
-        self.mock_lambdaone_authz_verify_context.target.verify.assert_called_once_with(ANY, ANY, ANY, self.mock_audience, ANY, ANY)
+        self.mock_lambdaone_authz_decode_context.target.decode.assert_called_once_with(ANY, ANY, ANY, self.mock_audience, ANY)
 
     def test_accepts_issuer_for_authz(self):
 
         os.environ['REQUIRE'] = 'treasure:read'
 
+        lambda_function.configure()
+
         lambda_function.handler(self.mock_event, self.mock_context)
 
-        self.mock_lambdaone_authz_verify_context.target.verify.assert_called_once_with(ANY, ANY, ANY, ANY, self.mock_issuer, ANY)
+        self.mock_lambdaone_authz_decode_context.target.decode.assert_called_once_with(ANY, ANY, ANY, ANY, self.mock_issuer)
 
     def test_accepts_require_for_authz(self):
 
         os.environ['REQUIRE'] = 'treasure:write'
 
+        lambda_function.configure()
+
         lambda_function.handler(self.mock_event, self.mock_context)
 
-        self.mock_lambdaone_authz_verify_context.target.verify.assert_called_once_with(ANY, ANY, ANY, ANY, ANY, [ 'treasure:write' ])
+        self.mock_lambdaone_authz_authorized_context.target.authorized.assert_called_once_with(TestLambdaFunction.mock_token_payload, lambdaone.scopes.compile('treasure:write'))
 
     def test_calls_hello_world(self):
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertIn('Hello, Mock!', result)
 
     def test_references_sys_version(self):
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertIn('version_mock', result)
 
     def test_logs_info_on_authorization_accepted(self):
 
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         TestLambdaFunction.mock_logging_info_context.target.info.assert_called_once()
@@ -322,7 +398,9 @@ class TestLambdaFunction(TestCase):
     def test_returns_error_for_bad_authorization(self):
 
         os.environ['REQUIRE'] = 'treasure:read'
-        self.mock_lambdaone_authz_verify_context.target.verify.return_value = None
+        self.mock_lambdaone_authz_decode_context.target.decode.return_value = None
+
+        lambda_function.configure()
 
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
@@ -331,7 +409,9 @@ class TestLambdaFunction(TestCase):
     def test_logs_info_on_bad_authorization(self):
 
         os.environ['REQUIRE'] = 'treasure:read'
-        self.mock_lambdaone_authz_verify_context.target.verify.return_value = None
+        self.mock_lambdaone_authz_decode_context.target.decode.return_value = None
+
+        lambda_function.configure()
 
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
@@ -341,6 +421,166 @@ class TestLambdaFunction(TestCase):
 
         os.environ.pop('REQUIRE', None)
 
+        lambda_function.configure()
+
+        result = lambda_function.handler(self.mock_event, self.mock_context)
+
+        self.assertIn('Hello, Mock!', result)
+
+    def test_returns_error_for_missing_scopes(self):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+        self.mock_lambdaone_authz_authorized_context.target.authorized.return_value = False
+
+        lambda_function.configure()
+
+        result = lambda_function.handler(self.mock_event, self.mock_context)
+
+        self.assertEqual(403, result['statusCode'])
+
+    @patch('lambdaone.decision_cache.get')
+    def test_cached_decision_skips_key_and_verification(self, mock_decision_cache_get):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+        mock_decision_cache_get.return_value = ( TestLambdaFunction.mock_token_payload, True )
+
+        lambda_function.configure()
+
         result = lambda_function.handler(self.mock_event, self.mock_context)
 
         self.assertIn('Hello, Mock!', result)
+        self.mock_lambdaone_jwt_key_load_context.target.load.assert_not_called()
+        self.mock_lambdaone_authz_decode_context.target.decode.assert_not_called()
+
+    @patch('lambdaone.decision_cache.get')
+    def test_cached_denial(self, mock_decision_cache_get):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+        mock_decision_cache_get.return_value = ( TestLambdaFunction.mock_token_payload, False )
+
+        lambda_function.configure()
+
+        result = lambda_function.handler(self.mock_event, self.mock_context)
+
+        self.assertEqual(403, result['statusCode'])
+
+    @patch('lambdaone.decision_cache.put')
+    def test_caches_decision(self, mock_decision_cache_put):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+
+        lambda_function.configure()
+
+        lambda_function.handler(self.mock_event, self.mock_context)
+
+        mock_decision_cache_put.assert_called_once_with(TestLambdaFunction.mock_token, ( TestLambdaFunction.mock_token_payload, True ), ANY, ANY)
+
+    def test_trusts_upstream_claims(self):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+        os.environ['TRUSTUPSTREAM'] = 'true'
+        event = { 'requestContext': { 'authorizer': { 'jwt': { 'claims': { 'iss': self.mock_issuer, 'aud': self.mock_audience, 'scope': 'treasure:read' } } } } }
+
+        lambda_function.configure()
+
+        result = lambda_function.handler(event, self.mock_context)
+
+        self.assertEqual(( 'Hello, Mock! sys.version: version_mock', False ), ( result, self.mock_lambdaone_precheck_screen_context.target.screen.called ))
+
+    def test_upstream_claims_need_scopes(self):
+
+        os.environ['REQUIRE'] = 'treasure:write'
+        os.environ['TRUSTUPSTREAM'] = 'true'
+        event = { 'requestContext': { 'authorizer': { 'jwt': { 'claims': { 'iss': self.mock_issuer, 'aud': self.mock_audience, 'scope': 'treasure:read' } } } } }
+
+        lambda_function.configure()
+
+        result = lambda_function.handler(event, self.mock_context)
+
+        self.assertEqual(403, result['statusCode'])
+
+    def test_upstream_claims_ignored_unless_trusted(self):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+        event = { **self.mock_event, 'requestContext': { 'authorizer': { 'jwt': { 'claims': { 'iss': self.mock_issuer, 'aud': self.mock_audience, 'scope': 'treasure:read' } } } } }
+
+        lambda_function.configure()
+
+        lambda_function.handler(event, self.mock_context)
+
+        self.mock_lambdaone_precheck_screen_context.target.screen.assert_called_once()
+
+    def test_upstream_mode_denies_without_claims(self):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+        os.environ['TRUSTUPSTREAM'] = 'true'
+        os.environ['JWKSPATH'] = ''
+
+        lambda_function.configure()
+
+        result = lambda_function.handler(self.mock_event, self.mock_context)
+
+        self.assertEqual(403, result['statusCode'])
+
+    def test_rest_api_response(self):
+
+        event = { 'httpMethod': 'GET', 'headers': { 'Authorization': f'Bearer { TestLambdaFunction.mock_token }' }, 'requestContext': {} }
+        os.environ['REQUIRE'] = 'treasure:read'
+
+        lambda_function.configure()
+
+        result = lambda_function.handler(event, self.mock_context)
+
+        self.assertEqual(( 200, 'Hello, Mock! sys.version: version_mock' ), ( result['statusCode'], result['body'] ))
+
+    def test_rest_api_denied_response(self):
+
+        event = { 'httpMethod': 'GET', 'headers': { 'Authorization': f'Bearer { TestLambdaFunction.mock_token }' }, 'requestContext': {} }
+        os.environ['REQUIRE'] = 'treasure:read'
+        self.mock_lambdaone_authz_authorized_context.target.authorized.return_value = False
+
+        lambda_function.configure()
+
+        result = lambda_function.handler(event, self.mock_context)
+
+        self.assertEqual(( 403, 'application/json' ), ( result['statusCode'], result['headers']['Content-Type'] ))
+
+    def test_bad_request_without_headers(self):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+
+        lambda_function.configure()
+
+        result = lambda_function.handler({ 'version': '2.0', 'requestContext': { 'http': {} } }, self.mock_context)
+
+        self.assertEqual(400, result['statusCode'])
+
+    def test_sqs_batch_reports_failed_records(self):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+        event = { 'Records': [
+            { 'eventSource': 'aws:sqs', 'messageId': 'm1', 'messageAttributes': { 'Authorization': { 'stringValue': f'Bearer { TestLambdaFunction.mock_token }' } } },
+            { 'eventSource': 'aws:sqs', 'messageId': 'm2', 'messageAttributes': {} } ] }
+
+        lambda_function.configure()
+
+        result = lambda_function.handler(event, self.mock_context)
+
+        self.assertEqual({ 'batchItemFailures': [ { 'itemIdentifier': 'm2' } ] }, result)
+
+    def test_emits_stage_metrics(self):
+
+        os.environ['REQUIRE'] = 'treasure:read'
+        os.environ['METRICS'] = 'true'
+        self.addCleanup(os.environ.pop, 'METRICS', None)
+        self.addCleanup(lambdaone.metrics.configure, False)
+
+        lambda_function.configure()
+
+        with patch('sys.stdout', new_callable = io.StringIO) as mock_stdout:
+
+            lambda_function.handler(self.mock_event, self.mock_context)
+
+        result = json.loads(mock_stdout.getvalue().splitlines()[-1])
+
+        self.assertTrue({ 'Handler', 'Config', 'Token', 'Key', 'Verify', 'Business', 'Response', 'DecisionCacheMiss' } <= result.keys())
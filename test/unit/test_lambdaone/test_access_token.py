@@ -0,0 +1,95 @@
+# test_access_token.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import importlib
+import jwt
+import logging
+from unittest import TestCase
+from unittest.mock import patch
+
+from lambdaone import access_token
+
+class TestAccessToken(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.mock_token_payload = { 'aud': 'https://treasure', 'iss': 'https://pyrates', 'sub': '1234567890', 'scopes': [ 'treasure:read' ]}
+
+        with open('test/resources/private.pem', 'r') as fp:
+
+            cls.mock_token = jwt.encode(cls.mock_token_payload, fp.read(), algorithm = 'RS256', headers = { 'kid': '5b889a22-6e44-45f7-8f5e-537db1d9b16e' })
+
+        # "Hoist" the mock of logging error. The full description of this pattern is in the test_lambdaone/test_jwt_key.py file.
+
+        cls.mod_logging_error = logging.error
+
+        cls.mock_logging_error_context = patch('logging.error', return_value = None)
+        cls.mock_logging_error_context.start()
+
+        importlib.reload(access_token)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        cls.mock_logging_error_context.stop()
+
+        logging.error = cls.mod_logging_error
+
+        importlib.reload(access_token)
+
+        return super().tearDownClass()
+
+    def setUp(self):
+
+        TestAccessToken.mock_logging_error_context.target.error.reset_mock()
+
+    def test_parses_header(self):
+
+        result = access_token.parse(TestAccessToken.mock_token)
+
+        self.assertEqual(jwt.get_unverified_header(TestAccessToken.mock_token), result.header)
+
+    def test_parses_claims(self):
+
+        result = access_token.parse(TestAccessToken.mock_token)
+
+        self.assertEqual(TestAccessToken.mock_token_payload, result.claims)
+
+    def test_keeps_raw_token(self):
+
+        result = access_token.parse(TestAccessToken.mock_token)
+
+        self.assertEqual(TestAccessToken.mock_token, result.raw)
+
+    def test_signing_input_and_signature(self):
+
+        result = access_token.parse(TestAccessToken.mock_token)
+
+        self.assertEqual(TestAccessToken.mock_token.rsplit('.', 1)[0].encode('utf-8'), result.signing_input)
+        self.assertEqual(256, len(result.signature))
+
+    def test_None_on_missing_segments(self):
+
+        result = access_token.parse('eyJhbGci...')
+
+        self.assertIsNone(result)
+
+    def test_None_on_bad_header(self):
+
+        result = access_token.parse('bm90IGpzb24.e30.c2ln')
+
+        self.assertIsNone(result)
+
+    def test_None_on_header_not_object(self):
+
+        result = access_token.parse('WzFd.e30.c2ln')
+
+        self.assertIsNone(result)
+
+    def test_logs_error_on_exception(self):
+
+        result = access_token.parse('eyJhbGci...')
+
+        TestAccessToken.mock_logging_error_context.target.error.assert_called_once()
@@ -0,0 +1,114 @@
+# test_batch.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import base64
+import json
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from lambdaone import batch
+from lambdaone import config
+
+class TestBatch(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.mock_claims = { 'sub': '1234567890' }
+        cls.mock_sqs_event = { 'Records': [
+            { 'eventSource': 'aws:sqs', 'messageId': 'm1', 'messageAttributes': { 'Authorization': { 'stringValue': 'Bearer token1', 'dataType': 'String' } } },
+            { 'eventSource': 'aws:sqs', 'messageId': 'm2', 'messageAttributes': { 'authorization': { 'stringValue': 'token2', 'dataType': 'String' } } },
+            { 'eventSource': 'aws:sqs', 'messageId': 'm3', 'messageAttributes': {} } ] }
+        cls.mock_kinesis_record = { 'eventSource': 'aws:kinesis',
+            'kinesis': { 'sequenceNumber': '49590338271490256608559692538361571095921575989136588898', 'data': base64.b64encode(json.dumps({ 'authorization': 'Bearer token1' }).encode()).decode() } }
+        cls.mock_dynamodb_record = { 'eventSource': 'aws:dynamodb', 'dynamodb': { 'SequenceNumber': '111', 'NewImage': { 'authorization': { 'S': 'Bearer token1' } } } }
+
+    def setUp(self):
+
+        self.mock_configuration = SimpleNamespace(mode = config.MODE_JWKS, error = None)
+        self.mock_process = Mock()
+
+        for ( name, value ) in ( ( 'info', None ), ( 'error', None ) ):
+
+            context = patch(f'lambdaone.batch.{ name }', return_value = value)
+            context.start()
+            self.addCleanup(context.stop)
+
+        context = patch('lambdaone.verifier.decide_all', side_effect = lambda tokens, configuration: [ ( TestBatch.mock_claims, token == 'token1' ) for token in tokens ])
+        self.mock_verifier_decide_all = context.start()
+        self.addCleanup(context.stop)
+
+    def test_source(self):
+
+        result = tuple(batch.source(event) for event in ( TestBatch.mock_sqs_event, { 'Records': [ TestBatch.mock_kinesis_record ] },
+            { 'Records': [ TestBatch.mock_dynamodb_record ] }, { 'Records': [ { 'eventSource': 'aws:s3' } ] }, { 'headers': {} } ))
+
+        self.assertEqual(( batch.SQS, batch.KINESIS, batch.DYNAMODB, None, None ), result)
+
+    def test_sqs_token_any_case(self):
+
+        result = [ batch.token(batch.SQS, record) for record in TestBatch.mock_sqs_event['Records'] ]
+
+        self.assertEqual([ 'token1', 'token2', None ], result)
+
+    def test_kinesis_token(self):
+
+        result = batch.token(batch.KINESIS, TestBatch.mock_kinesis_record)
+
+        self.assertEqual('token1', result)
+
+    def test_kinesis_token_not_json(self):
+
+        result = batch.token(batch.KINESIS, { 'kinesis': { 'data': base64.b64encode(b'not json').decode() } })
+
+        self.assertIsNone(result)
+
+    def test_dynamodb_token(self):
+
+        result = batch.token(batch.DYNAMODB, TestBatch.mock_dynamodb_record)
+
+        self.assertEqual('token1', result)
+
+    def test_reports_unauthorized_records(self):
+
+        result = batch.handle(TestBatch.mock_sqs_event, self.mock_configuration, self.mock_process)
+
+        self.assertEqual({ 'batchItemFailures': [ { 'itemIdentifier': 'm2' }, { 'itemIdentifier': 'm3' } ] }, result)
+
+    def test_processes_authorized_records(self):
+
+        batch.handle(TestBatch.mock_sqs_event, self.mock_configuration, self.mock_process)
+
+        self.mock_process.assert_called_once_with(TestBatch.mock_sqs_event['Records'][0], TestBatch.mock_claims)
+
+    def test_decides_tokens_in_one_pass(self):
+
+        batch.handle(TestBatch.mock_sqs_event, self.mock_configuration, self.mock_process)
+
+        self.mock_verifier_decide_all.assert_called_once_with([ 'token1', 'token2' ], self.mock_configuration)
+
+    def test_reports_failed_processing(self):
+
+        self.mock_process.side_effect = ValueError('bad record')
+
+        result = batch.handle({ 'Records': [ TestBatch.mock_kinesis_record ] }, self.mock_configuration, self.mock_process)
+
+        self.assertEqual([ { 'itemIdentifier': TestBatch.mock_kinesis_record['kinesis']['sequenceNumber'] } ], result['batchItemFailures'])
+
+    def test_no_authorization_required(self):
+
+        self.mock_configuration.mode = config.MODE_NONE
+
+        result = batch.handle(TestBatch.mock_sqs_event, self.mock_configuration, self.mock_process)
+
+        self.assertEqual(( [], 3 ), ( result['batchItemFailures'], self.mock_process.call_count ))
+
+    def test_bad_configuration_fails_every_record(self):
+
+        self.mock_configuration.error = 'missing audience'
+
+        result = batch.handle({ 'Records': [ TestBatch.mock_dynamodb_record ] }, self.mock_configuration, self.mock_process)
+
+        self.assertEqual(( [ { 'itemIdentifier': '111' } ], False ), ( result['batchItemFailures'], self.mock_process.called ))
@@ -0,0 +1,357 @@
+# test_config.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import dotenv
+import importlib
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import ANY, patch
+
+from lambdaone import config
+
+class TestConfig(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.mock_dotenv_path = os.path.join(cls.directory.name, '.env')
+
+        with open(cls.mock_dotenv_path, 'w') as fp:
+
+            fp.write('REQUIRE=\n')
+
+        # "Hoist" the mock of dotenv load_dotenv. The full description of this pattern is in the test_lambdaone/test_jwt_key.py file.
+
+        cls.mod_dotenv_load_dotenv = dotenv.load_dotenv
+
+        cls.mock_dotenv_load_dotenv_context = patch('dotenv.load_dotenv', return_value = None)
+        cls.mock_dotenv_load_dotenv_context.start()
+
+        importlib.reload(config)
+
+        # The search for .env is in the config module itself, so it is patched after the reload.
+
+        cls.mod_config_find_dotenv = config._find_dotenv
+
+        cls.mock_config_find_dotenv_context = patch('lambdaone.config._find_dotenv', return_value = cls.mock_dotenv_path)
+        cls.mock_config_find_dotenv_context.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        cls.mock_config_find_dotenv_context.stop()
+        cls.mock_dotenv_load_dotenv_context.stop()
+
+        dotenv.load_dotenv = cls.mod_dotenv_load_dotenv
+
+        importlib.reload(config)
+
+        cls.directory.cleanup()
+
+        return super().tearDownClass()
+
+    def setUp(self):
+
+        self.mock_audience = os.environ['AUDIENCE'] = 'https://treasure'
+        self.mock_issuer = os.environ['ISSUER'] = 'https://pyrates'
+        self.mock_jwks_path = os.environ['JWKSPATH'] = 'https://pyrates/jwks'
+        self.mock_lambda_log_level = os.environ['LAMBDA_LOG_LEVEL'] = 'DEBUG'
+        self.mock_require = os.environ['REQUIRE'] = 'treasure:read, treasure:write'
+        self.mock_signature_key_path = os.environ['SIGNATUREKEYPATH'] = ''
+        os.environ.pop('ALGORITHMS', None)
+        os.environ.pop('MAXTOKENLENGTH', None)
+        os.environ.pop('CONFIGRELOAD', None)
+        os.environ.pop('TRUSTUPSTREAM', None)
+        os.environ.pop('ISSUERS', None)
+        self.addCleanup(os.environ.pop, 'ISSUERS', None)
+        self.addCleanup(os.environ.pop, 'CONFIGRELOAD', None)
+
+        TestConfig.mock_dotenv_load_dotenv_context.target.load_dotenv.reset_mock()
+
+    def test_skips_dotenv_without_file(self):
+
+        with patch('lambdaone.config._find_dotenv', return_value = ''):
+
+            config.load()
+
+        TestConfig.mock_dotenv_load_dotenv_context.target.load_dotenv.assert_not_called()
+
+    def test_finds_dotenv_above_package(self):
+
+        result = TestConfig.mod_config_find_dotenv()
+
+        self.assertEqual(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(config.__file__))), '.env'), result)
+
+    def test_loads_dotenv(self):
+
+        config.load()
+
+        TestConfig.mock_dotenv_load_dotenv_context.target.load_dotenv.assert_called_once_with(TestConfig.mock_dotenv_path, override = False)
+
+    def test_require_is_compiled(self):
+
+        result = config.load()
+
+        self.assertEqual(( ( 'treasure:read', ), ( 'treasure:write', ) ), result.require.groups)
+
+    def test_default_algorithms(self):
+
+        result = config.load()
+
+        self.assertIn('RS256', result.algorithms)
+        self.assertNotIn('HS256', result.algorithms)
+
+    def test_algorithms(self):
+
+        os.environ['ALGORITHMS'] = 'RS256 , ES256'
+        self.addCleanup(os.environ.pop, 'ALGORITHMS', None)
+
+        result = config.load()
+
+        self.assertEqual(frozenset([ 'RS256', 'ES256' ]), result.algorithms)
+
+    def test_max_token_length(self):
+
+        os.environ['MAXTOKENLENGTH'] = '4096'
+        self.addCleanup(os.environ.pop, 'MAXTOKENLENGTH', None)
+
+        result = config.load()
+
+        self.assertEqual(4096, result.max_token_length)
+
+    def test_error_on_bad_max_token_length(self):
+
+        os.environ['MAXTOKENLENGTH'] = 'big'
+        self.addCleanup(os.environ.pop, 'MAXTOKENLENGTH', None)
+
+        result = config.load()
+
+        self.assertIsNotNone(result.error)
+
+    def test_audience_and_issuer(self):
+
+        result = config.load()
+
+        self.assertEqual(( self.mock_audience, self.mock_issuer ), ( result.audience, result.issuer ))
+
+    def test_log_level(self):
+
+        result = config.load()
+
+        self.assertEqual(self.mock_lambda_log_level, result.log_level)
+
+    def test_is_immutable(self):
+
+        result = config.load()
+
+        with self.assertRaises(Exception):
+
+            result.audience = 'https://other'
+
+    def test_mode_none_without_require(self):
+
+        os.environ['REQUIRE'] = ''
+
+        result = config.load()
+
+        self.assertEqual(( config.MODE_NONE, None ), ( result.mode, result.error ))
+
+    def test_mode_jwks(self):
+
+        result = config.load()
+
+        self.assertEqual(( config.MODE_JWKS, None ), ( result.mode, result.error ))
+
+    def test_mode_fixed(self):
+
+        os.environ['JWKSPATH'] = ''
+        os.environ['SIGNATUREKEYPATH'] = 'public.pem'
+
+        result = config.load()
+
+        self.assertEqual(( config.MODE_FIXED, None ), ( result.mode, result.error ))
+
+    def test_mode_upstream_without_key(self):
+
+        os.environ['JWKSPATH'] = ''
+        os.environ['TRUSTUPSTREAM'] = 'true'
+
+        result = config.load()
+
+        self.assertEqual(( config.MODE_UPSTREAM, True, None ), ( result.mode, result.trust_upstream, result.error ))
+
+    def test_trust_upstream_with_key(self):
+
+        os.environ['TRUSTUPSTREAM'] = 'true'
+
+        result = config.load()
+
+        self.assertEqual(( config.MODE_JWKS, True ), ( result.mode, result.trust_upstream ))
+
+    def test_mode_registry(self):
+
+        os.environ['JWKSPATH'] = ''
+        os.environ.pop('AUDIENCE', None)
+        os.environ['ISSUERS'] = '{ "https://pyrates": { "jwks": "https://pyrates/jwks", "audience": "https://treasure" } }'
+
+        result = config.load()
+
+        self.assertEqual(( config.MODE_REGISTRY, None, [ 'https://pyrates' ] ), ( result.mode, result.error, list(result.issuers) ))
+
+    def test_error_on_registry_with_jwks(self):
+
+        os.environ['ISSUERS'] = '{ "https://pyrates": { "jwks": "https://pyrates/jwks", "audience": "https://treasure" } }'
+
+        result = config.load()
+
+        self.assertIsNotNone(result.error)
+
+    def test_error_on_bad_registry(self):
+
+        os.environ['JWKSPATH'] = ''
+        os.environ['ISSUERS'] = '{ "https://pyrates": '
+
+        result = config.load()
+
+        self.assertIsNotNone(result.error)
+
+    def test_error_on_registry_audience_not_string(self):
+
+        os.environ['JWKSPATH'] = ''
+        os.environ['ISSUERS'] = '{ "https://pyrates": { "audience": 5 } }'
+
+        result = config.load()
+
+        self.assertEqual('ISSUERS entry for https://pyrates needs an audience that is a string or a list of strings', result.error)
+
+    def test_metrics_off_by_default(self):
+
+        result = config.load()
+
+        self.assertEqual(( False, config.DEFAULT_METRICS_NAMESPACE, config.DEFAULT_METRICS_BATCH ), ( result.metrics, result.metrics_namespace, result.metrics_batch ))
+
+    def test_metrics(self):
+
+        for ( name, value ) in ( ( 'METRICS', 'true' ), ( 'METRICSNAMESPACE', 'Treasure' ), ( 'METRICSBATCH', '10' ) ):
+
+            os.environ[name] = value
+            self.addCleanup(os.environ.pop, name, None)
+
+        result = config.load()
+
+        self.assertEqual(( True, 'Treasure', 10 ), ( result.metrics, result.metrics_namespace, result.metrics_batch ))
+
+    def test_profile(self):
+
+        for ( name, value ) in ( ( 'PROFILE', 'CPU, memory' ), ( 'PROFILESAMPLE', '10' ) ):
+
+            os.environ[name] = value
+            self.addCleanup(os.environ.pop, name, None)
+
+        result = config.load()
+
+        self.assertEqual(( frozenset([ 'cpu', 'memory' ]), 10, None ), ( result.profile, result.profile_sample, result.error ))
+
+    def test_error_on_unknown_profiler(self):
+
+        os.environ['PROFILE'] = 'gpu'
+        self.addCleanup(os.environ.pop, 'PROFILE', None)
+
+        result = config.load()
+
+        self.assertIsNotNone(result.error)
+
+    def test_jwks_defaults(self):
+
+        result = config.load()
+
+        self.assertEqual(( config.DEFAULT_JWKS_TTL, config.DEFAULT_JWKS_STALE, config.DEFAULT_JWKS_REFETCH, config.DEFAULT_JWKS_REFRESH_AHEAD,
+            config.DEFAULT_JWKS_MAX_ISSUERS, False, True, config.DEFAULT_JWKS_CACHE_DIR ), ( result.jwks_ttl, result.jwks_stale, result.jwks_refetch,
+            result.jwks_refresh_ahead, result.jwks_max_issuers, result.jwks_background, result.jwks_persist, result.jwks_cache_dir ))
+
+    def test_jwks(self):
+
+        for ( name, value ) in ( ( 'JWKSTTL', '60' ), ( 'JWKSSTALE', '120' ), ( 'JWKSREFETCH', '10' ), ( 'JWKSREFRESHAHEAD', '15' ), ( 'JWKSMAXISSUERS', '4' ),
+            ( 'JWKSBACKGROUND', 'TRUE' ), ( 'JWKSPERSIST', 'false' ), ( 'JWKSCACHEDIR', '/tmp/jwks' ) ):
+
+            os.environ[name] = value
+            self.addCleanup(os.environ.pop, name, None)
+
+        result = config.load()
+
+        self.assertEqual(( 60, 120, 10, 15, 4, True, False, '/tmp/jwks', None ), ( result.jwks_ttl, result.jwks_stale, result.jwks_refetch,
+            result.jwks_refresh_ahead, result.jwks_max_issuers, result.jwks_background, result.jwks_persist, result.jwks_cache_dir, result.error ))
+
+    def test_error_on_bad_jwks_refetch(self):
+
+        os.environ['JWKSREFETCH'] = '30s'
+        self.addCleanup(os.environ.pop, 'JWKSREFETCH', None)
+
+        result = config.load()
+
+        self.assertEqual('JWKSREFETCH is not a number', result.error)
+
+    def test_error_on_audience_is_None(self):
+
+        os.environ.pop('AUDIENCE', None)
+
+        result = config.load()
+
+        self.assertIsNotNone(result.error)
+
+    def test_error_on_issuer_is_None(self):
+
+        os.environ.pop('ISSUER', None)
+
+        result = config.load()
+
+        self.assertIsNotNone(result.error)
+
+    def test_error_on_both_jwks_and_signature(self):
+
+        os.environ['SIGNATUREKEYPATH'] = 'public.pem'
+
+        result = config.load()
+
+        self.assertIsNotNone(result.error)
+
+    def test_discovery_without_jwks_and_signature(self):
+
+        os.environ.pop('JWKSPATH', None)
+        os.environ.pop('SIGNATUREKEYPATH', None)
+
+        result = config.load()
+
+        self.assertEqual(( config.MODE_JWKS, 'https://pyrates/.well-known/openid-configuration', None ), ( result.mode, result.jwks_path, result.error ))
+
+    def test_refresh_keeps_snapshot_without_reload(self):
+
+        configuration = config.load()
+        os.utime(TestConfig.mock_dotenv_path, ns = ( 0, configuration.dotenv_mtime + 1000000000 ))
+
+        result = config.refresh(configuration)
+
+        self.assertIs(configuration, result)
+
+    def test_refresh_keeps_snapshot_when_dotenv_unchanged(self):
+
+        os.environ['CONFIGRELOAD'] = 'true'
+        configuration = config.load()
+
+        result = config.refresh(configuration)
+
+        self.assertIs(configuration, result)
+
+    def test_refresh_reloads_when_dotenv_changed(self):
+
+        os.environ['CONFIGRELOAD'] = 'true'
+        configuration = config.load()
+        os.utime(TestConfig.mock_dotenv_path, ns = ( 0, configuration.dotenv_mtime + 1000000000 ))
+
+        result = config.refresh(configuration)
+
+        self.assertIsNot(configuration, result)
+        TestConfig.mock_dotenv_load_dotenv_context.target.load_dotenv.assert_called_with(ANY, override = True)
@@ -0,0 +1,40 @@
+# test_deadline.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+from types import SimpleNamespace
+from unittest import TestCase
+
+from lambdaone import deadline
+
+class TestDeadline(TestCase):
+
+    def setUp(self):
+
+        self.addCleanup(deadline.clear)
+
+    def test_no_deadline_without_context(self):
+
+        deadline.start({})
+
+        self.assertEqual(30, deadline.remaining(30))
+
+    def test_limited_by_remaining_time(self):
+
+        deadline.start(SimpleNamespace(get_remaining_time_in_millis = lambda: 3000))
+
+        result = deadline.remaining(30)
+
+        self.assertTrue(2 < result <= 3 - deadline.RESERVE)
+
+    def test_limit_when_more_time_remains(self):
+
+        deadline.start(SimpleNamespace(get_remaining_time_in_millis = lambda: 900000))
+
+        self.assertEqual(5, deadline.remaining(5))
+
+    def test_no_time_left(self):
+
+        deadline.start(SimpleNamespace(get_remaining_time_in_millis = lambda: 100))
+
+        self.assertLessEqual(deadline.remaining(5), 0)
@@ -0,0 +1,132 @@
+# test_decision_cache.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from lambdaone import decision_cache
+
+class TestDecisionCache(TestCase):
+
+    def setUp(self):
+
+        self.mock_expires = time.time() + (60 * 20)
+        self.mock_decision = ( { 'sub': '1234567890', 'exp': self.mock_expires, 'scopes': [ 'treasure:read' ] }, True )
+
+        decision_cache.configure()
+        self.addCleanup(decision_cache.configure)
+
+    def test_miss_when_source_not_current(self):
+
+        decision_cache.put('token', self.mock_decision, 100, 'k1')
+
+        result = ( decision_cache.get('token', lambda source: source == 'k1'), decision_cache.get('token', lambda source: source == 'k2'), decision_cache.stats()['entries'] )
+
+        self.assertEqual(( self.mock_decision, None, 0 ), result)
+
+    def test_huge_expiration_not_cached(self):
+
+        decision_cache.put('token', ( { 'exp': 10 ** 400 }, True ), 100)
+
+        result = decision_cache.get('token')
+
+        self.assertIsNone(result)
+
+    def test_miss(self):
+
+        result = decision_cache.get('token')
+
+        self.assertIsNone(result)
+
+    def test_hit(self):
+
+        decision_cache.put('token', self.mock_decision, 100)
+
+        result = decision_cache.get('token')
+
+        self.assertEqual(self.mock_decision, result)
+
+    def test_counts_hits_and_misses(self):
+
+        before = decision_cache.stats()
+
+        decision_cache.get('token')
+        decision_cache.put('token', self.mock_decision, 100)
+        decision_cache.get('token')
+
+        after = decision_cache.stats()
+
+        self.assertEqual(( 1, 1 ), ( after['hits'] - before['hits'], after['misses'] - before['misses'] ))
+
+    def test_does_not_keep_token(self):
+
+        decision_cache.put('token', self.mock_decision, 100)
+
+        self.assertNotIn('token', decision_cache._entries)
+
+    def test_not_cached_without_exp(self):
+
+        decision_cache.put('token', ( { 'sub': '1234567890' }, True ), 100)
+
+        result = decision_cache.get('token')
+
+        self.assertIsNone(result)
+
+    def test_not_cached_when_expired(self):
+
+        decision_cache.put('token', ( { 'exp': time.time() - 1 }, True ), 100)
+
+        result = decision_cache.get('token')
+
+        self.assertIsNone(result)
+
+    @patch('time.time')
+    def test_evicted_at_exp(self, mock_time_time):
+
+        mock_time_time.return_value = self.mock_expires - 1
+        decision_cache.put('token', self.mock_decision, 100)
+        mock_time_time.return_value = self.mock_expires
+
+        result = decision_cache.get('token')
+
+        self.assertEqual(( None, 0 ), ( result, decision_cache.stats()['entries'] ))
+
+    def test_evicts_least_recently_used(self):
+
+        decision_cache.configure(max_entries = 2)
+
+        decision_cache.put('first', self.mock_decision, 100)
+        decision_cache.put('second', self.mock_decision, 100)
+        decision_cache.get('first')
+        decision_cache.put('third', self.mock_decision, 100)
+
+        self.assertEqual(( True, False, True ), tuple(decision_cache.get(token) is not None for token in ( 'first', 'second', 'third' )))
+
+    def test_bounded_by_bytes(self):
+
+        decision_cache.configure(max_bytes = 2 * (100 + decision_cache.ENTRY_OVERHEAD))
+
+        for token in ( 'first', 'second', 'third' ):
+
+            decision_cache.put(token, self.mock_decision, 100)
+
+        self.assertEqual(2, decision_cache.stats()['entries'])
+        self.assertLessEqual(decision_cache.stats()['bytes'], 2 * (100 + decision_cache.ENTRY_OVERHEAD))
+
+    def test_disabled_with_zero_entries(self):
+
+        decision_cache.configure(max_entries = 0)
+
+        decision_cache.put('token', self.mock_decision, 100)
+
+        self.assertIsNone(decision_cache.get('token'))
+
+    def test_configure_clears(self):
+
+        decision_cache.put('token', self.mock_decision, 100)
+
+        decision_cache.configure()
+
+        self.assertIsNone(decision_cache.get('token'))
@@ -0,0 +1,101 @@
+# test_events.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import json
+from unittest import TestCase
+
+from lambdaone import events
+
+class TestEvents(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.mock_rest_event = { 'httpMethod': 'GET', 'headers': { 'Authorization': 'Bearer eyJhbGci...' }, 'multiValueHeaders': { 'Authorization': [ 'Bearer eyJhbGci...' ] },
+            'requestContext': { 'stage': 'prod' } }
+        cls.mock_http_event = { 'version': '2.0', 'headers': { 'authorization': 'Bearer eyJhbGci...' }, 'requestContext': { 'domainName': 'abcdef123.execute-api.us-east-1.amazonaws.com', 'http': {} } }
+        cls.mock_function_url_event = { 'version': '2.0', 'headers': { 'authorization': 'Bearer eyJhbGci...' },
+            'requestContext': { 'domainName': 'abcdef123.lambda-url.us-east-1.on.aws', 'http': {} } }
+        cls.mock_alb_event = { 'httpMethod': 'GET', 'headers': { 'authorization': 'Bearer eyJhbGci...' }, 'requestContext': { 'elb': { 'targetGroupArn': 'arn' } } }
+        cls.mock_alb_multi_event = { 'httpMethod': 'GET', 'multiValueHeaders': { 'Authorization': [ 'Bearer eyJhbGci...' ] }, 'requestContext': { 'elb': { 'targetGroupArn': 'arn' } } }
+
+    def test_detect(self):
+
+        result = tuple(events.detect(event) for event in ( TestEvents.mock_rest_event, TestEvents.mock_http_event, TestEvents.mock_function_url_event,
+            TestEvents.mock_alb_event, TestEvents.mock_alb_multi_event, { 'headers': {} } ))
+
+        self.assertEqual(( events.REST, events.HTTP, events.FUNCTION_URL, events.ALB, events.ALB_MULTI, events.OTHER ), result)
+
+    def test_header_any_case(self):
+
+        result = events.header(TestEvents.mock_rest_event, 'authorization')
+
+        self.assertEqual('Bearer eyJhbGci...', result)
+
+    def test_header_multi_value(self):
+
+        result = events.header(TestEvents.mock_alb_multi_event, 'authorization')
+
+        self.assertEqual('Bearer eyJhbGci...', result)
+
+    def test_header_missing(self):
+
+        result = events.header({ 'headers': None }, 'authorization')
+
+        self.assertIsNone(result)
+
+    def test_bearer_token_any_case(self):
+
+        result = events.bearer_token(TestEvents.mock_http_event)
+
+        self.assertEqual('eyJhbGci...', result)
+
+    def test_bearer_token_missing(self):
+
+        result = events.bearer_token({ 'headers': {} })
+
+        self.assertIsNone(result)
+
+    def test_proxy_response(self):
+
+        result = events.response(events.REST, 200, 'Hello')
+
+        self.assertEqual({ 'statusCode': 200, 'body': 'Hello', 'isBase64Encoded': False, 'headers': { 'Content-Type': 'text/plain' } }, result)
+
+    def test_alb_response(self):
+
+        result = events.response(events.ALB, 200, 'Hello')
+
+        self.assertEqual(( '200 OK', { 'Content-Type': 'text/plain' } ), ( result['statusDescription'], result['headers'] ))
+
+    def test_alb_multi_value_response(self):
+
+        result = events.response(events.ALB_MULTI, 200, 'Hello')
+
+        self.assertEqual(( { 'Content-Type': [ 'text/plain' ] }, False ), ( result['multiValueHeaders'], 'headers' in result ))
+
+    def test_other_response_is_bare_body(self):
+
+        result = events.response(events.OTHER, 200, 'Hello')
+
+        self.assertEqual('Hello', result)
+
+    def test_error_response(self):
+
+        result = events.error_response(events.HTTP, events.ACCESS_DENIED)
+
+        self.assertEqual(( 403, json.dumps('Access denied'), 'application/json' ), ( result['statusCode'], result['body'], result['headers']['Content-Type'] ))
+
+    def test_error_response_is_built_once(self):
+
+        first = events.error_response(events.REST, events.BAD_REQUEST)
+        second = events.error_response(events.REST, events.BAD_REQUEST)
+
+        self.assertIs(first, second)
+
+    def test_other_error_response(self):
+
+        result = events.error_response(events.OTHER, events.BAD_CONFIGURATION)
+
+        self.assertEqual({ 'statusCode': 400, 'body': json.dumps('Bad configuration') }, result)
@@ -2,9 +2,13 @@
 # Copyright © 2024 Joel A. Mussman. All rights reserved.
 #
 
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
 import importlib
-import jwt
 import logging
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
 from unittest import TestCase
 from unittest.mock import mock_open, patch
 
@@ -15,18 +19,14 @@ class TestFixedKey(TestCase):
     @classmethod
     def setUpClass(cls):
 
-        cls.mock_key = '-----BEGIN PUBLIC KEY-----MIIBIjA...'
-        cls.mock_path = "public.pem"
+        cls.mock_path = 'test/resources/public.pem'
         cls.mock_algorithm = 'RS256'
-        cls.mock_token = 'token'
-        cls.mock_token_header = { 'alg': 'RS256' }
-       
-        # "Hoist" the mock of jwt get_unverified_header.
+        cls.mock_token = SimpleNamespace(header = {})
+        cls.mod_builtins_open = open
 
-        cls.mod_jwt_get_unverified_header = jwt.get_unverified_header
+        with open(cls.mock_path, 'rb') as fp:
 
-        cls.mock_jwt_get_unverified_header_context = patch('jwt.get_unverified_header')
-        cls.mock_jwt_get_unverified_header_context.start()
+            cls.mock_public_numbers = load_pem_public_key(fp.read()).public_numbers()
 
         # "Hoist" the mock of logging debug and error. The full description of this pattern is in the test_lambdaone/test_jwt_key.py file.
 
@@ -44,14 +44,10 @@ class TestFixedKey(TestCase):
     @classmethod
     def tearDownClass(cls) -> None:
 
-        cls.mock_jwt_get_unverified_header_context.stop()
-
-        jwt.get_unverified_header = cls.mod_jwt_get_unverified_header
-
         cls.mock_logging_debug_context.stop()
         cls.mock_logging_error_context.stop()
 
-        logging.debug = cls.mock_logging_debug_context
+        logging.debug = cls.mod_logging_debug
         logging.error = cls.mod_logging_error
 
         importlib.reload(fixed_key)
@@ -60,36 +56,69 @@ class TestFixedKey(TestCase):
     
     def setUp(self):
 
-        TestFixedKey.mock_jwt_get_unverified_header_context.target.get_unverified_header.reset_mock()
-        TestFixedKey.mock_jwt_get_unverified_header_context.target.get_unverified_header.return_value = { 'alg': TestFixedKey.mock_algorithm }
-        TestFixedKey.mock_jwt_get_unverified_header_context.target.get_unverified_header.side_effect = None
+        # The parsed keys survive across calls, which is the point, so the cache must be emptied before each test.
 
-        TestFixedKey.mock_logging_debug_context.target.error.reset_mock()
-        TestFixedKey.mock_logging_debug_context.target.error.return_value = None
-    
-    @patch('builtins.open')
-    def test_load_key(self, mock_builtins_open):
+        fixed_key.clear()
+
+        # The token arrives parsed, only the header is used.
+
+        TestFixedKey.mock_token.header = { 'alg': TestFixedKey.mock_algorithm }
+
+        TestFixedKey.mock_logging_error_context.target.error.reset_mock()
+        TestFixedKey.mock_logging_error_context.target.error.return_value = None
     
-        mo = mock_open(read_data = TestFixedKey.mock_key)
-        mock_builtins_open.side_effect = mo
+    def test_load_key(self):
 
-        result = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
+        ( key, algorithm ) = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
+
+        self.assertEqual(( TestFixedKey.mock_public_numbers, TestFixedKey.mock_algorithm ), ( key.public_numbers(), algorithm ))
+
+    def test_reuses_parsed_key(self):
 
-        self.assertEqual(( TestFixedKey.mock_key, TestFixedKey.mock_algorithm ), result)
+        first = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)[0]
+        second = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)[0]
+
+        self.assertIs(first, second)
 
     @patch('builtins.open')
-    def test_None_on_open_error(self, mock_builtins_open):
-        
-        mock_builtins_open.side_effect = FileNotFoundError
+    def test_no_file_read_when_cached(self, mock_builtins_open):
 
-        result = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
+        mock_builtins_open.side_effect = self.mod_builtins_open
+        fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
+        mock_builtins_open.side_effect = IOError
+
+        ( key, algorithm ) = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
+
+        self.assertIsNotNone(key)
+
+    def test_reloads_modified_file(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            path = os.path.join(directory, 'public.pem')
+            shutil.copyfile(TestFixedKey.mock_path, path)
+
+            first = fixed_key.load(path, TestFixedKey.mock_token)[0]
+
+            # Force the mtime forward, a copy inside of the same clock tick would not otherwise be seen.
+
+            shutil.copyfile(TestFixedKey.mock_path, path)
+            os.utime(path, ns = ( 0, os.stat(path).st_mtime_ns + 1000000000 ))
+
+            second = fixed_key.load(path, TestFixedKey.mock_token)[0]
+
+        self.assertIsNot(first, second)
+
+    def test_None_on_open_error(self):
+
+        result = fixed_key.load('test/resources/missing.pem', TestFixedKey.mock_token)
 
         self.assertEqual(( None, None ), result)
 
     @patch('builtins.open')
     def test_None_on_read_error(self, mock_builtins_open):
-                
-        mo = mock_open(read_data = TestFixedKey.mock_key)
+
+        mo = mock_open(read_data = b'')
         mo.side_effect = IOError
         mock_builtins_open.side_effect = mo
 
@@ -98,44 +127,40 @@ class TestFixedKey(TestCase):
         self.assertEqual(( None, None), result)
 
     @patch('builtins.open')
-    def test_get_algorithm_with_token(self, mock_builtins_open):
+    def test_None_on_bad_key(self, mock_builtins_open):
 
-        mo = mock_open(read_data = TestFixedKey.mock_key)
+        mo = mock_open(read_data = b'-----BEGIN PUBLIC KEY-----MIIBIjA...')
         mock_builtins_open.side_effect = mo
-        
+
         result = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
 
-        TestFixedKey.mock_jwt_get_unverified_header_context.target.get_unverified_header.assert_called_once_with(TestFixedKey.mock_token)
+        self.assertEqual(( None, None), result)
 
-    @patch('builtins.open')
-    def test_None_on_get_algorithm_error(self, mock_builtins_open):      
+    def test_algorithm_from_header(self):
 
-        TestFixedKey.mock_jwt_get_unverified_header_context.target.get_unverified_header.side_effect = Exception
-        mo = mock_open(read_data = TestFixedKey.mock_key)
-        mock_builtins_open.side_effect = mo
-        
-        result = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
+        TestFixedKey.mock_token.header = { 'alg': 'RS512' }
 
-        self.assertEqual(( None, None ), result)
+        ( key, algorithm ) = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
 
-    @patch('builtins.open')
-    def test_logs_error_on_exception(self, mock_builtins_open):      
+        self.assertEqual('RS512', algorithm)
 
-        TestFixedKey.mock_jwt_get_unverified_header_context.target.get_unverified_header.side_effect = Exception
-        mo = mock_open(read_data = TestFixedKey.mock_key)
-        mock_builtins_open.side_effect = mo
-        
-        result = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
+    def test_logs_error_on_exception(self):
+
+        result = fixed_key.load('test/resources/missing.pem', TestFixedKey.mock_token)
 
         TestFixedKey.mock_logging_error_context.target.error.assert_called_once()
 
-    @patch('builtins.open')
-    def test_get_algorithm_no_algorithm(self, mock_builtins_open):
+    def test_get_algorithm_no_algorithm(self):
+
+        TestFixedKey.mock_token.header = { }
 
-        TestFixedKey.mock_jwt_get_unverified_header_context.target.get_unverified_header.return_value = { }
-        mo = mock_open(read_data = TestFixedKey.mock_key)
-        mock_builtins_open.side_effect = mo
-        
         result = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
 
-        self.assertEqual(( None, None ), result)
\ No newline at end of file
+        self.assertEqual(( None, None ), result)
+
+    def test_preload_caches_key(self):
+
+        preloaded = fixed_key.preload(TestFixedKey.mock_path)
+        ( key, algorithm ) = fixed_key.load(TestFixedKey.mock_path, TestFixedKey.mock_token)
+
+        self.assertIs(preloaded, key)
@@ -0,0 +1,226 @@
+# test_http_pool.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+# These tests run against a stub HTTP server on localhost; the delay before the server answers, and the
+# delay between the bytes of the body, can be set for each test to check the deadline.
+#
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+from unittest import TestCase
+
+from lambdaone import http_pool
+
+class TestHttpPool(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.mock_delay = 0
+        cls.mock_drip = 0
+        cls.mock_connections = set()
+        cls.mock_close = False
+        cls.mock_drop = False
+
+        class StubHandler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+
+                # /redirect/n answers with a chain of n redirects that ends at the key set.
+
+                if self.path.startswith('/redirect/'):
+
+                    self.redirect(int(self.path.rsplit('/', 1)[1]))
+
+                else:
+
+                    self.answer()
+
+            def redirect(self, count):
+
+                self.send_response(302)
+                self.send_header('Location', f'/redirect/{ count - 1 }' if count > 1 else '/jwks.json')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def answer(self):
+
+                TestHttpPool.mock_connections.add(self.client_address)
+                time.sleep(TestHttpPool.mock_delay)
+
+                body = b'{"keys": []}'
+
+                self.send_response(304 if self.headers.get('If-None-Match') == '"v1"' else 200)
+                self.send_header('Content-Length', '0' if self.headers.get('If-None-Match') == '"v1"' else str(len(body)))
+                self.send_header('ETag', '"v1"')
+
+                if TestHttpPool.mock_close:
+
+                    self.send_header('Connection', 'close')
+
+                self.end_headers()
+
+                try:
+
+                    if self.headers.get('If-None-Match') != '"v1"':
+
+                        for offset in range(0, len(body), 1 if TestHttpPool.mock_drip else len(body)):
+
+                            self.wfile.write(body[offset:offset + (1 if TestHttpPool.mock_drip else len(body))])
+                            self.wfile.flush()
+                            time.sleep(TestHttpPool.mock_drip)
+
+                except ( BrokenPipeError, ConnectionResetError ):
+
+                    pass        # The client gave up, e.g. the timeout tests.
+
+                # Drop closes the connection without telling the client, like an idle timeout at the server.
+
+                self.close_connection = self.close_connection or TestHttpPool.mock_drop
+
+            def log_message(self, *args):
+
+                pass
+
+        cls.server = ThreadingHTTPServer(( '127.0.0.1', 0 ), StubHandler)
+        cls.server.daemon_threads = True
+        cls.thread = threading.Thread(target = cls.server.serve_forever, daemon = True)
+        cls.thread.start()
+        cls.mock_url = f'http://127.0.0.1:{ cls.server.server_port }/jwks.json'
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        http_pool.clear()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+        return super().tearDownClass()
+
+    def setUp(self):
+
+        http_pool.clear()
+        TestHttpPool.mock_delay = 0
+        TestHttpPool.mock_drip = 0
+        TestHttpPool.mock_close = False
+        TestHttpPool.mock_drop = False
+        TestHttpPool.mock_connections.clear()
+
+    def deadline(self, seconds):
+
+        return time.monotonic() + seconds
+
+    def test_get(self):
+
+        result = http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(1))
+
+        self.assertEqual(( 200, b'{"keys": []}', '"v1"' ), ( result.status, result.body, result.headers.get('etag') ))
+
+    def test_sends_headers(self):
+
+        result = http_pool.get(TestHttpPool.mock_url, { 'If-None-Match': '"v1"' }, 1, self.deadline(1))
+
+        self.assertEqual(( 304, b'' ), ( result.status, result.body ))
+
+    def test_reuses_connection(self):
+
+        for _ in range(3):
+
+            http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(1))
+
+        self.assertEqual(1, len(TestHttpPool.mock_connections))
+
+    def test_does_not_reuse_closed_connection(self):
+
+        TestHttpPool.mock_close = True
+
+        http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(1))
+        http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(1))
+
+        self.assertEqual(2, len(TestHttpPool.mock_connections))
+
+    def test_reconnects_when_idle_connection_was_dropped(self):
+
+        # Stands in for the server closing the connection while the lambda was frozen.
+
+        TestHttpPool.mock_drop = True
+
+        http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(1))
+        time.sleep(0.05)
+
+        result = http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(1))
+
+        self.assertEqual(( 200, 2 ), ( result.status, len(TestHttpPool.mock_connections) ))
+
+    def test_read_timeout(self):
+
+        TestHttpPool.mock_delay = 0.5
+
+        started = time.monotonic()
+
+        with self.assertRaises(TimeoutError):
+
+            http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(0.1))
+
+        self.assertLess(time.monotonic() - started, 0.4)
+
+    def test_deadline_covers_slow_body(self):
+
+        # One byte every 50 ms: each read is well inside any per-read timeout, the whole body is not.
+
+        TestHttpPool.mock_drip = 0.05
+
+        started = time.monotonic()
+
+        with self.assertRaises(TimeoutError):
+
+            http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(0.3))
+
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_no_request_after_deadline(self):
+
+        with self.assertRaises(TimeoutError):
+
+            http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(0))
+
+        self.assertEqual(0, len(TestHttpPool.mock_connections))
+
+    def test_timed_out_connection_is_not_reused(self):
+
+        TestHttpPool.mock_delay = 0.3
+
+        with self.assertRaises(TimeoutError):
+
+            http_pool.get(TestHttpPool.mock_url, {}, 1, self.deadline(0.1))
+
+        self.assertEqual({}, { origin: connections for ( origin, connections ) in http_pool._idle.items() if connections })
+
+    def test_follows_redirects(self):
+
+        result = http_pool.get(TestHttpPool.mock_url.replace('/jwks.json', '/redirect/2'), {}, 1, self.deadline(1))
+
+        self.assertEqual(( 200, b'{"keys": []}' ), ( result.status, result.body ))
+
+    def test_error_on_too_many_redirects(self):
+
+        with self.assertRaises(OSError):
+
+            http_pool.get(TestHttpPool.mock_url.replace('/jwks.json', f'/redirect/{ http_pool.MAX_REDIRECTS + 1 }'), {}, 1, self.deadline(1))
+
+    def test_redirects_held_to_deadline(self):
+
+        TestHttpPool.mock_delay = 0.2
+
+        with self.assertRaises(TimeoutError):
+
+            http_pool.get(TestHttpPool.mock_url.replace('/jwks.json', '/redirect/1'), {}, 1, self.deadline(0.1))
+
+    def test_rejects_other_schemes(self):
+
+        with self.assertRaises(ValueError):
+
+            http_pool.get('ftp://127.0.0.1/jwks.json', {}, 1, self.deadline(1))
@@ -3,11 +3,17 @@
 #
 
 import importlib
-import jwt
+import json
 import logging
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
+from lambdaone import deadline
 from lambdaone import jwt_key
 
 class TestJwtKey(TestCase):
@@ -18,34 +24,28 @@ class TestJwtKey(TestCase):
         # This stuff should only be done once, and the setUpClass method is the better choice
         # instead of doing it outside the TestCase.
 
-        cls.mock_key = '-----BEGIN PUBLIC KEY-----'
+        cls.mock_kid = '5b889a22-6e44-45f7-8f5e-537db1d9b16e'
         cls.mock_path = 'https://pyrates/jwks'
-        cls.mock_token = 'token'
+        cls.mock_token = SimpleNamespace(header = {})
 
-        # The PyJWKClient class original is in the jwt.jwks_client module, but it is also referenced as a property in the
-        # jwt module. Mocking the class is not a serious problem if the code under test (CUT) references it as either
-        # jwt.PyJWKClient or jwt.jwks_client.PyJWKClient. In that case, simply mock both references and have the
-        # class return an object instance we can control (in this test the method get_signing_key_from_jwt must be mocked).
-        #
-        # The problem arises if the CUT uses "from jwt import PyJWKClient" or "from jwt.jwks_client import PyJWKClient".
-        # When that happens the class reference is copied into jwk_key module as a property. That opens up a third
-        # possible mock: look for the property in the jwt_key module and mock it!
-        #  
-        # The third mocking possibility, and worrying about the import/call form the CUT is using, can be handled by
-        # mocking the first two possibilities and then reloading the jwt_key module so it picks up the new reference.
-        # In this case, the original reference is saved to replace and reload both jwt_key and jwk after completion.
+        with open('test/resources/jwks.json', 'rb') as fp:
 
-        cls.mod_jwt_jwks_client_PyJWKClient = jwt.jwks_client.PyJWKClient
+            cls.mock_jwks = fp.read()
 
-        cls.mock_client = MagicMock()
+        # jwt_key calls http_pool.get through the module reference, so patching the function in the
+        # http_pool module is enough and jwt_key does not have to be reloaded for it. The response is a
+        # mock so the status, headers and body can be changed in each test.
 
-        cls.mock_jwt_jwks_client_PyJWKClient_context = patch('jwt.jwks_client.PyJWKClient', return_value = cls.mock_client)
-        cls.mock_jwt_jwks_client_PyJWKClient_context.start()
+        cls.mock_response = MagicMock()
 
-        cls.mock_jwt_PyJWKClient_context = patch('jwt.PyJWKClient', return_value = cls.mock_client)
-        cls.mock_jwt_PyJWKClient_context.start()
-       
-        # "Hoist" the mock of logging debug and error. The full description of this pattern is in the test_lambdaone/test_jwt_key.py file.
+        cls.mock_http_pool_get_context = patch('lambdaone.http_pool.get', return_value = cls.mock_response)
+        cls.mock_http_pool_get = cls.mock_http_pool_get_context.start()
+
+        # "Hoist" the mock of logging debug and error. jwt_key uses "from logging import debug, error", so the
+        # functions are copied into the jwt_key module as properties when it is imported, and mocking them in the
+        # logging module afterwards changes nothing jwt_key calls. The references in the logging module are
+        # mocked, and then jwt_key is reloaded so it picks up the mocks. The originals are saved to put back and
+        # reload jwt_key again after the tests are complete.
 
         cls.mod_logging_debug = logging.debug
         cls.mod_logging_error = logging.error
@@ -64,13 +64,7 @@ class TestJwtKey(TestCase):
     @classmethod
     def tearDownClass(cls) -> None:
 
-        cls.mock_jwt_jwks_client_PyJWKClient_context.stop()
-        cls.mock_jwt_PyJWKClient_context.stop()
-
-        # As describe above, the original class must be inserted back into the jwt module and
-        # then both modules reloaded for other test fixtures:
-
-        jwt.PyJWKClient = jwt.jwks_client.PyJWKClient = cls.mod_jwt_jwks_client_PyJWKClient
+        cls.mock_http_pool_get_context.stop()
 
         # Put back the logging error.
 
@@ -80,7 +74,6 @@ class TestJwtKey(TestCase):
         logging.debug = cls.mod_logging_debug
         logging.error = cls.mod_logging_error
 
-        importlib.reload(jwt)
         importlib.reload(jwt_key)
 
         return super().tearDownClass()
@@ -89,119 +82,662 @@ class TestJwtKey(TestCase):
 
         self.mock_algorithm = 'RS256'
 
-        # The "instantiated" object created by PyJWKClient must be reset
-        # and the return_value and side_effect reinitalized after each test,
-        # because changes could be made in any test.
+        # The key cache survives across calls, which is the point, so it must be emptied before each test.
+
+        jwt_key.clear()
+
+        # The key set is saved to a file, each test gets its own folder so nothing carries over.
 
-        TestJwtKey.mock_client.reset_mock()
-        TestJwtKey.mock_client.get_signing_key_from_jwt.return_value = TestJwtKey.mock_key
-        TestJwtKey.mock_client.get_signing_key_from_jwt.side_effect = None
+        directory = tempfile.TemporaryDirectory()
+        self.mock_cache_dir = directory.name
+        self.addCleanup(directory.cleanup)
+        jwt_key.configure(cache_dir = self.mock_cache_dir)
 
-        # The two Class mocks for PyJWKClient must be reset and the return_value
-        # and side_effect reinitialized after each test.
+        # The return_value and side_effect are reinitalized after each test, because changes could be made in any test.
 
-        TestJwtKey.mock_jwt_jwks_client_PyJWKClient_context.target.PyJWKClient.reset_mock()
-        TestJwtKey.mock_jwt_jwks_client_PyJWKClient_context.target.PyJWKClient.return_value = TestJwtKey.mock_client
-        TestJwtKey.mock_jwt_jwks_client_PyJWKClient_context.target.PyJWKClient.side_effect = None
+        TestJwtKey.mock_response.reset_mock()
+        TestJwtKey.mock_response.status = 200
+        TestJwtKey.mock_response.body = TestJwtKey.mock_jwks
+        TestJwtKey.mock_response.headers.get.return_value = None
+        TestJwtKey.mock_response.headers.get.side_effect = None
 
-        TestJwtKey.mock_jwt_PyJWKClient_context.target.PyJWKClient.reset_mock()
-        TestJwtKey.mock_jwt_PyJWKClient_context.target.PyJWKClient.return_value = TestJwtKey.mock_client
-        TestJwtKey.mock_jwt_PyJWKClient_context.target.PyJWKClient.side_effect = None
+        TestJwtKey.mock_http_pool_get.reset_mock()
+        TestJwtKey.mock_http_pool_get.return_value = TestJwtKey.mock_response
+        TestJwtKey.mock_http_pool_get.side_effect = None
 
-        # Mock jwt.get_unverified_header; this is a fixed function so it will be OK here.
+        # The token arrives parsed, only the header is used.
 
-        self.mock_jwt_get_unverified_header_context = patch('jwt.get_unverified_header')
-        self.mock_jwt_get_unverified_header_context.start()
-        self.mock_jwt_get_unverified_header_context.target.get_unverified_header.return_value = { 'alg': self.mock_algorithm }
-        self.mock_jwt_get_unverified_header_context.target.get_unverified_header.side_effect = None
-        self.addCleanup(self.mock_jwt_get_unverified_header_context.stop)
+        TestJwtKey.mock_token.header = { 'alg': self.mock_algorithm, 'kid': TestJwtKey.mock_kid }
 
         # Mock the error function.
 
-        TestJwtKey.mock_logging_debug_context.target.error.reset_mock()
-        TestJwtKey.mock_logging_debug_context.target.error.return_value = None
+        TestJwtKey.mock_logging_error_context.target.error.reset_mock()
+        TestJwtKey.mock_logging_error_context.target.error.return_value = None
 
     def test_load_key(self):
 
+        ( key, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(( TestJwtKey.mock_kid, self.mock_algorithm ), ( key.key_id, algorithm ))
+
+    def test_fetches_with_path(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        url = TestJwtKey.mock_http_pool_get.call_args.args[0]
+
+        self.assertEqual(TestJwtKey.mock_path, url)
+
+    def test_reuses_cached_key_set(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_http_pool_get.assert_called_once()
+
+    def test_caches_key_set_per_path(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.load('https://pyrates/other', TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_drops_path_used_least_recently(self):
+
+        jwt_key.configure(max_issuers = 2, persist = False, cache_dir = self.mock_cache_dir)
+
+        for path in ( 'https://pyrates/jwks', 'https://corsairs/jwks', 'https://pyrates/jwks', 'https://buccaneers/jwks' ):
+
+            jwt_key.load(path, TestJwtKey.mock_token)
+
+        self.assertEqual([ 'https://pyrates/jwks', 'https://buccaneers/jwks' ], list(jwt_key._cache))
+
+    def test_discovery_does_not_count_against_key_sets(self):
+
+        jwt_key.configure(max_issuers = 2, persist = False, cache_dir = self.mock_cache_dir)
+
+        def get(url, *args):
+
+            issuer = url.removesuffix('/.well-known/openid-configuration')
+            document = MagicMock(status = 200, body = json.dumps({ 'issuer': issuer, 'jwks_uri': f'{ issuer }/jwks' }).encode())
+            document.headers.get.return_value = None
+
+            return document if url.endswith('/openid-configuration') else TestJwtKey.mock_response
+
+        TestJwtKey.mock_http_pool_get.side_effect = get
+
+        for issuer in ( 'https://pyrates', 'https://corsairs', 'https://pyrates' ):
+
+            jwt_key.load(f'{ issuer }/.well-known/openid-configuration', TestJwtKey.mock_token)
+
+        self.assertEqual(( 4, 4 ), ( len(jwt_key._cache), TestJwtKey.mock_http_pool_get.call_count ))
+
+    def test_outage_for_one_path_keeps_others(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_http_pool_get.side_effect = Exception
+
+        ( other, algorithm ) = jwt_key.load('https://corsairs/jwks', TestJwtKey.mock_token)
+        ( key, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(( None, TestJwtKey.mock_kid ), ( other, key.key_id ))
+
+    def discovery(self, issuer = 'https://pyrates'):
+
+        # The discovery document and the key set are served from their own URLs.
+
+        document = MagicMock(status = 200, body = json.dumps({ 'issuer': issuer, 'jwks_uri': TestJwtKey.mock_path }).encode())
+        document.headers.get.return_value = None
+
+        TestJwtKey.mock_http_pool_get.side_effect = lambda url, *args: document if url.endswith('/openid-configuration') else TestJwtKey.mock_response
+
+        return 'https://pyrates/.well-known/openid-configuration'
+
+    def test_discovery_finds_jwks_uri(self):
+
+        ( key, algorithm ) = jwt_key.load(self.discovery(), TestJwtKey.mock_token)
+
+        self.assertEqual(( TestJwtKey.mock_kid, [ 'https://pyrates/.well-known/openid-configuration', TestJwtKey.mock_path ] ),
+            ( key.key_id, [ call.args[0] for call in TestJwtKey.mock_http_pool_get.call_args_list ] ))
+
+    def test_discovery_is_cached(self):
+
+        path = self.discovery()
+
+        jwt_key.load(path, TestJwtKey.mock_token)
+        jwt_key.load(path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_new_runtime_uses_saved_discovery(self):
+
+        path = self.discovery()
+
+        jwt_key.load(path, TestJwtKey.mock_token)
+        jwt_key.clear()
+        jwt_key.load(path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_None_on_discovery_for_other_issuer(self):
+
+        result = jwt_key.load(self.discovery('https://corsairs'), TestJwtKey.mock_token)
+
+        self.assertEqual(( None, None ), result)
+
+    def test_prefetch_through_discovery(self):
+
+        result = jwt_key.prefetch(self.discovery())
+
+        self.assertIn(TestJwtKey.mock_kid, result)
+
+    def test_current_key(self):
+
+        ( key, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(( True, False ), ( jwt_key.current(TestJwtKey.mock_path, TestJwtKey.mock_kid, key), jwt_key.current(TestJwtKey.mock_path, 'other', key) ))
+
+    def test_key_not_current_after_rotation(self):
+
+        jwt_key.configure(ttl = 0, stale = 0, cache_dir = self.mock_cache_dir)
+
+        ( key, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_response.body = b'{ "keys": [] }'
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertFalse(jwt_key.current(TestJwtKey.mock_path, TestJwtKey.mock_kid, key))
+
+    def test_refetches_expired_key_set(self):
+
+        jwt_key.configure(ttl = 0, cache_dir = self.mock_cache_dir)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_honors_cache_control_max_age(self):
+
+        TestJwtKey.mock_response.headers.get.return_value = 'public, max-age=0'
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_ttl_bounds_cache_control_max_age(self):
+
+        jwt_key.configure(ttl = 0, cache_dir = self.mock_cache_dir)
+        TestJwtKey.mock_response.headers.get.return_value = 'max-age=86400'
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_refetches_on_unknown_kid(self):
+
+        jwt_key.configure(refetch = 0, cache_dir = self.mock_cache_dir)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_token.header = { 'alg': self.mock_algorithm, 'kid': 'rotated' }
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_does_not_refetch_unknown_kid_too_soon(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_token.header = { 'alg': self.mock_algorithm, 'kid': 'rotated' }
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_http_pool_get.assert_called_once()
+
+    def test_does_not_refetch_unknown_kid_too_soon_after_failure(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        # The key set is older than JWKSREFETCH, so one unknown kid may refetch it, but the IdP is down.
+
+        entry = jwt_key._cache[TestJwtKey.mock_path]
+        jwt_key._cache[TestJwtKey.mock_path] = { **entry, 'fetched': entry['fetched'] - 60, 'attempted': entry['attempted'] - 60 }
+        TestJwtKey.mock_response.status = 503
+
+        for kid in range(20):
+
+            TestJwtKey.mock_token.header = { 'alg': self.mock_algorithm, 'kid': f'forged-{ kid }' }
+            jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_serves_stale_key_set_when_refresh_fails(self):
+
+        jwt_key.configure(ttl = 0, cache_dir = self.mock_cache_dir)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_http_pool_get.side_effect = Exception
+
+        ( key, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(TestJwtKey.mock_kid, key.key_id)
+
+    def test_does_not_retry_failed_refresh_too_soon(self):
+
+        jwt_key.configure(ttl = 0, cache_dir = self.mock_cache_dir)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_http_pool_get.side_effect = Exception
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_None_when_stale_key_set_is_too_old(self):
+
+        jwt_key.configure(ttl = 0, stale = 0, cache_dir = self.mock_cache_dir)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_http_pool_get.side_effect = Exception
+
         result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
-        self.assertEqual(( TestJwtKey.mock_key, self.mock_algorithm), result)
+        self.assertEqual(( None, None ), result)
+
+    def test_serves_stale_key_set_during_refresh(self):
 
-    def test_client_initialized_with_path(self):
+        jwt_key.configure(ttl = 0, cache_dir = self.mock_cache_dir)
 
         jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
-        # This is a tricky example: one of two different Class definitions could be used, the one
-        # in jwt (more likely) or the one in jwt.jwks_client where it originates. Both must be
-        # checked to make sure at least one was called with the correct argument.
+        # Holding the lock stands in for another caller with a fetch in flight.
 
-        if TestJwtKey.mock_jwt_jwks_client_PyJWKClient_context.target.PyJWKClient.call_count > 0:
+        with jwt_key._locks[TestJwtKey.mock_path]:
 
-            TestJwtKey.mock_jwt_jwks_client_PyJWKClient_context.target.PyJWKClient.assert_called_once_with(TestJwtKey.mock_path)
+            ( key, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
-        elif TestJwtKey.mock_jwt_PyJWKClient_context.target.PyJWKClient.call_count > 0:
-            
-            TestJwtKey.mock_jwt_PyJWKClient_context.target.PyJWKClient.assert_called_once_with(TestJwtKey.mock_path)
+        self.assertEqual(( TestJwtKey.mock_kid, 1 ), ( key.key_id, TestJwtKey.mock_http_pool_get.call_count ))
 
-        else:
+    def test_single_fetch_for_concurrent_callers(self):
 
-            self.assertTrue(False)
+        def slow_get(*args, **kwargs):
 
-    def test_get_signing_key_with_token(self):
+            time.sleep(0.05)
+
+            return TestJwtKey.mock_response
+
+        TestJwtKey.mock_http_pool_get.side_effect = slow_get
+
+        results = []
+        threads = [ threading.Thread(target = lambda: results.append(jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token))) for i in range(8) ]
+
+        for thread in threads:
+
+            thread.start()
+
+        for thread in threads:
+
+            thread.join()
+
+        self.assertEqual(( 1, 8 ), ( TestJwtKey.mock_http_pool_get.call_count, sum(1 for ( key, algorithm ) in results if key is not None) ))
+
+    def test_None_on_unknown_kid(self):
+
+        TestJwtKey.mock_token.header = { 'alg': self.mock_algorithm, 'kid': 'rotated' }
 
         result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
-        TestJwtKey.mock_client.get_signing_key_from_jwt.assert_called_once_with(TestJwtKey.mock_token)
+        self.assertEqual(( None, None ), result)
+
+    def test_algorithm_from_header(self):
+
+        TestJwtKey.mock_token.header = { 'alg': 'RS512', 'kid': TestJwtKey.mock_kid }
+
+        ( key, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual('RS512', algorithm)
+
+    def test_None_on_bad_document(self):
+
+        TestJwtKey.mock_response.body = b'not a JWKS'
 
-    def test_get_algorithm_with_token(self):
-        
         result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
-        self.mock_jwt_get_unverified_header_context.target.get_unverified_header.assert_called_once_with(TestJwtKey.mock_token)
+        self.assertEqual(( None, None ), result)
 
-    def test_None_on_read_error(self):
+    def test_None_on_http_error(self):
 
-        TestJwtKey.mock_client.get_signing_key_from_jwt.side_effect = Exception
+        TestJwtKey.mock_response.status = 500
 
         result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
         self.assertEqual(( None, None ), result)
 
-    def test_None_on_get_algorithm_error(self):
-        
-        self.mock_jwt_get_unverified_header_context.target.get_unverified_header.side_effect = Exception
+    def test_None_on_open_error(self):
+
+        TestJwtKey.mock_http_pool_get.side_effect = Exception
 
         result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
         self.assertEqual(( None, None ), result)
 
     def test_logs_error_on_exception(self):
-        
-        self.mock_jwt_get_unverified_header_context.target.get_unverified_header.side_effect = Exception
+
+        TestJwtKey.mock_http_pool_get.side_effect = Exception
 
         result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
         TestJwtKey.mock_logging_error_context.target.error.assert_called_once()
 
     def test_None_on_get_algorithm_no_algorithm(self):
-        
-        self.mock_jwt_get_unverified_header_context.target.get_unverified_header.return_value = { 'xyz': self.mock_algorithm }
+
+        TestJwtKey.mock_token.header = { 'xyz': self.mock_algorithm, 'kid': TestJwtKey.mock_kid }
 
         result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
         self.assertEqual(( None, None ), result)
 
-    # This is a test we would like to have, but impossible to implement given the circumstances.
-    # The side_effect in the mocks becomes a list iterator, so reassigning it is a no-op. And
-    # because the CUT may not be able to see us change a mock (the "from jwt import PyJWKClient"
-    # problem) there just isn't any way to force the exception to happen.
+    def test_prefetch_returns_keys(self):
 
-    def test_None_on_open_error(self):
+        result = jwt_key.prefetch(TestJwtKey.mock_path)
+
+        self.assertIn(TestJwtKey.mock_kid, result)
+
+    def test_prefetch_uses_current_key_set(self):
+
+        jwt_key.prefetch(TestJwtKey.mock_path)
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_http_pool_get.assert_called_once()
+
+    def validators(self):
+
+        TestJwtKey.mock_response.headers.get.side_effect = { 'ETag': '"v1"', 'Last-Modified': 'Wed, 21 Oct 2026 07:28:00 GMT' }.get
+
+    def not_modified(self):
+
+        return SimpleNamespace(status = 304, headers = None, body = b'')
+
+    def test_saves_key_set(self):
+
+        self.validators()
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        with open(os.path.join(self.mock_cache_dir, os.listdir(self.mock_cache_dir)[0])) as fp:
+
+            snapshot = json.load(fp)
+
+        self.assertEqual(( jwt_key.SNAPSHOT_VERSION, TestJwtKey.mock_path, '"v1"', json.loads(TestJwtKey.mock_jwks) ),
+            ( snapshot['version'], snapshot['path'], snapshot['etag'], snapshot['jwks'] ))
 
-        TestJwtKey.mock_jwt_PyJWKClient_context.target.PyJWKClient.side_effect = Exception
-        TestJwtKey.mock_jwt_jwks_client_PyJWKClient_context.target.PyJWKClient.side_effect = Exception
+    def test_new_runtime_uses_saved_key_set(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.clear()
+
+        ( key, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(( TestJwtKey.mock_kid, 1 ), ( key.key_id, TestJwtKey.mock_http_pool_get.call_count ))
+
+    def test_ignores_saved_key_set_when_turned_off(self):
+
+        jwt_key.configure(persist = False, cache_dir = self.mock_cache_dir)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.clear()
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(( 2, [] ), ( TestJwtKey.mock_http_pool_get.call_count, os.listdir(self.mock_cache_dir) ))
+
+    def test_ignores_other_snapshot_version(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.clear()
+
+        path = os.path.join(self.mock_cache_dir, os.listdir(self.mock_cache_dir)[0])
+
+        with open(path) as fp:
+
+            snapshot = json.load(fp)
+
+        with open(path, 'w') as fp:
+
+            json.dump({ **snapshot, 'version': 0 }, fp)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
+
+    def test_ignores_corrupt_snapshot(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.clear()
+
+        with open(os.path.join(self.mock_cache_dir, os.listdir(self.mock_cache_dir)[0]), 'w') as fp:
+
+            fp.write('{ "version": 1, "pa')
+
+        ( key, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(( TestJwtKey.mock_kid, 2 ), ( key.key_id, TestJwtKey.mock_http_pool_get.call_count ))
+
+    def test_revalidates_with_validators(self):
+
+        jwt_key.configure(ttl = 0, cache_dir = self.mock_cache_dir)
+        self.validators()
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        headers = TestJwtKey.mock_http_pool_get.call_args.args[1]
+
+        self.assertEqual(( '"v1"', 'Wed, 21 Oct 2026 07:28:00 GMT' ), ( headers['If-None-Match'], headers['If-Modified-Since'] ))
+
+    def test_not_modified_keeps_keys(self):
+
+        jwt_key.configure(ttl = 0, cache_dir = self.mock_cache_dir)
+        self.validators()
+
+        ( first, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        TestJwtKey.mock_http_pool_get.return_value = self.not_modified()
+
+        ( second, algorithm ) = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertIs(first, second)
+
+    def test_not_modified_without_cached_set_fails(self):
+
+        TestJwtKey.mock_http_pool_get.return_value = self.not_modified()
 
         result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
 
-        # self.assertEqual(( None, None ), result)    # This is what we are looking for.  
-        self.assertEqual(( None, None ), result)  # This is what we get.
\ No newline at end of file
+        self.assertEqual(( None, None ), result)
+
+    def test_timeouts_from_deadline(self):
+
+        deadline.start(SimpleNamespace(get_remaining_time_in_millis = lambda: 2500))
+        self.addCleanup(deadline.clear)
+
+        started = time.monotonic()
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        expires = TestJwtKey.mock_http_pool_get.call_args.args[3]
+
+        self.assertLessEqual(expires - started, 2)
+
+    def test_no_fetch_without_time_left(self):
+
+        deadline.start(SimpleNamespace(get_remaining_time_in_millis = lambda: 100))
+        self.addCleanup(deadline.clear)
+
+        result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(( None, None, False ), ( *result, TestJwtKey.mock_http_pool_get.called ))
+
+    def fetch_in_flight(self):
+
+        # Another thread (e.g. the refresher) holds the lock of the path for a slow fetch.
+
+        lock = jwt_key._locks.setdefault(TestJwtKey.mock_path, threading.Lock())
+        lock.acquire()
+        self.addCleanup(lock.release)
+
+    def test_wait_for_fetch_in_flight_held_to_deadline(self):
+
+        self.fetch_in_flight()
+        deadline.start(SimpleNamespace(get_remaining_time_in_millis = lambda: 1000))
+        self.addCleanup(deadline.clear)
+
+        started = time.monotonic()
+        result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(( None, None, False, True ), ( *result, TestJwtKey.mock_http_pool_get.called, time.monotonic() - started < 1 ))
+
+    def test_unknown_kid_uses_cached_key_set_when_wait_times_out(self):
+
+        jwt_key.configure(refetch = 0, cache_dir = self.mock_cache_dir)
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.fetch_in_flight()
+        deadline.start(SimpleNamespace(get_remaining_time_in_millis = lambda: 1000))
+        self.addCleanup(deadline.clear)
+        TestJwtKey.mock_token.header = { 'alg': self.mock_algorithm, 'kid': 'rotated' }
+
+        started = time.monotonic()
+        result = jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(( None, None, 1, True ), ( *result, TestJwtKey.mock_http_pool_get.call_count, time.monotonic() - started < 1 ))
+
+    def background(self, **settings):
+
+        jwt_key.configure(background = True, cache_dir = self.mock_cache_dir, **settings)
+        self.addCleanup(self.stop_refreshers)
+
+    def stop_refreshers(self):
+
+        # The threads are joined so none of them is still writing the key set when the folder is removed.
+
+        threads = [ thread for ( thread, wake, stop ) in jwt_key._refreshers.values() ]
+
+        jwt_key.clear()
+
+        for thread in threads:
+
+            thread.join(2)
+
+    def wait_for_fetches(self, count, timeout = 2):
+
+        limit = time.monotonic() + timeout
+
+        while TestJwtKey.mock_http_pool_get.call_count < count and time.monotonic() < limit:
+
+            time.sleep(0.01)
+
+        return TestJwtKey.mock_http_pool_get.call_count
+
+    def test_background_refresh_ahead_of_expiry(self):
+
+        self.background(ttl = 1, refresh_ahead = 1, refetch = 0)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertGreaterEqual(self.wait_for_fetches(2), 2)
+
+    def test_background_refresh_swaps_entry(self):
+
+        self.background(ttl = 1, refresh_ahead = 1, refetch = 0)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        first = jwt_key._cache[TestJwtKey.mock_path]
+
+        self.wait_for_fetches(2)
+
+        self.assertIsNot(first, jwt_key._cache[TestJwtKey.mock_path])
+
+    def test_no_background_refresh_by_default(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual({}, jwt_key._refreshers)
+
+    def test_clear_stops_refresher(self):
+
+        self.background()
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        ( thread, wake, stop ) = jwt_key._refreshers[TestJwtKey.mock_path]
+
+        jwt_key.clear()
+        thread.join(1)
+
+        self.assertFalse(thread.is_alive())
+
+    def test_dropped_path_stops_refresher(self):
+
+        self.background(max_issuers = 1)
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        ( thread, wake, stop ) = jwt_key._refreshers[TestJwtKey.mock_path]
+
+        jwt_key.load('https://corsairs/jwks', TestJwtKey.mock_token)
+        thread.join(1)
+
+        self.assertEqual(( False, [ 'https://corsairs/jwks' ] ), ( thread.is_alive(), list(jwt_key._cache) ))
+
+    def test_refresh_delay_ahead_of_expiry(self):
+
+        now = time.monotonic()
+
+        result = jwt_key._refresh_delay({ 'fetched': now, 'expires': now + 300 }, 0)
+
+        self.assertAlmostEqual(300 - jwt_key.DEFAULT_REFRESH_AHEAD, result, delta = 1)
+
+    def test_refresh_delay_not_sooner_than_refetch(self):
+
+        now = time.monotonic()
+
+        result = jwt_key._refresh_delay({ 'fetched': now, 'expires': now }, 0)
+
+        self.assertAlmostEqual(jwt_key.DEFAULT_REFETCH, result, delta = 1)
+
+    def test_refresh_delay_backs_off(self):
+
+        result = [ jwt_key._refresh_delay(None, failures) for failures in ( 1, 2, 3, 10 ) ]
+
+        self.assertEqual([ 1, 2, 4, jwt_key.BACKOFF_MAX ], result)
+
+    def test_thaw_ages_cached_key_set(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+        expires = jwt_key._cache[TestJwtKey.mock_path]['expires']
+
+        # The wall clock moved 100 seconds more than the monotonic clock: the environment was frozen.
+
+        jwt_key._clock['wall'] -= 100
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertAlmostEqual(expires - 100, jwt_key._cache[TestJwtKey.mock_path]['expires'], delta = 1)
+
+    def test_thaw_refreshes_expired_key_set(self):
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        jwt_key._clock['wall'] -= jwt_key.DEFAULT_TTL + 1
+
+        jwt_key.load(TestJwtKey.mock_path, TestJwtKey.mock_token)
+
+        self.assertEqual(2, TestJwtKey.mock_http_pool_get.call_count)
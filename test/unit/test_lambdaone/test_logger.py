@@ -61,6 +61,7 @@ class TestLogger(TestCase):
         TestLogger.mock_getLogger_context.target.getLogger.reset_mock()
         TestLogger.mock_getLogger_context.target.getLogger.return_value = TestLogger.mock_getLogger
         TestLogger.mock_getLogger.setLevel.side_effect = None
+        TestLogger.mock_getLogger.handlers = []
 
         TestLogger.mock_StreamHandler_context.target.StreamHandler.reset_mock()
         TestLogger.mock_StreamHandler_context.target.StreamHandler.return_value = TestLogger.mock_StreamHandler
@@ -112,4 +113,32 @@ class TestLogger(TestCase):
         TestLogger.mock_getLogger.setLevel.side_effect = ValueError
         logger.initialize('BADLEVEL')
 
-        TestLogger.mock_StreamHandler.setLevel.assert_called_once_with(logging.NOTSET)
\ No newline at end of file
+        TestLogger.mock_StreamHandler.setLevel.assert_called_once_with(logging.NOTSET)
+
+    def test_reuses_existing_handler(self):
+
+        existing = MagicMock()
+        existing.get_name.return_value = logger.HANDLER_NAME
+        TestLogger.mock_getLogger.handlers = [ existing ]
+        self.addCleanup(setattr, TestLogger.mock_getLogger, 'handlers', [])
+
+        logger.initialize(logging.DEBUG)
+
+        TestLogger.mock_StreamHandler_context.target.StreamHandler.assert_not_called()
+
+    def test_updates_existing_handler_level(self):
+
+        existing = MagicMock()
+        existing.get_name.return_value = logger.HANDLER_NAME
+        TestLogger.mock_getLogger.handlers = [ existing ]
+        self.addCleanup(setattr, TestLogger.mock_getLogger, 'handlers', [])
+
+        logger.initialize(logging.INFO)
+
+        existing.setLevel.assert_called_once_with(logging.INFO)
+
+    def test_names_handler(self):
+
+        logger.initialize(logging.DEBUG)
+
+        TestLogger.mock_StreamHandler.set_name.assert_called_once_with(logger.HANDLER_NAME)
@@ -0,0 +1,81 @@
+# test_metrics.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import importlib
+import io
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+from lambdaone import metrics
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+
+        importlib.reload(metrics)
+        self.addCleanup(importlib.reload, metrics)
+
+        context = patch('sys.stdout', new_callable = io.StringIO)
+        self.mock_stdout = context.start()
+        self.addCleanup(context.stop)
+
+    def lines(self):
+
+        return [ json.loads(line) for line in self.mock_stdout.getvalue().splitlines() ]
+
+    def test_disabled_is_silent(self):
+
+        started = metrics.start()
+        metrics.stop('Verify', started)
+        metrics.count('DecisionCacheHit')
+        metrics.end()
+
+        self.assertEqual(( None, '' ), ( started, self.mock_stdout.getvalue() ))
+
+    def test_emits_emf(self):
+
+        metrics.configure(True, 'Treasure')
+
+        metrics.stop('Verify', metrics.start())
+        metrics.count('DecisionCacheMiss')
+        metrics.end()
+
+        result = self.lines()[0]
+        definition = result['_aws']['CloudWatchMetrics'][0]
+
+        self.assertEqual(( 'Treasure', [ [ 'FunctionName' ] ], { 'Name': 'Verify', 'Unit': 'Milliseconds' }, 1, 1, 1 ),
+            ( definition['Namespace'], definition['Dimensions'], definition['Metrics'][0], len(result['Verify']), result['DecisionCacheMiss'], result['Invocations'] ))
+
+    def test_cold_start_only_first(self):
+
+        metrics.configure(True)
+
+        metrics.end()
+        metrics.end()
+
+        self.assertEqual([ 1, 0 ], [ line['ColdStart'] for line in self.lines() ])
+
+    def test_aggregates_batch(self):
+
+        metrics.configure(True, batch = 2)
+
+        metrics.stop('Handler', metrics.start())
+        metrics.end()
+
+        first = self.mock_stdout.getvalue()
+
+        metrics.stop('Handler', metrics.start())
+        metrics.end()
+
+        self.assertEqual(( '', 2, 2 ), ( first, len(self.lines()[0]['Handler']), self.lines()[0]['Invocations'] ))
+
+    def test_configure_flushes(self):
+
+        metrics.configure(True, batch = 10)
+        metrics.count('DecisionCacheHit')
+
+        metrics.configure(False)
+
+        self.assertEqual(1, self.lines()[0]['DecisionCacheHit'])
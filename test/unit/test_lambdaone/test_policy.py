@@ -0,0 +1,50 @@
+# test_policy.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+from unittest import TestCase
+
+from lambdaone import policy
+
+class TestPolicy(TestCase):
+
+    def setUp(self):
+
+        self.mock_method_arn = 'arn:aws:execute-api:us-east-1:123456789012:abcdef123/prod/GET/treasure/chest'
+
+    def test_build(self):
+
+        result = policy.build('1234567890', policy.ALLOW, self.mock_method_arn, { 'scope': 'treasure:read' })
+
+        self.assertEqual({
+            'principalId': '1234567890',
+            'policyDocument': {
+                'Version': '2012-10-17',
+                'Statement': [ { 'Action': 'execute-api:Invoke', 'Effect': 'Allow', 'Resource': 'arn:aws:execute-api:us-east-1:123456789012:abcdef123/prod/*' } ]
+            },
+            'context': { 'scope': 'treasure:read' }
+        }, result)
+
+    def test_wildcard_arn_for_root_resource(self):
+
+        result = policy.wildcard_arn('arn:aws:execute-api:us-east-1:123456789012:abcdef123/prod/GET/')
+
+        self.assertEqual('arn:aws:execute-api:us-east-1:123456789012:abcdef123/prod/*', result)
+
+    def test_wildcard_arn_keeps_unexpected_arn(self):
+
+        result = policy.wildcard_arn('arn:aws:execute-api:us-east-1:123456789012:abcdef123')
+
+        self.assertEqual('arn:aws:execute-api:us-east-1:123456789012:abcdef123', result)
+
+    def test_context_flattens_scopes(self):
+
+        result = policy.context({ 'sub': '1234567890' }, frozenset([ 'treasure:write', 'treasure:read' ]))
+
+        self.assertEqual({ 'scope': 'treasure:read treasure:write', 'sub': '1234567890' }, result)
+
+    def test_context_skips_structured_claims(self):
+
+        result = policy.context({ 'sub': '1234567890', 'client_id': { 'nested': True } }, frozenset())
+
+        self.assertNotIn('client_id', result)
@@ -0,0 +1,193 @@
+# test_precheck.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import importlib
+import jwt
+import logging
+import time
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from lambdaone import precheck
+from lambdaone import registry
+from lambdaone import scopes
+
+class TestPrecheck(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        now = time.time()
+
+        cls.mock_configuration = SimpleNamespace(audience = 'https://treasure', issuer = 'https://pyrates', algorithms = frozenset([ 'RS256' ]), max_token_length = 8192,
+            issuers = {})
+        cls.mock_token_payload = { 'aud': 'https://treasure', 'iss': 'https://pyrates', 'sub': '1234567890', 'exp': int(now) + 1200, 'scopes': [ 'treasure:read' ]}
+
+        with open('test/resources/private.pem', 'r') as fp:
+
+            cls.mock_private_key = fp.read()
+
+        # "Hoist" the mock of logging debug. The full description of this pattern is in the test_lambdaone/test_jwt_key.py file.
+
+        cls.mod_logging_debug = logging.debug
+
+        cls.mock_logging_debug_context = patch('logging.debug', return_value = None)
+        cls.mock_logging_debug_context.start()
+
+        importlib.reload(precheck)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+
+        cls.mock_logging_debug_context.stop()
+
+        logging.debug = cls.mod_logging_debug
+
+        importlib.reload(precheck)
+
+        return super().tearDownClass()
+
+    def setUp(self):
+
+        TestPrecheck.mock_logging_debug_context.target.debug.reset_mock()
+
+    def token(self, algorithm = 'RS256', **claims):
+
+        payload = { **TestPrecheck.mock_token_payload, **claims }
+        key = TestPrecheck.mock_private_key if algorithm.startswith('RS') else 'a-secret-that-is-long-enough-for-hmac-sha256'
+
+        return jwt.encode(payload, key, algorithm = algorithm)
+
+    def test_accepts_valid_token(self):
+
+        token = self.token()
+
+        result = precheck.screen(token, TestPrecheck.mock_configuration)
+
+        self.assertEqual(token, result.raw)
+
+    def test_rejects_too_long(self):
+
+        token = self.token(padding = 'x' * 9000)
+
+        result = precheck.screen(token, TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    @patch('lambdaone.access_token.parse')
+    def test_does_not_parse_bad_format(self, mock_access_token_parse):
+
+        result = precheck.screen('eyJhbGci...', TestPrecheck.mock_configuration)
+
+        mock_access_token_parse.assert_not_called()
+
+    def test_rejects_two_segments(self):
+
+        result = precheck.screen(self.token().rsplit('.', 1)[0], TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_empty_signature(self):
+
+        result = precheck.screen(self.token().rsplit('.', 1)[0] + '.', TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_not_base64url(self):
+
+        result = precheck.screen(self.token().replace('.', '.+', 1), TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_algorithm_not_allowed(self):
+
+        result = precheck.screen(self.token(algorithm = 'HS256'), TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_expired(self):
+
+        result = precheck.screen(self.token(exp = int(time.time()) - 60), TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_malformed_expiration(self):
+
+        result = precheck.screen(self.token(exp = 'tomorrow'), TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_huge_expiration(self):
+
+        result = precheck.screen(self.token(exp = 10 ** 400), TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_huge_not_before(self):
+
+        result = precheck.screen(self.token(nbf = 10 ** 400), TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_not_yet_valid(self):
+
+        result = precheck.screen(self.token(nbf = int(time.time()) + 60), TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_unexpected_issuer(self):
+
+        result = precheck.screen(self.token(iss = 'https://other'), TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_unexpected_audience(self):
+
+        result = precheck.screen(self.token(aud = 'https://other'), TestPrecheck.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_accepts_audience_list(self):
+
+        result = precheck.screen(self.token(aud = [ 'https://other', 'https://treasure' ]), TestPrecheck.mock_configuration)
+
+        self.assertIsNotNone(result)
+
+    def registry(self):
+
+        tenants = registry.load('{ "https://pyrates": { "jwks": "https://pyrates/jwks", "audience": [ "https://treasure", "https://gold" ] },'
+            ' "https://corsairs": { "jwks": "https://corsairs/jwks", "audience": "https://doubloons" } }', scopes.compile(''))
+
+        return SimpleNamespace(**{ **vars(TestPrecheck.mock_configuration), 'issuers': tenants })
+
+    def test_accepts_issuer_in_registry(self):
+
+        result = precheck.screen(self.token(iss = 'https://corsairs', aud = 'https://doubloons'), self.registry())
+
+        self.assertIsNotNone(result)
+
+    def test_rejects_issuer_not_in_registry(self):
+
+        result = precheck.screen(self.token(iss = 'https://other'), self.registry())
+
+        self.assertIsNone(result)
+
+    def test_rejects_audience_of_other_issuer(self):
+
+        result = precheck.screen(self.token(iss = 'https://corsairs', aud = 'https://treasure'), self.registry())
+
+        self.assertIsNone(result)
+
+    def test_accepts_any_audience_of_issuer(self):
+
+        result = precheck.screen(self.token(aud = 'https://gold'), self.registry())
+
+        self.assertIsNotNone(result)
+
+    def test_logs_debug_on_rejection(self):
+
+        result = precheck.screen('eyJhbGci...', TestPrecheck.mock_configuration)
+
+        TestPrecheck.mock_logging_debug_context.target.debug.assert_called_once()
@@ -0,0 +1,115 @@
+# test_profiler.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import importlib
+import os
+import pstats
+import tempfile
+import tracemalloc
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from lambdaone import profiler
+
+class TestProfiler(TestCase):
+
+    def setUp(self):
+
+        importlib.reload(profiler)
+        self.addCleanup(importlib.reload, profiler)
+
+        directory = tempfile.TemporaryDirectory()
+        self.mock_directory = directory.name
+        self.addCleanup(directory.cleanup)
+
+        context = patch('lambdaone.profiler.warning')
+        self.mock_warning = context.start()
+        self.addCleanup(context.stop)
+
+    def files(self, suffix):
+
+        return sorted(file for file in os.listdir(self.mock_directory) if file.endswith(suffix))
+
+    def work(self, size = 1000):
+
+        return sum(len(str(i)) for i in range(size))
+
+    def test_disabled_calls_function(self):
+
+        function = Mock(return_value = 'result')
+
+        result = profiler.run(function, 'event')
+
+        self.assertEqual(( 'result', [] ), ( result, os.listdir(self.mock_directory) ))
+        function.assert_called_once_with('event')
+
+    def test_cpu_profile_is_pstats(self):
+
+        profiler.configure([ profiler.CPU ], 1, self.mock_directory, 1048576)
+
+        result = profiler.run(self.work)
+
+        stats = pstats.Stats(os.path.join(self.mock_directory, self.files('.pstats')[0]))
+
+        self.assertEqual(( self.work(), True ), ( result, stats.total_calls > 0 ))
+
+    def test_memory_profile_is_snapshot(self):
+
+        profiler.configure([ profiler.MEMORY ], 1, self.mock_directory, 1048576)
+
+        profiler.run(self.work)
+
+        snapshot = tracemalloc.Snapshot.load(os.path.join(self.mock_directory, self.files('.tracemalloc')[0]))
+
+        self.assertEqual(( True, False ), ( isinstance(snapshot, tracemalloc.Snapshot), tracemalloc.is_tracing() ))
+
+    def test_logs_summary(self):
+
+        profiler.configure([ profiler.CPU, profiler.MEMORY ], 1, self.mock_directory, 1048576)
+
+        profiler.run(self.work)
+
+        self.assertEqual(2, self.mock_warning.call_count)
+
+    def test_samples_invocations(self):
+
+        profiler.configure([ profiler.CPU ], 3, self.mock_directory, 1048576)
+
+        for _ in range(7):
+
+            profiler.run(self.work)
+
+        self.assertEqual(3, len(self.files('.pstats')))
+
+    def test_rotates_by_size(self):
+
+        profiler.configure([ profiler.CPU ], 1, self.mock_directory, 1)
+
+        profiler.run(self.work)
+        profiler.run(self.work)
+
+        self.assertEqual(1, len(self.files('.pstats')))
+
+    def test_writes_profile_when_function_raises(self):
+
+        profiler.configure([ profiler.CPU ], 1, self.mock_directory, 1048576)
+
+        with self.assertRaises(ValueError):
+
+            profiler.run(Mock(side_effect = ValueError('bad event')))
+
+        self.assertEqual(1, len(self.files('.pstats')))
+
+    @patch('lambdaone.profiler.error')
+    def test_unwritable_directory_is_logged(self, mock_error):
+
+        profiler.configure([ profiler.CPU ], 1, os.path.join(self.mock_directory, 'file', 'profiles'), 1048576)
+
+        with open(os.path.join(self.mock_directory, 'file'), 'w') as fp:
+
+            fp.write('not a directory')
+
+        result = profiler.run(self.work)
+
+        self.assertEqual(( self.work(), True ), ( result, mock_error.called ))
@@ -0,0 +1,115 @@
+# test_registry.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+
+from lambdaone import registry
+from lambdaone import scopes
+
+class TestRegistry(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.mock_require = scopes.compile('treasure:read')
+        cls.mock_issuers = { 'https://pyrates': { 'jwks': 'https://pyrates/jwks', 'audience': 'https://treasure', 'require': 'treasure:write' },
+            'https://corsairs': { 'jwks': 'https://corsairs/jwks', 'audience': [ 'https://treasure', 'https://gold' ] } }
+
+    def test_load_inline(self):
+
+        result = registry.load(json.dumps(TestRegistry.mock_issuers), TestRegistry.mock_require)
+
+        self.assertEqual(( 'https://pyrates', 'https://pyrates/jwks', 'https://treasure', scopes.compile('treasure:write') ),
+            ( result['https://pyrates'].issuer, result['https://pyrates'].jwks_path, result['https://pyrates'].audience, result['https://pyrates'].require ))
+
+    def test_load_file(self):
+
+        with tempfile.NamedTemporaryFile('w', suffix = '.json', delete = False) as fp:
+
+            json.dump(TestRegistry.mock_issuers, fp)
+
+        self.addCleanup(os.remove, fp.name)
+
+        result = registry.load(fp.name, TestRegistry.mock_require)
+
+        self.assertEqual([ 'https://pyrates', 'https://corsairs' ], list(result))
+
+    def test_audience_list_is_tuple(self):
+
+        result = registry.load(json.dumps(TestRegistry.mock_issuers), TestRegistry.mock_require)
+
+        self.assertEqual(( 'https://treasure', 'https://gold' ), result['https://corsairs'].audience)
+
+    def test_default_require(self):
+
+        result = registry.load(json.dumps(TestRegistry.mock_issuers), TestRegistry.mock_require)
+
+        self.assertIs(TestRegistry.mock_require, result['https://corsairs'].require)
+
+    def test_is_immutable(self):
+
+        result = registry.load(json.dumps(TestRegistry.mock_issuers), TestRegistry.mock_require)
+
+        with self.assertRaises(TypeError):
+
+            result['https://other'] = None
+
+    def test_error_on_bad_json(self):
+
+        with self.assertRaises(ValueError):
+
+            registry.load('{ "https://pyrates": ', TestRegistry.mock_require)
+
+    def test_discovery_without_jwks(self):
+
+        result = registry.load('{ "https://corsairs.us.auth0.com/": { "audience": "https://treasure" } }', TestRegistry.mock_require)
+
+        self.assertEqual('https://corsairs.us.auth0.com/.well-known/openid-configuration', result['https://corsairs.us.auth0.com/'].jwks_path)
+
+    def test_error_on_missing_audience(self):
+
+        with self.assertRaises(ValueError):
+
+            registry.load('{ "https://pyrates": { "jwks": "https://pyrates/jwks" } }', TestRegistry.mock_require)
+
+    def test_error_on_audience_not_strings(self):
+
+        for audience in ( '5', '[ "https://treasure", 5 ]', '{ "https://treasure": true }' ):
+
+            with self.subTest(audience = audience), self.assertRaisesRegex(ValueError, 'audience'):
+
+                registry.load(f'{{ "https://pyrates": {{ "audience": { audience } }} }}', TestRegistry.mock_require)
+
+    def test_error_on_jwks_not_string(self):
+
+        with self.assertRaisesRegex(ValueError, 'jwks'):
+
+            registry.load('{ "https://pyrates": { "audience": "https://treasure", "jwks": null } }', TestRegistry.mock_require)
+
+    def test_error_on_missing_file(self):
+
+        with self.assertRaises(OSError):
+
+            registry.load('missing-issuers.json', TestRegistry.mock_require)
+
+    def test_select_from_registry(self):
+
+        issuers = registry.load(json.dumps(TestRegistry.mock_issuers), TestRegistry.mock_require)
+        configuration = SimpleNamespace(issuer = None, issuers = issuers)
+
+        result = ( registry.select(configuration, 'https://corsairs'), registry.select(configuration, 'https://other') )
+
+        self.assertEqual(( issuers['https://corsairs'], None ), result)
+
+    def test_select_single_issuer(self):
+
+        configuration = SimpleNamespace(issuer = 'https://pyrates', issuers = {})
+
+        result = ( registry.select(configuration, 'https://pyrates'), registry.select(configuration, 'https://other') )
+
+        self.assertEqual(( configuration, None ), result)
@@ -0,0 +1,48 @@
+# test_runtime.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from lambdaone import config
+from lambdaone import runtime
+
+class TestRuntime(TestCase):
+
+    def setUp(self):
+
+        self.mock_configuration = SimpleNamespace(log_level = 'DEBUG', decision_cache_size = 16, decision_cache_bytes = 4096, metrics = True,
+            metrics_namespace = 'Treasure', metrics_batch = 10, profile = frozenset([ 'cpu' ]), profile_sample = 5, profile_directory = '/tmp/profiles',
+            profile_max_bytes = 1024, mode = config.MODE_NONE, jwks_ttl = 60, jwks_stale = 120, jwks_refetch = 10, jwks_refresh_ahead = 15,
+            jwks_max_issuers = 4, jwks_background = True, jwks_persist = False, jwks_cache_dir = '/tmp/jwks')
+
+        for name in ( 'logger.initialize', 'decision_cache.configure', 'metrics.configure', 'profiler.configure', 'jwt_key.configure' ):
+
+            context = patch(f'lambdaone.{ name }')
+            setattr(self, f'mock_{ name.replace(".", "_") }', context.start())
+            self.addCleanup(context.stop)
+
+    def test_apply(self):
+
+        runtime.apply(self.mock_configuration)
+
+        self.assertEqual(( ( 'DEBUG', ), ( 16, 4096 ), ( True, 'Treasure', 10 ), ( frozenset([ 'cpu' ]), 5, '/tmp/profiles', 1024 ) ),
+            ( self.mock_logger_initialize.call_args.args, self.mock_decision_cache_configure.call_args.args, self.mock_metrics_configure.call_args.args,
+            self.mock_profiler_configure.call_args.args ))
+
+    def test_jwks_settings_not_applied_without_jwks(self):
+
+        runtime.apply(self.mock_configuration)
+
+        self.mock_jwt_key_configure.assert_not_called()
+
+    def test_applies_jwks_settings(self):
+
+        for mode in ( config.MODE_JWKS, config.MODE_REGISTRY ):
+
+            self.mock_jwt_key_configure.reset_mock()
+            runtime.apply(SimpleNamespace(**{ **vars(self.mock_configuration), 'mode': mode }))
+
+            self.mock_jwt_key_configure.assert_called_once_with(60, 120, 10, 15, 4, True, False, '/tmp/jwks')
@@ -0,0 +1,99 @@
+# test_scopes.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+from unittest import TestCase
+
+from lambdaone import scopes
+
+class TestScopes(TestCase):
+
+    def test_compile_groups(self):
+
+        result = scopes.compile(' treasure:read, treasure:write | treasure:admin ')
+
+        self.assertEqual(( ( 'treasure:read', ), ( 'treasure:write', 'treasure:admin' ) ), result.groups)
+
+    def test_compile_empty(self):
+
+        result = scopes.compile('')
+
+        self.assertFalse(result)
+
+    def test_empty_requirement_matches(self):
+
+        result = scopes.compile('').matches(frozenset())
+
+        self.assertTrue(result)
+
+    def test_matches_all(self):
+
+        result = scopes.compile('treasure:read, treasure:write').matches(frozenset([ 'treasure:read', 'treasure:write' ]))
+
+        self.assertTrue(result)
+
+    def test_rejects_missing(self):
+
+        result = scopes.compile('treasure:read, treasure:write').matches(frozenset([ 'treasure:read' ]))
+
+        self.assertFalse(result)
+
+    def test_matches_alternative(self):
+
+        result = scopes.compile('treasure:read, treasure:write | treasure:admin').matches(frozenset([ 'treasure:read', 'treasure:admin' ]))
+
+        self.assertTrue(result)
+
+    def test_granted_wildcard(self):
+
+        result = scopes.compile('treasure:read').matches(frozenset([ 'treasure:*' ]))
+
+        self.assertTrue(result)
+
+    def test_granted_wildcard_is_hierarchical(self):
+
+        result = scopes.compile('treasure:chest:open').matches(frozenset([ 'treasure:*' ]))
+
+        self.assertTrue(result)
+
+    def test_granted_wildcard_other_branch(self):
+
+        result = scopes.compile('treasure:read').matches(frozenset([ 'map:*' ]))
+
+        self.assertFalse(result)
+
+    def test_required_wildcard(self):
+
+        result = scopes.compile('treasure:*').matches(frozenset([ 'treasure:chest:open' ]))
+
+        self.assertTrue(result)
+
+    def test_required_wildcard_not_satisfied_by_parent(self):
+
+        result = scopes.compile('treasure:*').matches(frozenset([ 'treasure' ]))
+
+        self.assertFalse(result)
+
+    def test_granted_from_scopes_list(self):
+
+        result = scopes.granted({ 'scopes': [ 'treasure:read', 'treasure:write' ] })
+
+        self.assertEqual(frozenset([ 'treasure:read', 'treasure:write' ]), result)
+
+    def test_granted_from_scope_string(self):
+
+        result = scopes.granted({ 'scope': 'treasure:read  treasure:write' })
+
+        self.assertEqual(frozenset([ 'treasure:read', 'treasure:write' ]), result)
+
+    def test_granted_from_scp(self):
+
+        result = scopes.granted({ 'scp': [ 'treasure:read' ], 'scope': 'treasure:write' })
+
+        self.assertEqual(frozenset([ 'treasure:read', 'treasure:write' ]), result)
+
+    def test_granted_ignores_malformed(self):
+
+        result = scopes.granted({ 'scopes': 42, 'scp': [ 'treasure:read', None ] })
+
+        self.assertEqual(frozenset([ 'treasure:read' ]), result)
@@ -0,0 +1,161 @@
+# test_signature.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+# A differential test: the signature module must agree with the PyJWT algorithm objects on good
+# signatures, tampered signatures and messages, and signatures of the wrong length, and authz.decode
+# must accept and reject the same claims as jwt.decode, raising the same exceptions.
+#
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+import json
+import jwt
+from jwt.algorithms import get_default_algorithms
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from lambdaone import access_token
+from lambdaone import authz
+from lambdaone import signature
+
+class TestSignature(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        with open('test/resources/private.pem', 'rb') as fp:
+
+            rsa_key = load_pem_private_key(fp.read(), password = None)
+
+        cls.mock_message = b'eyJhbGciOiJSUzI1NiJ9.eyJzdWIiOiIxMjM0NTY3ODkwIn0'
+        cls.mock_algorithms = get_default_algorithms()
+        cls.mock_private_keys = { 'RS256': rsa_key, 'RS384': rsa_key, 'RS512': rsa_key, 'PS256': rsa_key, 'ES256': ec.generate_private_key(ec.SECP256R1()),
+            'EdDSA': ed25519.Ed25519PrivateKey.generate() }
+
+    def setUp(self):
+
+        signature.clear()
+
+    def cases(self, algorithm, private_key):
+
+        good = TestSignature.mock_algorithms[algorithm].sign(TestSignature.mock_message, private_key)
+        tampered = bytes([ good[0] ^ 1 ]) + good[1:]
+
+        return ( ( TestSignature.mock_message, good ), ( TestSignature.mock_message, tampered ), ( TestSignature.mock_message + b'x', good ),
+            ( TestSignature.mock_message, good[:-1] ), ( TestSignature.mock_message, good + b'\x00' ), ( TestSignature.mock_message, b'' ) )
+
+    def assertAgrees(self, algorithm, private_key):
+
+        public_key = private_key.public_key()
+        algorithm_object = TestSignature.mock_algorithms[algorithm]
+        check = signature.verifier(algorithm, public_key)
+
+        for ( message, signed ) in self.cases(algorithm, private_key):
+
+            with self.subTest(algorithm = algorithm, length = len(signed), message = message[-1:]):
+
+                self.assertEqual(algorithm_object.verify(message, algorithm_object.prepare_key(public_key), signed), check(message, signed))
+
+    def test_agrees_with_pyjwt(self):
+
+        for ( algorithm, private_key ) in TestSignature.mock_private_keys.items():
+
+            self.assertAgrees(algorithm, private_key)
+
+    def test_agrees_with_pyjwt_ed448(self):
+
+        self.assertAgrees('EdDSA', ed448.Ed448PrivateKey.generate())
+
+    def test_accepts_good_signature(self):
+
+        for ( algorithm, private_key ) in TestSignature.mock_private_keys.items():
+
+            signed = TestSignature.mock_algorithms[algorithm].sign(TestSignature.mock_message, private_key)
+
+            self.assertTrue(signature.verifier(algorithm, private_key.public_key())(TestSignature.mock_message, signed), algorithm)
+
+    def test_other_algorithm_falls_back(self):
+
+        result = signature.verifier('PS384', TestSignature.mock_private_keys['RS256'].public_key())
+
+        self.assertIsNone(result)
+
+    def test_wrong_key_type_falls_back(self):
+
+        result = signature.verifier('ES256', TestSignature.mock_private_keys['RS256'].public_key())
+
+        self.assertIsNone(result)
+
+    def test_wrong_curve_falls_back(self):
+
+        result = signature.verifier('ES256', ec.generate_private_key(ec.SECP384R1()).public_key())
+
+        self.assertIsNone(result)
+
+    def test_verifier_is_reused(self):
+
+        public_key = TestSignature.mock_private_keys['RS256'].public_key()
+
+        self.assertIs(signature.verifier('RS256', public_key), signature.verifier('RS256', public_key))
+
+class TestClaims(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        with open('test/resources/private.pem', 'rb') as fp:
+
+            cls.mock_private_key = load_pem_private_key(fp.read(), password = None)
+
+        cls.mock_public_key = cls.mock_private_key.public_key()
+        cls.mock_audience = 'https://treasure'
+        cls.mock_issuer = 'https://pyrates'
+
+    def setUp(self):
+
+        context = patch('lambdaone.authz.error')
+        context.start()
+        self.addCleanup(context.stop)
+
+    def cases(self):
+
+        now = int(time.time())
+
+        return ( {}, { 'iat': now + 0.5 - 60 }, { 'iat': now + 3600 }, { 'iat': float(now + 3600) }, { 'iat': str(now) }, { 'iat': 'yesterday' },
+            { 'iat': None }, { 'iat': 1e400 }, { 'nbf': now - 60.5 }, { 'nbf': now + 3600 }, { 'nbf': float(now + 3600) }, { 'nbf': str(now + 3600) },
+            { 'nbf': 'soon' }, { 'exp': now + 600.5 }, { 'exp': now - 60 }, { 'exp': float(now - 60) }, { 'exp': str(now + 600) }, { 'exp': 'later' },
+            { 'exp': [ now + 600 ] }, { 'exp': 1e400 }, { 'aud': [ 'https://other', 'https://treasure' ] }, { 'aud': [ 'https://other' ] },
+            { 'aud': [ 'https://treasure', 5 ] }, { 'aud': 5 }, { 'aud': { 'https://treasure': True } }, { 'aud': '' }, { 'aud': [] }, { 'aud': None },
+            { 'iss': 5 }, { 'iss': [ 'https://pyrates' ] }, { 'iss': 'https://corsairs' } )
+
+    def outcome(self, function, *args):
+
+        result = None
+
+        try:
+
+            function(*args)
+
+        except Exception as e:
+
+            result = type(e)
+
+        return result
+
+    def test_agrees_with_pyjwt(self):
+
+        for claims in self.cases():
+
+            payload = { 'aud': TestClaims.mock_audience, 'iss': TestClaims.mock_issuer, 'sub': 'pyrate', 'exp': int(time.time()) + 600, **claims }
+            encoded = jwt.api_jws.encode(json.dumps(payload).encode(), TestClaims.mock_private_key, algorithm = 'RS256')
+            parsed = access_token.parse(encoded)
+
+            with self.subTest(claims = claims):
+
+                expected = self.outcome(lambda: jwt.decode(encoded, TestClaims.mock_public_key, algorithms = [ 'RS256' ], audience = TestClaims.mock_audience,
+                    issuer = TestClaims.mock_issuer, options = { 'verify_exp': True, 'verify_iss': True, 'verify_aud': True }))
+                decoded = authz.decode(parsed, TestClaims.mock_public_key, 'RS256', TestClaims.mock_audience, TestClaims.mock_issuer)
+
+                self.assertEqual(( expected, expected is None ), ( self.outcome(authz._validate_claims, parsed.claims, TestClaims.mock_audience,
+                    TestClaims.mock_issuer), decoded is not None ))
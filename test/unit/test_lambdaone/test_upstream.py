@@ -0,0 +1,83 @@
+# test_upstream.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+from types import SimpleNamespace
+from unittest import TestCase
+
+from lambdaone import registry
+from lambdaone import scopes
+from lambdaone import upstream
+
+class TestUpstream(TestCase):
+
+    def setUp(self):
+
+        self.mock_configuration = SimpleNamespace(audience = 'https://treasure', issuer = 'https://pyrates', require = scopes.compile('treasure:read'), issuers = {})
+        self.mock_claims = { 'iss': 'https://pyrates', 'aud': 'https://treasure', 'sub': '1234567890', 'scope': 'treasure:read treasure:write' }
+
+    def test_claims_from_request_context(self):
+
+        result = upstream.claims({ 'requestContext': { 'authorizer': { 'jwt': { 'claims': self.mock_claims } } } })
+
+        self.assertIs(self.mock_claims, result)
+
+    def test_no_claims_without_jwt_authorizer(self):
+
+        result = upstream.claims({ 'requestContext': { 'authorizer': { 'lambda': {} } } })
+
+        self.assertIsNone(result)
+
+    def test_no_claims_without_request_context(self):
+
+        result = upstream.claims({ 'headers': {} })
+
+        self.assertIsNone(result)
+
+    def test_uses_issuer_in_registry(self):
+
+        self.mock_configuration.issuers = registry.load('{ "https://corsairs": { "jwks": "https://corsairs/jwks", "audience": [ "https://gold", "https://treasure" ],'
+            ' "require": "treasure:admin" } }', scopes.compile('treasure:read'))
+        self.mock_claims['iss'] = 'https://corsairs'
+
+        result = upstream.decide(self.mock_claims, self.mock_configuration)
+
+        self.assertFalse(result[1])
+
+    def test_allowed(self):
+
+        result = upstream.decide(self.mock_claims, self.mock_configuration)
+
+        self.assertTrue(result[1])
+
+    def test_not_allowed(self):
+
+        self.mock_configuration.require = scopes.compile('treasure:admin')
+
+        result = upstream.decide(self.mock_claims, self.mock_configuration)
+
+        self.assertFalse(result[1])
+
+    def test_rejects_unexpected_issuer(self):
+
+        result = upstream.decide({ **self.mock_claims, 'iss': 'https://other' }, self.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_rejects_unexpected_audience(self):
+
+        result = upstream.decide({ **self.mock_claims, 'aud': 'https://other' }, self.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_accepts_audience_array_string(self):
+
+        result = upstream.decide({ **self.mock_claims, 'aud': '[https://other https://treasure]' }, self.mock_configuration)
+
+        self.assertIsNotNone(result)
+
+    def test_scopes_from_array_string(self):
+
+        result = upstream.decide({ **self.mock_claims, 'scope': None, 'scp': '[treasure:read]' }, self.mock_configuration)
+
+        self.assertEqual(( [ 'treasure:read' ], True ), ( result[0]['scp'], result[1] ))
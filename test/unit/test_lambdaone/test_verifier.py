@@ -0,0 +1,231 @@
+# test_verifier.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat, load_pem_private_key
+import jwt
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from lambdaone import config
+from lambdaone import decision_cache
+from lambdaone import fixed_key
+from lambdaone import registry
+from lambdaone import scopes
+from lambdaone import verifier
+
+class TestVerifier(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.mock_token = 'eyJhbGci...'
+        cls.mock_parsed_token = SimpleNamespace(raw = 'eyJhbGci...', header = { 'kid': 'k1', 'alg': 'RS256' }, claims = { 'iss': 'https://pyrates' }, payload = b'{}')
+        cls.mock_claims = { 'sub': '1234567890', 'exp': time.time() + 1200, 'scopes': [ 'treasure:read' ] }
+
+    def setUp(self):
+
+        self.mock_configuration = SimpleNamespace(mode = config.MODE_JWKS, jwks_path = 'https://pyrates/jwks', signature_key_path = None,
+            audience = 'https://treasure', issuer = 'https://pyrates', require = scopes.compile('treasure:read'), issuers = {})
+
+        decision_cache.configure()
+        self.addCleanup(decision_cache.configure)
+
+        for ( name, value ) in ( ( 'precheck.screen', TestVerifier.mock_parsed_token ), ( 'jwt_key.load', ( 'key', 'RS256' ) ),
+            ( 'fixed_key.load', ( 'key', 'RS256' ) ), ( 'authz.decode', TestVerifier.mock_claims ), ( 'jwt_key.current', True ), ( 'fixed_key.current', True ) ):
+
+            context = patch(f'lambdaone.{ name }', return_value = value)
+            setattr(self, f'mock_{ name.replace(".", "_") }', context.start())
+            self.addCleanup(context.stop)
+
+    def test_allowed(self):
+
+        result = verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+
+        self.assertEqual(( TestVerifier.mock_claims, True ), result)
+
+    def test_not_allowed(self):
+
+        self.mock_configuration.require = scopes.compile('treasure:write')
+
+        result = verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+
+        self.assertEqual(( TestVerifier.mock_claims, False ), result)
+
+    def test_uses_jwks(self):
+
+        verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+
+        self.mock_jwt_key_load.assert_called_once_with(self.mock_configuration.jwks_path, TestVerifier.mock_parsed_token)
+
+    def test_uses_fixed_key(self):
+
+        self.mock_configuration.mode = config.MODE_FIXED
+        self.mock_configuration.signature_key_path = 'public.pem'
+
+        verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+
+        self.mock_fixed_key_load.assert_called_once_with('public.pem', TestVerifier.mock_parsed_token)
+
+    def test_None_for_screened_token(self):
+
+        self.mock_precheck_screen.return_value = None
+
+        result = verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_None_for_bad_signature(self):
+
+        self.mock_authz_decode.return_value = None
+
+        result = verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+
+        self.assertIsNone(result)
+
+    def test_cached_decision_skips_verification(self):
+
+        verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+        verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+
+        self.mock_authz_decode.assert_called_once()
+
+    def test_cached_decision_checks_key_is_current(self):
+
+        verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+        self.mock_jwt_key_current.return_value = False
+        verifier.decide(TestVerifier.mock_token, self.mock_configuration)
+
+        self.assertEqual(( 2, ( 'https://pyrates/jwks', 'k1', 'key' ) ), ( self.mock_authz_decode.call_count, self.mock_jwt_key_current.call_args.args ))
+
+    def parsed(self, token, kid = 'k1', issuer = 'https://pyrates'):
+
+        return SimpleNamespace(raw = token, header = { 'kid': kid, 'alg': 'RS256' }, claims = { 'iss': issuer }, payload = b'{}')
+
+    def test_decide_all_in_order(self):
+
+        self.mock_precheck_screen.side_effect = lambda token, configuration: self.parsed(token)
+        self.mock_authz_decode.side_effect = lambda parsed_token, *args: None if parsed_token.raw == 'b' else TestVerifier.mock_claims
+
+        result = verifier.decide_all([ 'a', 'b', 'a' ], self.mock_configuration)
+
+        self.assertEqual([ ( TestVerifier.mock_claims, True ), None, ( TestVerifier.mock_claims, True ) ], result)
+
+    def test_decide_all_loads_key_once_per_kid(self):
+
+        self.mock_precheck_screen.side_effect = [ self.parsed('a'), self.parsed('b'), self.parsed('c', 'k2') ]
+
+        verifier.decide_all([ 'a', 'b', 'c' ], self.mock_configuration)
+
+        self.assertEqual(( 2, 3 ), ( self.mock_jwt_key_load.call_count, self.mock_authz_decode.call_count ))
+
+    def test_decide_all_skips_screened_tokens(self):
+
+        self.mock_precheck_screen.return_value = None
+
+        result = verifier.decide_all([ 'a' ], self.mock_configuration)
+
+        self.assertEqual(( [ None ], False ), ( result, self.mock_jwt_key_load.called ))
+
+    def registry(self):
+
+        self.mock_configuration.mode = config.MODE_REGISTRY
+        self.mock_configuration.issuers = registry.load('{ "https://pyrates": { "jwks": "https://pyrates/jwks", "audience": "https://treasure" },'
+            ' "https://corsairs": { "jwks": "https://corsairs/jwks", "audience": "https://gold", "require": "gold:read" } }', scopes.compile('treasure:read'))
+
+    def test_uses_jwks_of_issuer(self):
+
+        self.registry()
+        self.mock_precheck_screen.return_value = self.parsed('a', issuer = 'https://corsairs')
+
+        result = verifier.decide('a', self.mock_configuration)
+
+        self.mock_jwt_key_load.assert_called_once_with('https://corsairs/jwks', self.mock_precheck_screen.return_value)
+        self.mock_authz_decode.assert_called_once_with(self.mock_precheck_screen.return_value, 'key', 'RS256', 'https://gold', 'https://corsairs')
+        self.assertEqual(( TestVerifier.mock_claims, False ), result)
+
+    def test_decide_all_by_issuer(self):
+
+        self.registry()
+        self.mock_precheck_screen.side_effect = [ self.parsed('a'), self.parsed('b', issuer = 'https://corsairs') ]
+
+        with patch('lambdaone.authz.decode_all', side_effect = lambda items, *args: [ TestVerifier.mock_claims ] * len(items)) as mock_authz_decode_all:
+
+            result = verifier.decide_all([ 'a', 'b' ], self.mock_configuration)
+
+        self.assertEqual(( [ ( TestVerifier.mock_claims, True ), ( TestVerifier.mock_claims, False ) ], [ 'https://pyrates/jwks', 'https://corsairs/jwks' ],
+            [ ( 'https://treasure', 'https://pyrates' ), ( 'https://gold', 'https://corsairs' ) ] ),
+            ( result, [ call.args[0] for call in self.mock_jwt_key_load.call_args_list ], [ call.args[1:] for call in mock_authz_decode_all.call_args_list ] ))
+
+    def test_decide_all_uses_cached_decisions(self):
+
+        verifier.decide('a', self.mock_configuration)
+        verifier.decide_all([ 'a' ], self.mock_configuration)
+
+        self.mock_authz_decode.assert_called_once()
+
+class TestVerifierRotation(TestCase):
+
+    # Nothing is mocked: the token is verified with the PEM file, then the file is replaced with another key.
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.mock_keys = {}
+
+        for name in ( 'private', 'private_b' ):
+
+            with open(f'test/resources/{ name }.pem', 'rb') as fp:
+
+                cls.mock_keys[name] = fp.read()
+
+    def setUp(self):
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.mock_configuration = SimpleNamespace(mode = config.MODE_FIXED, jwks_path = None, signature_key_path = os.path.join(directory.name, 'public.pem'),
+            audience = 'https://treasure', issuer = 'https://pyrates', require = scopes.compile('treasure:read'), issuers = {},
+            algorithms = frozenset([ 'RS256' ]), max_token_length = 8192)
+        self.mock_token = jwt.encode({ 'iss': 'https://pyrates', 'aud': 'https://treasure', 'exp': int(time.time()) + 1200, 'scopes': [ 'treasure:read' ] },
+            TestVerifierRotation.mock_keys['private'], algorithm = 'RS256')
+
+        decision_cache.configure()
+        fixed_key.clear()
+        self.addCleanup(decision_cache.configure)
+        self.addCleanup(fixed_key.clear)
+
+        context = patch('lambdaone.fixed_key.error')
+        context.start()
+        self.addCleanup(context.stop)
+
+    def publish(self, name):
+
+        public_key = load_pem_private_key(TestVerifierRotation.mock_keys[name], None).public_key()
+
+        with open(self.mock_configuration.signature_key_path, 'wb') as fp:
+
+            fp.write(public_key.public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo))
+
+    def test_cached_decision_dropped_when_key_file_replaced(self):
+
+        self.publish('private')
+        first = verifier.decide(self.mock_token, self.mock_configuration)
+
+        self.publish('private_b')
+        second = verifier.decide(self.mock_token, self.mock_configuration)
+
+        self.assertEqual(( True, None ), ( first[1], second ))
+
+    def test_cached_decision_dropped_when_key_file_removed(self):
+
+        self.publish('private')
+        verifier.decide(self.mock_token, self.mock_configuration)
+
+        os.remove(self.mock_configuration.signature_key_path)
+
+        self.assertIsNone(verifier.decide(self.mock_token, self.mock_configuration))
@@ -0,0 +1,157 @@
+# test_warmup.py
+# Copyright © 2024 Joel A. Mussman. All rights reserved.
+#
+
+import json
+import jwt
+import sys
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from lambdaone import config
+from lambdaone import deadline
+from lambdaone import fixed_key
+from lambdaone import registry
+from lambdaone import scopes
+from lambdaone import warmup
+
+class TestWarmup(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        with open('test/resources/jwks.json', 'r') as fp:
+
+            cls.mock_jwk = jwt.PyJWK(json.load(fp)['keys'][0])
+
+    def setUp(self):
+
+        self.mock_configuration = SimpleNamespace(error = None, mode = config.MODE_FIXED, signature_key_path = 'test/resources/public.pem',
+            jwks_path = 'https://pyrates/jwks', algorithms = frozenset([ 'ES256', 'RS256' ]), issuers = {})
+
+        fixed_key.clear()
+        self.addCleanup(fixed_key.clear)
+
+    def test_loads_fixed_key(self):
+
+        warmup.warm(self.mock_configuration)
+
+        self.assertIn(self.mock_configuration.signature_key_path, fixed_key._cache)
+
+    def test_primes_fixed_key_once(self):
+
+        result = warmup.warm(self.mock_configuration)
+
+        self.assertEqual(1, result)
+
+    @patch('lambdaone.jwt_key.prefetch')
+    def test_prefetches_jwks(self, mock_jwt_key_prefetch):
+
+        mock_jwt_key_prefetch.return_value = { TestWarmup.mock_jwk.key_id: TestWarmup.mock_jwk }
+        self.mock_configuration.mode = config.MODE_JWKS
+
+        result = warmup.warm(self.mock_configuration)
+
+        mock_jwt_key_prefetch.assert_called_once_with(self.mock_configuration.jwks_path)
+        self.assertEqual(1, result)
+
+    @patch('lambdaone.jwt_key.prefetch')
+    @patch('lambdaone.fixed_key.preload')
+    def test_nothing_without_authorization(self, mock_fixed_key_preload, mock_jwt_key_prefetch):
+
+        self.mock_configuration.mode = config.MODE_NONE
+
+        warmup.warm(self.mock_configuration)
+
+        self.assertEqual(( False, False ), ( mock_fixed_key_preload.called, mock_jwt_key_prefetch.called ))
+
+    @patch('lambdaone.fixed_key.preload')
+    def test_nothing_with_bad_configuration(self, mock_fixed_key_preload):
+
+        self.mock_configuration.error = 'audience or issuer is not set'
+
+        warmup.warm(self.mock_configuration)
+
+        mock_fixed_key_preload.assert_not_called()
+
+    @patch('lambdaone.jwt_key.prefetch')
+    def test_prefetch_held_to_budget(self, mock_jwt_key_prefetch):
+
+        budgets = []
+        mock_jwt_key_prefetch.side_effect = lambda path: budgets.append(deadline.remaining(60)) or {}
+        self.mock_configuration.mode = config.MODE_JWKS
+
+        warmup.warm(self.mock_configuration)
+
+        self.assertEqual(( True, 60 ), ( 0 < budgets[0] <= warmup.BUDGET, deadline.remaining(60) ))
+
+    @patch('lambdaone.warmup.error')
+    @patch('lambdaone.jwt_key.prefetch', side_effect = Exception('unreachable'))
+    def test_logs_and_continues_on_failure(self, mock_jwt_key_prefetch, mock_warmup_error):
+
+        self.mock_configuration.mode = config.MODE_JWKS
+
+        result = warmup.warm(self.mock_configuration)
+
+        self.assertEqual(0, result)
+        mock_warmup_error.assert_called_once()
+
+    @patch('lambdaone.warmup.error')
+    @patch('lambdaone.jwt_key.prefetch')
+    def test_prefetches_every_issuer(self, mock_jwt_key_prefetch, mock_warmup_error):
+
+        mock_jwt_key_prefetch.side_effect = [ Exception('unreachable'), { TestWarmup.mock_jwk.key_id: TestWarmup.mock_jwk } ]
+        self.mock_configuration.mode = config.MODE_REGISTRY
+        self.mock_configuration.issuers = registry.load('{ "https://pyrates": { "jwks": "https://pyrates/jwks", "audience": "https://treasure" },'
+            ' "https://corsairs": { "jwks": "https://corsairs/jwks", "audience": "https://gold" } }', scopes.compile(''))
+
+        result = warmup.warm(self.mock_configuration)
+
+        self.assertEqual(( [ 'https://corsairs/jwks', 'https://pyrates/jwks' ], 1 ), ( [ call.args[0] for call in mock_jwt_key_prefetch.call_args_list ], result ))
+
+    @patch('lambdaone.jwt_key.prefetch')
+    def test_restore_fetches_key_set_again(self, mock_jwt_key_prefetch):
+
+        mock_jwt_key_prefetch.return_value = {}
+        self.mock_configuration.mode = config.MODE_JWKS
+
+        with patch('lambdaone.jwt_key.clear') as mock_jwt_key_clear, patch('lambdaone.decision_cache.clear') as mock_decision_cache_clear:
+
+            warmup.restore(self.mock_configuration)
+
+        self.assertEqual(( 1, 1, 1 ), ( mock_jwt_key_clear.call_count, mock_decision_cache_clear.call_count, mock_jwt_key_prefetch.call_count ))
+
+    @patch('lambdaone.jwt_key.prefetch')
+    def test_restore_closes_pooled_connections(self, mock_jwt_key_prefetch):
+
+        mock_jwt_key_prefetch.return_value = {}
+        self.mock_configuration.mode = config.MODE_JWKS
+
+        with patch('lambdaone.http_pool.clear') as mock_http_pool_clear:
+
+            warmup.restore(self.mock_configuration)
+
+        mock_http_pool_clear.assert_called_once()
+
+    def test_registers_snapshot_hooks(self):
+
+        mock_snapshot_restore_py = MagicMock()
+        before_checkpoint = lambda: None
+        after_restore = lambda: None
+
+        with patch.dict(sys.modules, { 'snapshot_restore_py': mock_snapshot_restore_py }):
+
+            result = warmup.register(before_checkpoint, after_restore)
+
+        self.assertTrue(result)
+        mock_snapshot_restore_py.register_before_snapshot.assert_called_once_with(before_checkpoint)
+        mock_snapshot_restore_py.register_after_restore.assert_called_once_with(after_restore)
+
+    def test_register_without_snapshot_library(self):
+
+        with patch.dict(sys.modules, { 'snapshot_restore_py': None }):
+
+            result = warmup.register(lambda: None, lambda: None)
+
+        self.assertFalse(result)